@@ -26,7 +26,8 @@ class FitFunction:
     def __init__(
             self, func, num_fit_params, name=None, code='',
             force_zero=None, force_zero_func=None,
-            force_k=None, force_k_func=None
+            force_k=None, force_k_func=None, vectorized=False,
+            jacobian_func=None
     ):
         """Initializes a FitFunction
         :param func: defines the functional form of the fit. This should
@@ -53,13 +54,23 @@ class FitFunction:
         defines a point that the fit should be forced through.
         The functional form becomes
             f'(x) = f(x) - f(x0) + k
+        :param vectorized: if true, func accepts an ndarray of x values and
+        returns the ndarray of associated y values (or a scalar if y does not
+        depend on x). This allows the fit to be evaluated on a whole plot at
+        once, rather than point by point.
+        :param jacobian_func: (Optional) function of the same form as func
+        that returns the derivatives of func with respect to each of the
+        parameters, as an array of shape (num_fit_params,) + shape(x).
+        If given, the meta-fit uses it in place of finite differences.
         """
         self.fn = func
+        self.jfn = jacobian_func
         self.num_fit_params = num_fit_params
         self.fz = force_zero
         self.fzfn = force_zero_func
         self.fk = force_k
         self.fkfn = force_k_func
+        self.vectorized = vectorized
         self.name = name
         self.code = code
         self._set_name()
@@ -99,6 +110,35 @@ class FitFunction:
         else:
             return self.fn(x, params, const_list, const_dict)
 
+    def has_jacobian(self):
+        return self.jfn is not None
+
+    def jacobian(self, x, params, const_list, const_dict):
+        """Returns the derivatives of the fit with respect to each of the
+        parameters, as an array of shape (num_fit_params,) + shape(x).
+        Forcing the fit through a point, which subtracts f(x0), subtracts the
+        derivatives at x0.
+        """
+        j = self._jacobian(x, params, const_list, const_dict)
+        if self.fz is not None:
+            x0 = self.fz
+        elif self.fzfn is not None:
+            x0 = self.fzfn(const_dict)
+        elif self.fk is not None:
+            x0 = self.fk[0]
+        elif self.fkfn is not None:
+            x0 = self.fkfn(const_dict)[0]
+        else:
+            return j
+        j0 = self._jacobian(x0, params, const_list, const_dict)
+        return j - j0.reshape(j0.shape + (1,) * np.ndim(x))
+
+    def _jacobian(self, x, params, const_list, const_dict):
+        shape = (self.num_fit_params,) + np.shape(x)
+        j = self.jfn(x, params, const_list, const_dict)
+        j = np.array(np.broadcast_arrays(*j), dtype=float)
+        return np.broadcast_to(j, shape)
+
     def _set_name(self):
         if self.name is None:
             self.name = self.fn.__name__
@@ -168,9 +208,22 @@ def combine_ffns(
             result += fitfn(x, params[ii:jj], const_list, const_dict)
         return result
 
+    def combined_jacobians(x, params, const_list, const_dict):
+        return np.concatenate([
+            fitfn.jacobian(x, params[ii:jj], const_list, const_dict)
+            for fitfn, ii, jj in zip(list_of_ffn, params_breaks,
+                                     params_breaks[1:])
+        ])
+
+    if all([ffn.has_jacobian() for ffn in list_of_ffn]):
+        jacobian_func = combined_jacobians
+    else:
+        jacobian_func = None
     return FitFunction(
         func=combined_ffns, num_fit_params=total_params_length,
-        force_zero=force_zero, name=combined_name, code=combined_code, **kwargs
+        force_zero=force_zero, name=combined_name, code=combined_code,
+        vectorized=all([ffn.vectorized for ffn in list_of_ffn]),
+        jacobian_func=jacobian_func, **kwargs
     )
 
 
@@ -183,7 +236,12 @@ def scalar():
     def sf(x, params, const_list, const_dict):
         a = params[0]
         return a
-    return FitFunction(func=sf, num_fit_params=1, name='scalar', code='s')
+
+    # noinspection PyUnusedLocal
+    def sfj(x, params, const_list, const_dict):
+        return [_ones(x)]
+    return FitFunction(func=sf, num_fit_params=1, name='scalar', code='s',
+                       vectorized=True, jacobian_func=sfj)
 
 
 def x1(force_zero=None, **kwargs):
@@ -195,8 +253,13 @@ def x1(force_zero=None, **kwargs):
     def x1f(x, params, const_list, const_dict):
         a = params[0]
         return a * x
+
+    # noinspection PyUnusedLocal
+    def x1fj(x, params, const_list, const_dict):
+        return [x]
     return FitFunction(func=x1f, num_fit_params=1, force_zero=force_zero,
-                       name='x^1', code='x1', **kwargs)
+                       name='x^1', code='x1', vectorized=True,
+                       jacobian_func=x1fj, **kwargs)
 
 
 def linear(force_zero=None, **kwargs):
@@ -209,18 +272,28 @@ def linear(force_zero=None, **kwargs):
         def lf(x, params, const_list, const_dict):
             a, b = params[0:2]
             return a * x + b
+
+        # noinspection PyUnusedLocal
+        def lfj(x, params, const_list, const_dict):
+            return [x, _ones(x)]
         return FitFunction(
             func=lf, num_fit_params=2, force_zero=force_zero,
-            name='linear', code='p1', **kwargs
+            name='linear', code='p1', vectorized=True, jacobian_func=lfj,
+            **kwargs
         )
     else:
         # noinspection PyUnusedLocal
         def lf(x, params, const_list, const_dict):
             a = params[0]
             return a * x
+
+        # noinspection PyUnusedLocal
+        def lfj(x, params, const_list, const_dict):
+            return [x]
         return FitFunction(
             func=lf, num_fit_params=1, force_zero=force_zero,
-            name='linear', code='p1', **kwargs
+            name='linear', code='p1', vectorized=True, jacobian_func=lfj,
+            **kwargs
         )
 
 
@@ -232,8 +305,13 @@ def x2(force_zero=None, **kwargs):
     def x2f(x, params, const_list, const_dict):
         a = params[0]
         return a * x ** 2
+
+    # noinspection PyUnusedLocal
+    def x2fj(x, params, const_list, const_dict):
+        return [x ** 2]
     return FitFunction(func=x2f, num_fit_params=1, force_zero=force_zero,
-                       name='x^2', code='x2', **kwargs)
+                       name='x^2', code='x2', vectorized=True,
+                       jacobian_func=x2fj, **kwargs)
 
 
 def quadratic(force_zero=None, **kwargs):
@@ -245,18 +323,28 @@ def quadratic(force_zero=None, **kwargs):
         def qf(x, params, const_list, const_dict):
             a, b, c = params[0:3]
             return np.polyval([a, b, c], x)
+
+        # noinspection PyUnusedLocal
+        def qfj(x, params, const_list, const_dict):
+            return _polyval_jacobian(2, x)
         return FitFunction(
             func=qf, num_fit_params=3, force_zero=force_zero,
-            name='quadratic', code='p2', **kwargs
+            name='quadratic', code='p2', vectorized=True, jacobian_func=qfj,
+            **kwargs
         )
     else:
         # noinspection PyUnusedLocal
         def qf(x, params, const_list, const_dict):
             a, b = params[0:2]
             return np.polyval([a, b, 0], x)
+
+        # noinspection PyUnusedLocal
+        def qfj(x, params, const_list, const_dict):
+            return _polyval_jacobian(2, x)[:-1]
         return FitFunction(
             func=qf, num_fit_params=2, force_zero=force_zero,
-            name='quadratic', code='p2', **kwargs
+            name='quadratic', code='p2', vectorized=True, jacobian_func=qfj,
+            **kwargs
         )
 
 
@@ -268,9 +356,14 @@ def x_power(n, force_zero=None, **kwargs):
     def xnf(x, params, const_list, const_dict):
         a = params[0]
         return a * x ** n
+
+    # noinspection PyUnusedLocal
+    def xnfj(x, params, const_list, const_dict):
+        return [x ** n]
     return FitFunction(
         func=xnf, num_fit_params=1, force_zero=force_zero,
-        name='x^{}'.format(n), code='x{}'.format(n), **kwargs
+        name='x^{}'.format(n), code='x{}'.format(n), vectorized=True,
+        jacobian_func=xnfj, **kwargs
     )
 
 
@@ -282,17 +375,27 @@ def poly(n, force_zero=None, **kwargs):
         # noinspection PyUnusedLocal
         def pf(x, params, const_list, const_dict):
             return np.polyval(params, x)
+
+        # noinspection PyUnusedLocal
+        def pfj(x, params, const_list, const_dict):
+            return _polyval_jacobian(n, x)
         return FitFunction(
             func=pf, num_fit_params=n + 1, force_zero=force_zero,
-            name='poly{}'.format(n), code='p{}'.format(n), **kwargs
+            name='poly{}'.format(n), code='p{}'.format(n), vectorized=True,
+            jacobian_func=pfj, **kwargs
         )
     else:
         # noinspection PyUnusedLocal
         def pf(x, params, const_list, const_dict):
             return np.polyval(np.concatenate((params, np.zeros(1))), x)
+
+        # noinspection PyUnusedLocal
+        def pfj(x, params, const_list, const_dict):
+            return _polyval_jacobian(n, x)[:-1]
         return FitFunction(
             func=pf, num_fit_params=n, force_zero=force_zero,
-            name='poly{}'.format(n), code='p{}'.format(n), **kwargs
+            name='poly{}'.format(n), code='p{}'.format(n), vectorized=True,
+            jacobian_func=pfj, **kwargs
         )
 
 
@@ -307,9 +410,14 @@ def asymptote(n, force_zero=None, **kwargs):
     def af(x, params, const_list, const_dict):
         a = params[0]
         return - a / x ** n
+
+    # noinspection PyUnusedLocal
+    def afj(x, params, const_list, const_dict):
+        return [- 1 / x ** n]
     return FitFunction(
         func=af, num_fit_params=1, force_zero=force_zero,
-        name='asymptote{}'.format(n), code='a{}'.format(n), **kwargs
+        name='asymptote{}'.format(n), code='a{}'.format(n), vectorized=True,
+        jacobian_func=afj, **kwargs
     )
 
 
@@ -322,9 +430,15 @@ def asymptote_n(force_zero=None, **kwargs):
     def anf(x, params, const_list, const_dict):
         a, n = params[0:2]
         return - a / x ** n
+
+    # noinspection PyUnusedLocal
+    def anfj(x, params, const_list, const_dict):
+        a, n = params[0:2]
+        return [- 1 / x ** n, a * np.log(x) / x ** n]
     return FitFunction(
         func=anf, num_fit_params=2,
-        force_zero=force_zero, name='asymptote_n', code='an', **kwargs
+        force_zero=force_zero, name='asymptote_n', code='an',
+        vectorized=True, jacobian_func=anfj, **kwargs
     )
 
 
@@ -340,7 +454,8 @@ def scalar_dependence(dep_keys, ctfs=list()):
     constructed by the constant transform functions (ctfs)
     """
     return _dependence(
-        f=lambda p, x: p[0], n_params=1, dep_keys=dep_keys,
+        f=lambda p, x: p[0], df=lambda p, x: [_ones(x)], n_params=1,
+        dep_keys=dep_keys,
         ctfs=ctfs, name='scalar dependence', code='s:{}'
     )
 
@@ -354,7 +469,7 @@ def x1_dependence(dep_keys, ctfs=list(), force_zero=None, **kwargs):
     by a ctf (constant transform function) in ctfs
     """
     return _dependence(
-        f=lambda p, x: p[0] * x, n_params=1,
+        f=lambda p, x: p[0] * x, df=lambda p, x: [x], n_params=1,
         dep_keys=dep_keys, ctfs=ctfs,
         force_zero=force_zero, name='x dependence', code='x1:{}', **kwargs
     )
@@ -371,13 +486,14 @@ def linear_dependence(dep_keys, ctfs=list(), force_zero=None, **kwargs):
     """
     if force_zero is None and len(kwargs) == 0:
         return _dependence(
-            f=np.polyval, n_params=2,
-            dep_keys=dep_keys, ctfs=ctfs, force_zero=force_zero,
+            f=np.polyval, df=lambda p, x: _polyval_jacobian(1, x),
+            n_params=2, dep_keys=dep_keys, ctfs=ctfs, force_zero=force_zero,
             name='linear dependence', code='p1:{}', **kwargs
         )
     else:
         return _dependence(
             f=lambda p, x: np.polyval(np.concatenate((p, np.zeros(1))), x),
+            df=lambda p, x: _polyval_jacobian(1, x)[:-1],
             n_params=1, dep_keys=dep_keys, ctfs=ctfs, force_zero=force_zero,
             name='linear dependence', code='p1:{}', **kwargs
         )
@@ -392,7 +508,7 @@ def x2_dependence(dep_keys, ctfs=list(), force_zero=None, **kwargs):
     by a ctf (constant transform function) in ctfs
     """
     return _dependence(
-        f=lambda p, x: p[0] * x ** 2, n_params=1,
+        f=lambda p, x: p[0] * x ** 2, df=lambda p, x: [x ** 2], n_params=1,
         dep_keys=dep_keys, ctfs=ctfs, force_zero=force_zero,
         name='x^2 dependence', code='x2:{}', **kwargs
     )
@@ -410,13 +526,14 @@ def quadratic_dependence(dep_keys, ctfs=list(), force_zero=None, **kwargs):
     """
     if force_zero is None and len(kwargs) == 0:
         return _dependence(
-            f=np.polyval, n_params=3,
-            dep_keys=dep_keys, ctfs=ctfs, force_zero=force_zero,
+            f=np.polyval, df=lambda p, x: _polyval_jacobian(2, x),
+            n_params=3, dep_keys=dep_keys, ctfs=ctfs, force_zero=force_zero,
             name='quadratic dependence', code='p2:{}', **kwargs
         )
     else:
         return _dependence(
             f=lambda p, x: np.polyval(np.concatenate((p, np.zeros(1))), x),
+            df=lambda p, x: _polyval_jacobian(2, x)[:-1],
             n_params=2, dep_keys=dep_keys, ctfs=ctfs, force_zero=force_zero,
             name='quadratic dependence', code='p2:{}', **kwargs
         )
@@ -431,7 +548,7 @@ def x_power_dependence(n, dep_keys, ctfs=list(), force_zero=None, **kwargs):
     by a ctf (constant transform function) in ctfs
     """
     return _dependence(
-        f=lambda p, x: p[0] * x ** n, n_params=1,
+        f=lambda p, x: p[0] * x ** n, df=lambda p, x: [x ** n], n_params=1,
         dep_keys=dep_keys, ctfs=ctfs, force_zero=force_zero,
         name='x^{} dependence'.format(n), code='x{}'.format(n)+':{}', **kwargs
     )
@@ -452,13 +569,15 @@ def poly_dependence(n, dep_keys, ctfs=list(), force_zero=None, **kwargs):
     """
     if force_zero is None and len(kwargs) == 0:
         return _dependence(
-            f=np.polyval, n_params=n + 1, dep_keys=dep_keys, ctfs=ctfs,
+            f=np.polyval, df=lambda p, x: _polyval_jacobian(n, x),
+            n_params=n + 1, dep_keys=dep_keys, ctfs=ctfs,
             force_zero=force_zero, name='poly{n} dependence'.format(n=n),
             code='p{}'.format(n) + ':{}', **kwargs
         )
     else:
         return _dependence(
             f=lambda p, x: np.polyval(np.concatenate((p, np.zeros(1))), x),
+            df=lambda p, x: _polyval_jacobian(n, x)[:-1],
             n_params=n, dep_keys=dep_keys, ctfs=ctfs, force_zero=force_zero,
             name='poly{n} dependence'.format(n=n),
             code='p{}'.format(n) + ':{}', **kwargs
@@ -474,7 +593,8 @@ def asymptotic_dependence(n, dep_keys, ctfs=list(), force_zero=None, **kwargs):
     by a ctf (constant transform function) in ctfs
     """
     return _dependence(
-        f=lambda p, x: - p[0] / x ** n, n_params=1,
+        f=lambda p, x: - p[0] / x ** n, df=lambda p, x: [- 1 / x ** n],
+        n_params=1,
         dep_keys=dep_keys, ctfs=ctfs, force_zero=force_zero,
         name='asymptotic{} dependence'.format(n), code='a{}'.format(n) + ':{}',
         **kwargs
@@ -482,7 +602,7 @@ def asymptotic_dependence(n, dep_keys, ctfs=list(), force_zero=None, **kwargs):
 
 
 def _dependence(f, n_params, dep_keys, name, ctfs=list(), force_zero=None,
-                code='', **kwargs):
+                code='', df=None, **kwargs):
     """An abstract function to determine f-dependence on constants given by
     dep_keys and ctfs
     :param f: f(p, x) -> y, a function that maps an array of parameters and an
@@ -499,6 +619,9 @@ def _dependence(f, n_params, dep_keys, name, ctfs=list(), force_zero=None,
     function to ctfs: lambda cd: cd['j]^2
     :param force_zero: (Optional) an x value at which to force the dependence
     function to be 0
+    :param df: (Optional) df(p, x) -> the derivatives of f with respect to
+    each of the n_params parameters p. If given, the dependence function
+    has an analytic jacobian.
     :return: The dependence fit function
     """
     l1 = len(dep_keys) * n_params
@@ -524,11 +647,44 @@ def _dependence(f, n_params, dep_keys, name, ctfs=list(), force_zero=None,
             for j, p0j in zip(range(n_params), p0):
                 p[j] = p[j] + p0j * c
         return f(p, x)
+
+    def p_matrix(const_dict):
+        """Returns the matrix m for which the p used in d is m . params. This
+        follows the same steps as d, but with parameter indices in place of
+        parameter values.
+        """
+        more_constants = _do_transforms(ctfs, const_dict)
+        m = np.zeros((n_params, num_fit_params))
+        dep_isubs = [range(i, i + n_params) for i in range(0, l1, n_params)]
+        ctf_isubs = [range(i, i + n_params) for i in
+                     range(l1, l1 + l2, n_params)]
+        for dep in zip(dep_keys, *dep_isubs):
+            k, i0 = dep[0], dep[1:]
+            if k not in const_dict:
+                continue
+            else:
+                v = const_dict[k]
+            for j, i0j in zip(range(n_params), i0):
+                m[j, i0j] += v
+        for ctf in zip(more_constants, *ctf_isubs):
+            c, i0 = ctf[0], ctf[1:]
+            for j, i0j in zip(range(n_params), i0):
+                m[j, i0j] += c
+        return m
+
+    # noinspection PyUnusedLocal
+    def dj(x, params, const_list, const_dict):
+        m = p_matrix(const_dict)
+        p = np.dot(m, params)
+        dfdp = np.array(np.broadcast_arrays(*df(p, x)))
+        return np.tensordot(m, dfdp, axes=(0, 0))
+    num_fit_params = (len(dep_keys) + len(ctfs)) * n_params
     dep_str = _dep_str(dep_keys, ctfs)
     return FitFunction(
-        func=d, num_fit_params=(len(dep_keys) + len(ctfs)) * n_params,
+        func=d, num_fit_params=num_fit_params,
         force_zero=force_zero,
         name=name + ' on {}'.format(dep_str), code=code.format(dep_str),
+        vectorized=True, jacobian_func=dj if df is not None else None,
         **kwargs
     )
 
@@ -578,6 +734,19 @@ def asymptote_with_asymptotic_dependence(
     )
 
 
+# JACOBIAN HELPERS
+def _ones(x):
+    return np.ones(np.shape(x))
+
+
+def _polyval_jacobian(n, x):
+    """Returns the derivatives of np.polyval(p, x) with respect to each of
+    the n + 1 coefficients in p
+    """
+    x = np.asarray(x, dtype=float)
+    return np.array([x ** (n - k) for k in range(n + 1)])
+
+
 # CONSTANT TRANSFORMS
 # I think these are self-explanatory
 def _do_transforms(ctfs, const_dict):
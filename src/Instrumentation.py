@@ -0,0 +1,81 @@
+"""Instrumentation.py
+Timers and counters for measuring where time is spent in a run of a
+metafitter (or any other multi-stage computation)
+
+Example:
+    instr = Instrumentation()
+    with instr.timer('parse'):
+        files = parse_files(...)
+    instr.count('files parsed', len(files))
+    instr.as_dict()  # {'timings': {'parse': 0.1}, 'counters': {...}}
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+from contextlib import contextmanager
+from timeit import default_timer
+
+
+class Instrumentation(object):
+    """Accumulates the time spent in named stages and the values of named
+    counters. Timing the same stage more than once adds to its total.
+    """
+    def __init__(self):
+        self.timings = dict()
+        self.counters = dict()
+
+    @contextmanager
+    def timer(self, name):
+        """Context manager that adds the time spent in its block to the
+        timing of the stage name
+        """
+        t0 = default_timer()
+        try:
+            yield
+        finally:
+            self.timings[name] = (
+                self.timings.get(name, 0.0) + default_timer() - t0)
+
+    def count(self, name, n=1):
+        """Add n to the counter name"""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def counting(self, fn, name):
+        """Returns a function that calls fn and adds 1 to the counter name
+        for each call
+        """
+        def counted_fn(*args, **kwargs):
+            self.count(name)
+            return fn(*args, **kwargs)
+        counted_fn.__name__ = fn.__name__
+        return counted_fn
+
+    def as_dict(self):
+        """Returns a dict with items 'timings' (stage -> seconds) and
+        'counters' (name -> value)
+        """
+        return {'timings': dict(self.timings), 'counters': dict(self.counters)}
+
+    def write_json_line(self, fpath, **extra):
+        """Append the timings and counters, along with the given extra items,
+        as a single line of JSON to the file at fpath
+        """
+        record = dict(extra)
+        record.update(self.as_dict())
+        with open(fpath, 'a') as f:
+            f.write(json.dumps(record, sort_keys=True, default=str) + '\n')
+
+
+@contextmanager
+def optional_timer(instrumentation, name):
+    """Context manager that times its block with instrumentation.timer(name),
+    or does nothing if instrumentation is None
+    """
+    if instrumentation is None:
+        yield
+    else:
+        with instrumentation.timer(name):
+            yield
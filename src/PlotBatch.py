@@ -0,0 +1,135 @@
+"""PlotBatch.py
+Columnar storage of a list of plots, for doing array operations on many plots
+at once
+
+Definitions:
+    plot:
+        4-tuple (xarray, yarray, const_list, const_dict)
+    batch:
+        PlotBatch holding the x and y arrays of all of the plots in a list
+        concatenated into single arrays, with an array of offsets marking
+        where each plot starts. The data for the plot at index k is in the
+        slice offsets[k]:offsets[k+1].
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+
+
+class PlotBatch(object):
+    """A list of plots stored as concatenated x and y arrays, an offsets
+    array, and the per-plot constants. Individual plots are returned as
+    4-tuples whose x and y arrays are views (not copies) of the concatenated
+    arrays.
+    """
+    def __init__(self, x, y, offsets, const_lists, const_dicts):
+        """Initialize a PlotBatch from its arrays
+        :param x: concatenated x arrays
+        :param y: concatenated y arrays
+        :param offsets: array of the index in x and y at which each plot
+        starts, followed by the total length
+        :param const_lists: list of the const_list of each plot
+        :param const_dicts: list of the const_dict of each plot
+        """
+        self.x = x
+        self.y = y
+        self.offsets = np.asarray(offsets, dtype=int)
+        self.const_lists = const_lists
+        self.const_dicts = const_dicts
+        self._plot_index = None
+
+    @classmethod
+    def from_plots(cls, plots, dtype=float):
+        """Make a PlotBatch from a list of plots (or return the given
+        PlotBatch)
+        :param plots: list of plots. See definition of "plot" at top of file.
+        :param dtype: type to which to convert the x and y arrays
+        """
+        if isinstance(plots, PlotBatch):
+            return plots
+        lox = [np.asarray(p[0], dtype=dtype) for p in plots]
+        loy = [np.asarray(p[1], dtype=dtype) for p in plots]
+        offsets = np.concatenate(([0], np.cumsum([len(x) for x in lox])))
+        if len(plots) == 0:
+            lox, loy = [np.empty(0, dtype=dtype)], [np.empty(0, dtype=dtype)]
+        return cls(
+            x=np.concatenate(lox), y=np.concatenate(loy), offsets=offsets,
+            const_lists=[p[2] for p in plots],
+            const_dicts=[p[3] for p in plots]
+        )
+
+    def to_plots(self):
+        """Returns the list of plots, as 4-tuples whose x and y arrays are
+        views of the concatenated arrays
+        """
+        return list(self)
+
+    def with_xy(self, x, y, offsets=None):
+        """Returns a PlotBatch with the given x and y arrays and the same
+        constants as this one
+        :param offsets: (Optional) offsets for the new arrays. If None, the
+        plots are assumed to have the same lengths as in this batch.
+        """
+        if offsets is None:
+            offsets = self.offsets
+        return PlotBatch(
+            x=x, y=y, offsets=offsets,
+            const_lists=self.const_lists, const_dicts=self.const_dicts)
+
+    def lengths(self):
+        """Returns the array of the number of points in each plot"""
+        return np.diff(self.offsets)
+
+    def plot_index(self):
+        """Returns an array, of the same length as x, of the index of the
+        plot to which each point belongs
+        """
+        if self._plot_index is None:
+            self._plot_index = np.repeat(
+                np.arange(len(self)), self.lengths())
+        return self._plot_index
+
+    def column(self, key, default=None, dtype=None):
+        """Returns an array of the value of const_dict[key] for each plot
+        :param key: key in the const_dicts
+        :param default: value to use for plots whose const_dict does not
+        have key
+        :param dtype: (Optional) type of the returned array
+        """
+        return np.array([cd.get(key, default) for cd in self.const_dicts],
+                        dtype=dtype)
+
+    def select(self, indices):
+        """Returns a PlotBatch of the plots at the given indices (or boolean
+        mask), in the given order
+        """
+        indices = np.arange(len(self))[indices]
+        starts, stops = self.offsets[:-1][indices], self.offsets[1:][indices]
+        point_index = np.concatenate(
+            [np.arange(i, j) for i, j in zip(starts, stops)] +
+            [np.empty(0, dtype=int)])
+        offsets = np.concatenate(([0], np.cumsum(stops - starts)))
+        return PlotBatch(
+            x=self.x[point_index], y=self.y[point_index], offsets=offsets,
+            const_lists=[self.const_lists[k] for k in indices],
+            const_dicts=[self.const_dicts[k] for k in indices]
+        )
+
+    def __len__(self):
+        return len(self.const_dicts)
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError('PlotBatch index out of range')
+        i, j = self.offsets[k], self.offsets[k+1]
+        return (self.x[i:j], self.y[i:j],
+                self.const_lists[k], self.const_dicts[k])
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
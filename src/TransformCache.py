@@ -0,0 +1,216 @@
+"""TransformCache.py
+Memory-capped least-recently-used cache of the outputs of transform and
+super-transform chains, keyed by a fingerprint of the input data and the
+names of the transforms applied
+
+Definitions:
+    fingerprint:
+        digest of the contents of a plot or list of plots (arrays, constants,
+        and their types), so that equal data gives equal fingerprints
+    step key:
+        the cache_key attribute of a transform, which must include every
+        parameter that the transform's output depends on. Transforms with
+        equal step keys are assumed to do the same thing. A function defined
+        at module level (found under its name in its module) is identified
+        by its module and name. Any other transform has no step key and is
+        not cached, nor is anything after it in a chain.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import sys
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+
+
+def _update_digest(h, obj):
+    if isinstance(obj, np.ndarray) and obj.dtype.hasobject:
+        h.update('ndo{}'.format(obj.shape).encode('utf-8'))
+        _update_digest(h, obj.tolist())
+    elif isinstance(obj, np.ndarray):
+        arr = np.ascontiguousarray(obj)
+        h.update('nd{}{}'.format(arr.dtype.str, arr.shape).encode('utf-8'))
+        h.update(arr.tobytes())
+    elif isinstance(obj, (list, tuple)):
+        h.update('{}{}['.format(type(obj).__name__, len(obj)).encode('utf-8'))
+        for item in obj:
+            _update_digest(h, item)
+        h.update(b']')
+    elif isinstance(obj, dict):
+        h.update('dict{}{{'.format(len(obj)).encode('utf-8'))
+        for k, v in sorted(obj.items(), key=lambda kv: repr(kv[0])):
+            _update_digest(h, k)
+            _update_digest(h, v)
+        h.update(b'}')
+    else:
+        h.update('{}:{!r};'.format(type(obj).__name__, obj).encode('utf-8'))
+
+
+def fingerprint(obj):
+    """Returns a digest of the given data, which may be an ndarray, or a
+    (nested) list, tuple, or dict of ndarrays and other objects. Objects
+    other than these are represented by their repr.
+    """
+    h = hashlib.sha1()
+    _update_digest(h, obj)
+    return h.hexdigest()
+
+
+def _nbytes(obj):
+    """Estimate of the memory held by the arrays in the given data"""
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    elif isinstance(obj, (list, tuple)):
+        return 64 + sum(_nbytes(item) for item in obj)
+    elif isinstance(obj, dict):
+        return 64 + sum(_nbytes(v) for v in obj.values())
+    else:
+        return 32
+
+
+def step_key(transform):
+    """Returns the key identifying the given transform in a chain, or None
+    if it has none (see definition of "step key" at top of file)
+    """
+    key = getattr(transform, 'cache_key', None)
+    if key is not None:
+        return key
+    name = getattr(transform, '__name__', None)
+    module = sys.modules.get(getattr(transform, '__module__', None))
+    if name is not None and getattr(module, name, None) is transform:
+        return transform.__module__, name
+    return None
+
+
+def chain_key(steps):
+    """Returns the tuple of the step keys of steps, or None if any of them
+    has no step key
+    """
+    keys = tuple(step_key(s) for s in steps)
+    if None in keys:
+        return None
+    return keys
+
+
+class TransformCache(object):
+    """Least-recently-used map
+        (fingerprint, tuple of step keys) -> output
+    whose entries are evicted once there are more than max_entries, or once
+    the (estimated) memory held by the outputs exceeds max_bytes.
+    The cached outputs are shared by all users of the cache, and so must not
+    be modified in place.
+    """
+    def __init__(self, max_bytes=256 * 2**20, max_entries=1024,
+                 cache_intermediate=True):
+        """Initialize an empty cache
+        :param max_bytes: memory cap in bytes
+        :param max_entries: maximum number of entries
+        :param cache_intermediate: if true, the output of each step of a
+        chain is cached, so that chains sharing their first steps can reuse
+        them. Otherwise, only the final outputs are cached.
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.cache_intermediate = cache_intermediate
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            return default
+        value, size = self._entries.pop(key)
+        self._entries[key] = (value, size)
+        return value
+
+    def put(self, key, value):
+        size = _nbytes(value)
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self.nbytes += size
+        while (self.nbytes > self.max_bytes or
+               len(self._entries) > self.max_entries):
+            self.nbytes -= self._entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    def apply_chain(self, steps, data, call):
+        """Apply the steps to the data in order, using the cached output of
+        the longest leading part of the chain that has been applied to equal
+        data before. Only the outputs of the steps before the first step
+        without a step key are cached.
+        :param steps: list of transforms, in the order in which they are to
+        be applied
+        :param data: input to the first step
+        :param call: function call(step, data) -> output of step
+        :return: output of the last step
+        """
+        keys = [step_key(s) for s in steps]
+        num_keyed = keys.index(None) if None in keys else len(keys)
+        if num_keyed == 0:
+            self.misses += 1
+            for step in steps:
+                data = call(step, data)
+            return data
+        fp = fingerprint(data)
+        start = 0
+        for k in range(num_keyed, 0, -1):
+            key = (fp, tuple(keys[:k]))
+            if key in self._entries:
+                data, start = self.get(key), k
+                break
+            if not self.cache_intermediate:
+                break
+        if start == len(steps):
+            self.hits += 1
+        else:
+            self.misses += 1
+        for k in range(start, len(steps)):
+            data = call(steps[k], data)
+            if k < num_keyed and (self.cache_intermediate or
+                                  k == num_keyed - 1):
+                self.put((fp, tuple(keys[:k+1])), data)
+        return data
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+_DEFAULT_CACHE = list([None])
+
+
+def set_default_cache(cache):
+    """Set the TransformCache used by composed transforms and super-transforms
+    that were not given one (or None, for no caching)
+    """
+    _DEFAULT_CACHE[0] = cache
+
+
+def get_default_cache():
+    return _DEFAULT_CACHE[0]
+
+
+@contextmanager
+def default_cache(cache):
+    """Context manager that sets the default cache to cache within its
+    block, and restores the previous default after it
+    """
+    previous = _DEFAULT_CACHE[0]
+    _DEFAULT_CACHE[0] = cache
+    try:
+        yield cache
+    finally:
+        _DEFAULT_CACHE[0] = previous
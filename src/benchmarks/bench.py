@@ -0,0 +1,284 @@
+"""bench.py
+Timed benchmarks of parsing, data maps, meta-fitting, transforms, and plot
+saving on synthetic data, with results written as JSON
+
+Usage (from src/):
+    python -m benchmarks.bench --size small --repeat 3 --output bench.json
+
+Each benchmark is timed repeat times, and its result is recorded as
+    {"min": s, "mean": s, "max": s, "repeat": n, "count": k}
+where the times are in seconds and count is the number of items (files,
+plots, or points) processed in each repetition.
+"""
+from __future__ import division, print_function, unicode_literals
+import json
+import platform
+import shutil
+import tempfile
+from argparse import ArgumentParser
+from os import path
+from time import strftime
+from timeit import default_timer
+import matplotlib
+# The backend must be chosen before pyplot is first imported, which the
+# project modules may do
+matplotlib.use('Agg')
+import numpy as np
+from synthetic import generate_results_tree, generate_plots
+
+
+# Sizes of the synthetic data for each benchmark size
+SIZES = {
+    'small': dict(
+        tree=dict(a_values=range(4, 11), aeff_values=range(4, 11),
+                  a_prescriptions=[(4, 5, 6), (6, 6, 6), (4, 6, 8)],
+                  num_states=10, num_tbmes=1000),
+        num_plots=100, num_points=20,
+    ),
+    'medium': dict(
+        tree=dict(a_values=range(4, 21), aeff_values=range(4, 21),
+                  a_prescriptions=[(4, 5, 6), (6, 6, 6), (4, 6, 8),
+                                   (16, 17, 18), (18, 18, 18)],
+                  num_states=50, num_tbmes=20000),
+        num_plots=1000, num_points=50,
+    ),
+    'large': dict(
+        tree=dict(a_values=range(4, 41), aeff_values=range(4, 41),
+                  a_prescriptions=[(4, 5, 6), (6, 6, 6), (4, 6, 8),
+                                   (16, 17, 18), (18, 18, 18), (8, 8, 8),
+                                   (10, 10, 10), (12, 12, 12)],
+                  num_states=200, num_tbmes=200000),
+        num_plots=10000, num_points=100,
+    ),
+}
+BENCHMARK_GROUPS = ['parse_files', 'data_maps', 'metafit', 'transforms',
+                    'plotting']
+
+
+def _time(fn, repeat, count=None):
+    """Time repeat calls of fn
+    :param fn: function of no arguments to time
+    :param repeat: number of times to call fn
+    :param count: (Optional) number of items processed by each call. If None,
+    the length of the value returned by fn is used.
+    :return: dict of timing results
+    """
+    times = list()
+    value = None
+    for i in range(repeat):
+        t0 = default_timer()
+        value = fn()
+        times.append(default_timer() - t0)
+    if count is None:
+        count = len(value) if hasattr(value, '__len__') else None
+    return {'min': min(times), 'mean': sum(times) / len(times),
+            'max': max(times), 'repeat': repeat, 'count': count}
+
+
+def bench_parse_files(context, repeat):
+    from parsers.parse_files import parse_ncsd_out_files
+    from parsers.parse_files import parse_nushellx_int_files
+    from parsers.parse_files import parse_nushellx_lpt_files
+    ncsd, vce = context['dpath_ncsd_files'], context['dpath_nushell_files']
+    return {
+        'parse_ncsd_out_files': _time(
+            lambda: parse_ncsd_out_files(ncsd), repeat),
+        'parse_nushellx_int_files': _time(
+            lambda: parse_nushellx_int_files(vce), repeat),
+        'parse_nushellx_lpt_files': _time(
+            lambda: parse_nushellx_lpt_files(vce), repeat),
+    }
+
+
+def bench_data_maps(context, repeat):
+    """The first repetition includes making the energy level arrays of the
+    parsed files, which are kept for later repetitions
+    """
+    from parsers.parse_files import parse_ncsd_out_files
+    from parsers.parse_files import parse_nushellx_int_files
+    from parsers.parse_files import parse_nushellx_lpt_files
+    from plotters.data_maps import get_a_aeff_to_state_to_energy_map
+    from plotters.data_maps import get_a_aeff_to_ground_state_energy_map
+    from plotters.data_maps import get_state_to_presc_a_to_energy_map
+    from plotters.data_maps import get_presc_a_to_ground_state_energy_map
+    ncsd_files = parse_ncsd_out_files(context['dpath_ncsd_files'])
+    int_files = parse_nushellx_int_files(context['dpath_nushell_files'])
+    lpt_files = parse_nushellx_lpt_files(context['dpath_nushell_files'])
+    return {
+        'get_a_aeff_to_state_to_energy_map': _time(
+            lambda: get_a_aeff_to_state_to_energy_map(ncsd_files), repeat),
+        'get_a_aeff_to_ground_state_energy_map': _time(
+            lambda: get_a_aeff_to_ground_state_energy_map(ncsd_files),
+            repeat),
+        'get_state_to_presc_a_to_energy_map': _time(
+            lambda: get_state_to_presc_a_to_energy_map(int_files, lpt_files),
+            repeat),
+        'get_presc_a_to_ground_state_energy_map': _time(
+            lambda: get_presc_a_to_ground_state_energy_map(
+                int_files, lpt_files), repeat),
+    }
+
+
+def bench_metafit(context, repeat):
+    from metafit import _meta_fit
+    from FitFunction import poly
+    plots = context['plots']
+    fitfn = poly(2)
+    num_points = sum(len(p[0]) for p in plots)
+    return {
+        '_meta_fit poly2 jacobian': _time(
+            lambda: _meta_fit(plots, fitfn, np.ones(3)), repeat,
+            count=num_points),
+        '_meta_fit poly2 finite difference': _time(
+            lambda: _meta_fit(plots, fitfn, np.ones(3), use_jacobian=False),
+            repeat, count=num_points),
+    }
+
+
+def bench_transforms(context, repeat):
+    from transforms import compose_transforms, transform_batch
+    from transforms import relative_y, log_log, div_x, abs_y, derivative
+    from transforms import cubic_spline
+    from transforms_s import s_combine_like
+    plots = context['plots']
+    chain = compose_transforms([relative_y, log_log, abs_y, div_x])
+    spline = cubic_spline(num_pts=100)
+    combine = s_combine_like(keys=['group'], sort_plot=True)
+    return {
+        'relative_y log_log abs_y div_x': _time(
+            lambda: [chain(*p) for p in plots], repeat),
+        'relative_y log_log abs_y div_x (batch)': _time(
+            lambda: transform_batch(chain, plots), repeat),
+        'derivative': _time(lambda: [derivative(*p) for p in plots], repeat),
+        'derivative (batch)': _time(
+            lambda: transform_batch(derivative, plots), repeat),
+        'cubic_spline': _time(lambda: [spline(*p) for p in plots], repeat),
+        's_combine_like': _time(lambda: combine(plots), repeat,
+                                count=len(plots)),
+    }
+
+
+def bench_plotting(context, repeat):
+    from matplotlib import pyplot as plt
+    from plotting import save_plot_figure, save_plot_figures
+    plots = context['plots'][:50]
+    savepath = path.join(context['dirpath'], 'bench_plot.png')
+    labels = ['plot {}'.format(i) for i in range(len(plots))]
+
+    def save(headless=False):
+        save_plot_figure(
+            data_plots=plots, title='Benchmark', xlabel='x', ylabel='y',
+            savepath=savepath, data_labels=labels, headless=headless)
+        plt.close('all')
+
+    specs = [dict(data_plots=plots[i:i+5], title='Benchmark {}'.format(i),
+                  xlabel='x', ylabel='y', data_labels=labels[i:i+5],
+                  savepath=path.join(context['dirpath'],
+                                     'bench_plot_{}.png'.format(i)))
+             for i in range(0, len(plots), 5)]
+    return {
+        'save_plot_figure': _time(save, repeat, count=len(plots)),
+        'save_plot_figure (headless)': _time(
+            lambda: save(headless=True), repeat, count=len(plots)),
+        'save_plot_figures (parallel)': _time(
+            lambda: save_plot_figures(specs, parallel=True), repeat),
+    }
+
+
+BENCHMARKS = {
+    'parse_files': bench_parse_files,
+    'data_maps': bench_data_maps,
+    'metafit': bench_metafit,
+    'transforms': bench_transforms,
+    'plotting': bench_plotting,
+}
+
+
+def run_benchmarks(size='small', repeat=3, groups=None, dirpath=None,
+                   seed=0, printer=print):
+    """Generate synthetic data and run the benchmarks on it
+    :param size: key in SIZES for the size of the synthetic data
+    :param repeat: number of times to run each benchmark
+    :param groups: (Optional) list of benchmark groups (keys in BENCHMARKS)
+    to run. If None, all are run.
+    :param dirpath: (Optional) directory in which to generate the synthetic
+    results tree, which is kept. If None, a temporary directory is used,
+    which is removed at the end.
+    :param seed: seed for the synthetic data
+    :param printer: (Optional) function with which to print progress. If
+    None, nothing is printed.
+    :return: dict with items 'meta', describing the run, and 'results',
+    mapping group -> benchmark name -> timing results
+    """
+    params = SIZES[size]
+    groups = groups if groups is not None else BENCHMARK_GROUPS
+    tmp = dirpath is None
+    if tmp:
+        dirpath = tempfile.mkdtemp(prefix='bench_')
+    try:
+        t0 = default_timer()
+        dpath_ncsd, dpath_vce = generate_results_tree(
+            dirpath=dirpath, seed=seed, **params['tree'])
+        t_generate = default_timer() - t0
+        context = {
+            'dirpath': dirpath,
+            'dpath_ncsd_files': dpath_ncsd,
+            'dpath_nushell_files': dpath_vce,
+            'plots': generate_plots(
+                num_plots=params['num_plots'],
+                num_points=params['num_points'], seed=seed),
+        }
+        results = dict()
+        for group in groups:
+            if printer is not None:
+                printer('Running {} benchmarks...'.format(group))
+            results[group] = BENCHMARKS[group](context, repeat)
+    finally:
+        if tmp:
+            shutil.rmtree(dirpath)
+    meta = {
+        'time': strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'size': size,
+        'repeat': repeat,
+        'seed': seed,
+        'generate_seconds': t_generate,
+        'params': {
+            'tree': {k: list(v) if not isinstance(v, int) else v
+                     for k, v in params['tree'].items()},
+            'num_plots': params['num_plots'],
+            'num_points': params['num_points'],
+        },
+    }
+    return {'meta': meta, 'results': results}
+
+
+def _main():
+    parser = ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--size', choices=sorted(SIZES), default='small')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='+', choices=BENCHMARK_GROUPS,
+                        help='benchmark groups to run (default: all)')
+    parser.add_argument('--dirpath', default=None,
+                        help='directory in which to keep the synthetic data')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None,
+                        help='path of the JSON file to write (default: '
+                             'print to stdout)')
+    args = parser.parse_args()
+    report = run_benchmarks(
+        size=args.size, repeat=args.repeat, groups=args.only,
+        dirpath=args.dirpath, seed=args.seed,
+        printer=print if args.output is not None else None)
+    out = json.dumps(report, indent=2, sort_keys=True)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            f.write(out + '\n')
+    else:
+        print(out)
+
+
+if __name__ == '__main__':
+    _main()
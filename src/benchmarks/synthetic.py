@@ -0,0 +1,206 @@
+"""synthetic.py
+Functions to generate synthetic NCSD *.out and NuShellX *.int and *.lpt
+files, laid out in the same directory trees as real results, for use in
+benchmarks
+"""
+from __future__ import division, print_function, unicode_literals
+from os import path, makedirs
+import numpy as np
+
+
+ELEMENT_SYMBOLS = {2: 'he', 3: 'li', 8: 'o', 16: 's'}
+
+
+def _element_symbol(z):
+    return ELEMENT_SYMBOLS.get(z, 'z{}'.format(z))
+
+
+def _makedirs(dirpath):
+    if not path.exists(dirpath):
+        makedirs(dirpath)
+
+
+def _j_str(j):
+    """String for the angular momentum j, as written in *.lpt files"""
+    if j == int(j):
+        return '{}'.format(int(j))
+    else:
+        return '{}/2'.format(int(2 * j))
+
+
+def _level_js(num_states, mass, rng):
+    """Returns a list of num_states J values for a nucleus of the given mass,
+    the first of which is the ground state J
+    """
+    if mass % 2 == 0:
+        js = rng.randint(0, 5, size=num_states).astype(float)
+        js[0] = 0.0
+    else:
+        js = rng.randint(0, 5, size=num_states) + 0.5
+        js[0] = 1.5
+    return list(js)
+
+
+def write_ncsd_out_file(fpath, z, n, hw, nhw, nmax, num_states, rng,
+                        beta_cm=0):
+    """Write a synthetic NCSD *.out file
+    :param fpath: path of the file
+    :param z: proton number
+    :param n: neutron number
+    :param hw: oscillator frequency
+    :param nhw: Nhw
+    :param nmax: Nmax
+    :param num_states: number of energy levels
+    :param rng: numpy RandomState
+    :param beta_cm: center of mass beta. If 0, no c.o.m. correction is
+    written.
+    """
+    mass = z + n
+    js = _level_js(num_states, mass, rng)
+    energies = -7.0 * mass + np.cumsum(rng.uniform(0.1, 2.0, num_states))
+    lines = [' *** synthetic NCSD output ***',
+             ' Z = {:2d}   N = {:2d}   hw = {:7.3f}'.format(z, n, hw)]
+    if beta_cm == 0:
+        lines.append(' Without the c.o.m. correction')
+    else:
+        lines.append(' With the c.o.m. correction beta = {}'.format(beta_cm))
+    lines.append(' Nhw = {:2d}  Nmax = {:2d}'.format(nhw, nmax))
+    for i, (e, j) in enumerate(zip(energies, js)):
+        lines.append(
+            ' State # {:2d}   Energy = {:9.4f}   J = {:6.3f}   T = {:6.3f}'
+            ''.format(i + 1, e, j, abs(n - z) / 2))
+    with open(fpath, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def write_nushellx_int_file(fpath, a_prescription, zero_body_term,
+                            num_orbitals, num_tbmes, rng):
+    """Write a synthetic NuShellX *.int file
+    :param fpath: path of the file
+    :param a_prescription: 3-tuple A-prescription
+    :param zero_body_term: zero body term
+    :param num_orbitals: number of orbitals in the index
+    :param num_tbmes: number of two-body matrix element lines
+    :param rng: numpy RandomState
+    """
+    lines = ['! Effective interaction A-prescription = {}, {}, {}'.format(
+                *a_prescription),
+             '! Zero body term: {}'.format(zero_body_term),
+             '! Index   n l j tz']
+    for i in range(num_orbitals):
+        lines.append('!  {:d}   {:d} {:d} {:d} {:d}'.format(
+            i + 1, i // 4, i % 3, 2 * (i % 3) + 1, 1))
+    spe = rng.uniform(-5, 0, num_orbitals)
+    lines.append('-999  ' + '  '.join('{:.6f}'.format(e) for e in spe))
+    labels = np.empty((num_tbmes, 6), dtype=int)
+    labels[:, :4] = rng.randint(1, num_orbitals + 1, size=(num_tbmes, 4))
+    labels[:, 4] = rng.randint(0, 6, size=num_tbmes)
+    labels[:, 5] = rng.randint(0, 2, size=num_tbmes)
+    values = rng.uniform(-5, 5, num_tbmes)
+    for row, value in zip(labels.tolist(), values):
+        lines.append('  {:d}   {:d}   {:d}   {:d}    {:d}    {:d}    {:.6f}'
+                     ''.format(*(row + [value])))
+    with open(fpath, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def write_nushellx_lpt_file(fpath, a, z, num_states, rng, zero_body_term=0):
+    """Write a synthetic NuShellX *.lpt file
+    :param fpath: path of the file
+    :param a: mass number
+    :param z: proton number
+    :param num_states: number of energy levels
+    :param rng: numpy RandomState
+    :param zero_body_term: zero body term of the associated interaction,
+    which is subtracted from the energies, so that the total energies are
+    comparable to the synthetic NCSD energies
+    """
+    js = _level_js(num_states, a, rng)
+    energies = (-7.0 * a - zero_body_term +
+                np.cumsum(rng.uniform(0.1, 2.0, num_states)))
+    lines = [' *** synthetic NuShellX levels ***',
+             ' a = {}   z = {}'.format(a, z),
+             ' spe  ' + '  '.join('{:.2f}'.format(e)
+                                  for e in rng.uniform(-5, 0, 4)) + ' x']
+    for i, (e, j) in enumerate(zip(energies, js)):
+        lines.append('  {:3d} {:3d} {:10.3f} {:8.3f} {:>5} {:>5} {:>3} {:3d} x'
+                     ''.format(i + 1, 1, e, e - energies[0], _j_str(j),
+                               _j_str(abs(a - 2 * z) / 2), '+1', i + 1))
+    with open(fpath, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def generate_results_tree(
+        dirpath, z=2, a_values=range(4, 11), aeff_values=None,
+        a_prescriptions=((4, 5, 6),), num_states=10, num_orbitals=6,
+        num_tbmes=1000, hw=20, nmax=4, seed=0
+):
+    """Generate a synthetic results directory, with the layout
+        dirpath/ncsd/<sym>-<A>_<Aeff>_Nhw<N>_<hw>_<hw>/<same>.out
+        dirpath/vce/vce_presc<a1>,<a2>,<a3>_Nmax<N>/A<A>/A<A>.int
+        dirpath/vce/vce_presc<a1>,<a2>,<a3>_Nmax<N>/A<A>/<sym>_<A>y.lpt
+    :param dirpath: directory in which to make the tree
+    :param z: proton number of all nuclei
+    :param a_values: mass numbers
+    :param aeff_values: Aeff values for which to make an NCSD file for each
+    A. If None, only Aeff = A is made.
+    :param a_prescriptions: A-prescriptions for which to make a directory of
+    *.int and *.lpt files for each A
+    :param num_states: number of energy levels in each file
+    :param num_orbitals: number of orbitals in each *.int file
+    :param num_tbmes: number of two-body matrix elements in each *.int file
+    :param hw: oscillator frequency
+    :param nmax: Nmax
+    :param seed: seed for the random numbers, so that trees made with the
+    same arguments are identical
+    :return: (dpath_ncsd_files, dpath_nushell_files)
+    """
+    rng = np.random.RandomState(seed)
+    dpath_ncsd = path.join(dirpath, 'ncsd')
+    dpath_vce = path.join(dirpath, 'vce')
+    sym = _element_symbol(z)
+    for a in a_values:
+        for aeff in (aeff_values if aeff_values is not None else [a]):
+            name = '{}-{}_{}_Nhw{}_{}_{}'.format(sym, a, aeff, nmax, hw, hw)
+            dpath = path.join(dpath_ncsd, name)
+            _makedirs(dpath)
+            write_ncsd_out_file(
+                fpath=path.join(dpath, name + '.out'), z=z, n=a - z, hw=hw,
+                nhw=nmax + 2, nmax=nmax, num_states=num_states, rng=rng)
+    for presc in a_prescriptions:
+        dname = 'vce_presc{},{},{}_Nmax{}'.format(*(tuple(presc) + (nmax,)))
+        for a in a_values:
+            dpath = path.join(dpath_vce, dname, 'A{}'.format(a))
+            _makedirs(dpath)
+            zbt = round(-4.0 * a + rng.uniform(-1, 1), 4)
+            write_nushellx_int_file(
+                fpath=path.join(dpath, 'A{}.int'.format(a)),
+                a_prescription=presc, zero_body_term=zbt,
+                num_orbitals=num_orbitals, num_tbmes=num_tbmes, rng=rng)
+            write_nushellx_lpt_file(
+                fpath=path.join(dpath, '{}_{}y.lpt'.format(sym, a)),
+                a=a, z=z, num_states=num_states, rng=rng,
+                zero_body_term=zbt)
+    return dpath_ncsd, dpath_vce
+
+
+def generate_plots(num_plots, num_points, num_groups=10, seed=0):
+    """Generate a list of synthetic plots, which follow quadratics with
+    noise, with const_dict items 'group' (for combining) and 'exp'/'N' (as
+    used by the metafitters)
+    :param num_plots: number of plots
+    :param num_points: number of points in each plot
+    :param num_groups: number of distinct values of 'group'
+    :param seed: seed for the random numbers
+    :return: list of plots
+    """
+    rng = np.random.RandomState(seed)
+    plots = list()
+    for i in range(num_plots):
+        x = np.arange(1, num_points + 1, dtype=float) + i % num_groups
+        y = (0.05 * x**2 - 1.5 * x + rng.uniform(-10, 0) +
+             rng.normal(scale=0.01, size=num_points))
+        const_dict = {'group': i % num_groups, 'exp': (i,), 'N': i + 1,
+                      'x0': x[0], 'y0': y[0], 'zbt0': 0.0}
+        plots.append((x, y, list(), const_dict))
+    return plots
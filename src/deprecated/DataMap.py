@@ -9,12 +9,55 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from os import path
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
 
 class PathDoesNotExistException(Exception):
     pass
 
 
+class LazyDatumMap(Mapping):
+    """Read-only mapping from exp to datum, in which each datum is
+    constructed from its files only when it is first retrieved. Iterating
+    over the keys does not construct any datum, but retrieving the values or
+    items constructs all of them.
+    """
+    def __init__(self, make_datum):
+        """Initialize an empty map
+        :param make_datum: function f(exp, files) that returns the datum for
+        the given exp and list of files
+        """
+        self._make_datum = make_datum
+        self._files_map = dict()
+        self._datum_map = dict()
+
+    def __getitem__(self, key):
+        if key not in self._datum_map:
+            self._datum_map[key] = self._make_datum(key, self._files_map[key])
+        return self._datum_map[key]
+
+    def __iter__(self):
+        return iter(self._files_map)
+
+    def __len__(self):
+        return len(self._files_map)
+
+    def __contains__(self, key):
+        return key in self._files_map
+
+    def num_files(self):
+        """Returns the number of files from which the datums are made"""
+        return sum(len(files) for files in self._files_map.values())
+
+    def _add_file(self, key, f):
+        if key not in self._files_map:
+            self._files_map[key] = list()
+        self._files_map[key].append(f)
+
+
 class DataMap(object):
     def __init__(self, parent_directory, exp_type, datum_type,
                  exp_list=None, exp_filter_fn=None, **kwargs):
@@ -40,7 +83,7 @@ class DataMap(object):
         self.exp_type = exp_type
         self.datum_type = datum_type
         self.kwargs = kwargs
-        self.map = dict()
+        self.map = LazyDatumMap(make_datum=self._make_datum)
         self._set_maps()
 
     def __getitem__(self, item):
@@ -53,22 +96,30 @@ class DataMap(object):
         This is a pretty good algorithm, I think. There should not be any
         reason to override it. Rather, the user should override
         _exp_from_file_path() and _get_files().
+        The exp of each file is computed once, and the files are grouped by
+        exp in a single pass. The datum for each exp is only constructed when
+        it is first retrieved from self.map.
         """
-        files = list(self._get_files())
-        for f in files:
+        exp_set = set(self.exp_list) if self.exp_list is not None else None
+        filter_map = dict()
+        for f in self._get_files():
             key = self.exp_type(*self._exp_from_file_path(f))
-            if self.exp_list is not None and key not in self.exp_list:
-                continue
-            elif self.exp_filter_fn is not None and not self.exp_filter_fn(key):
-                continue
-            elif key not in self.map:
-                key_files = list(filter(
-                    lambda ff: key == self._exp_from_file_path(ff), files))
-                value = self.datum_type(
-                    directory=self.parent_dir, exp=key, files=key_files,
-                    **self.kwargs
-                )
-                self.map[key] = value
+            if key not in filter_map:
+                if exp_set is not None and key not in exp_set:
+                    filter_map[key] = False
+                elif (self.exp_filter_fn is not None and
+                        not self.exp_filter_fn(key)):
+                    filter_map[key] = False
+                else:
+                    filter_map[key] = True
+            if filter_map[key]:
+                self.map._add_file(key, f)
+
+    def _make_datum(self, key, key_files):
+        return self.datum_type(
+            directory=self.parent_dir, exp=key, files=key_files,
+            **self.kwargs
+        )
 
     def _exp_set(self):
         return set(self.map.keys())
@@ -8,6 +8,20 @@ Wow, DataMap that maps to Datum. Very creative naming...
 from __future__ import division, print_function, unicode_literals
 
 
+def lazy_map(make_map):
+    """Decorator that turns the method make_map(self) into a read-only
+    property, whose value is made on first access and then stored in the
+    instance, so that data that is never used is never parsed
+    """
+    attr = '_lazy' + make_map.__name__
+
+    def get(self):
+        if attr not in self.__dict__:
+            self.__dict__[attr] = make_map(self)
+        return self.__dict__[attr]
+    return property(get, doc=make_map.__doc__)
+
+
 class Datum(object):
     def __init__(self, directory, exp, files):
         self.exp = exp
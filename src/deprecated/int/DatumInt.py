@@ -9,7 +9,7 @@ from deprecated.int.QuantumNumbers import QuantumNumbers
 from deprecated.int.TwoBodyInteraction import TwoBodyInteraction
 
 from constants import DPATH_FILES_INT_ORG, ORG_FMT_INT_DNAME, ORG_FMT_INT_FNAME
-from deprecated.Datum import Datum
+from deprecated.Datum import Datum, lazy_map
 from deprecated.int.parser import index_to_qnums_map as get_index_tuple_map
 from deprecated.int.parser import mass_number_from_filename as mass_from_filename
 from deprecated.int.parser import mass_to_index_to_energy_map as get_mie_map
@@ -52,60 +52,70 @@ class DatumInt(Datum):
         super(DatumInt, self).__init__(
             directory=directory, exp=exp, files=files)
         self.name = None
-        self.standardized_indexing = False
+        self.standardized_indexing = (
+            std_io_map is not None and standardize_io_map)
         self.files_organized = False
-        # Create maps initially empty
+        # Maps are made from the files when first accessed
         self.standard_index_orbital_map = std_io_map
-        self._particular_index_orbital_map = None
-        self._index_orbital_map = dict()
-        self._mass_index_spe_map = dict()
-        self._mass_interaction_index_energy_map = dict()
-        self._mass_zero_body_term_map = dict()
-        self._other_constants = None
         self._unorg_files = None
         # Perform setup methods
-        self._set_maps()
         self._set_name()
-        self._set_other_constants()
-        if self.standard_index_orbital_map is not None and standardize_io_map:
-            self._standardize_indexing()
-            self.standardized_indexing = True
         if organize_files:
             self._organize_files(dpath_org_files, dname_fmt_org, fname_fmt_org)
 
     def _set_maps(self):
-        self._set_index_orbital_map()
-        self._set_mass_index_energy_map()
-        self._set_mass_interaction_index_energy_map()
-        self._set_zero_body_term_map()
+        """Make all of the maps now, rather than on first access
+        """
+        for name in ('_particular_index_orbital_map', '_mass_index_spe_map',
+                     '_mass_interaction_index_energy_map',
+                     '_mass_zero_body_term_map', '_other_constants'):
+            getattr(self, name)
+
+    def _source_files(self):
+        """Returns the files from which the data is parsed (before they are
+        organized)
+        """
+        return self._unorg_files if self._unorg_files is not None else (
+            self.files)
 
-    def _set_index_orbital_map(self):
-        """Retrieves the index -> orbital map from a file in the directory
-        and stores it in an instance variable
+    @lazy_map
+    def _particular_index_orbital_map(self):
+        """The index -> orbital map from a file in the directory
         """
         # Assuming all files characteristic have the same indexing...
-        index_orbital_map = get_index_tuple_map(self.files[0])
+        index_orbital_map = get_index_tuple_map(self._source_files()[0])
         # Turn each tuple in the map into a named tuple
         for k in index_orbital_map.keys():
             v = index_orbital_map[k]
             nextv = QuantumNumbers(*_qnums_to_list(v))
             index_orbital_map[k] = nextv
-        self._index_orbital_map = index_orbital_map
+        return index_orbital_map
+
+    @property
+    def _index_orbital_map(self):
+        if self.standardized_indexing:
+            return self.standard_index_orbital_map
+        else:
+            return self._particular_index_orbital_map
 
-    def _set_mass_index_energy_map(self):
-        """Retrieves the
+    @lazy_map
+    def _mass_index_spe_map(self):
+        """The
             mass number -> orbital index -> energy
         mapping for the directory
         """
-        self._mass_index_spe_map = (
-            get_mie_map(self.dir, fpath_list=self.files))
+        mie_map = get_mie_map(self.dir, fpath_list=self._source_files())
+        if self.standardized_indexing:
+            mie_map = self._standardized_mass_index_energy_map(mie_map)
+        return mie_map
 
-    def _set_mass_interaction_index_energy_map(self):
-        """Retrieves the
+    @lazy_map
+    def _mass_interaction_index_energy_map(self):
+        """The
             mass number -> (a, b, c, d, j) -> energy
         mapping for the directory
         """
-        miiem = (get_miie_map(self.dir, fpath_list=self.files))
+        miiem = (get_miie_map(self.dir, fpath_list=self._source_files()))
         # Turn each tuple into a named tuple
         for A in miiem.keys():
             tuple_energy_map = miiem[A]
@@ -118,25 +128,29 @@ class DatumInt(Datum):
                 nextk = TwoBodyInteraction(*nextk)
                 next_tuple_energy_map[nextk] = v
             miiem[A] = next_tuple_energy_map
-        self._mass_interaction_index_energy_map = miiem
+        if self.standardized_indexing:
+            miiem = self._standardized_mass_interaction_index_energy_map(
+                miiem)
+        return miiem
 
-    def _set_zero_body_term_map(self):
-        self._mass_zero_body_term_map = (
-            mass_to_zbt_map(self.dir, fpath_list=self.files))
+    @lazy_map
+    def _mass_zero_body_term_map(self):
+        return mass_to_zbt_map(self.dir, fpath_list=self._source_files())
 
     def _set_name(self):
         """Sets the incidence name variable
         """
         self.name = name_from_filename(self.files[0])
 
-    def _set_other_constants(self):
-        """Sets other heading constants. Assumes all files in a given directory
+    @lazy_map
+    def _other_constants(self):
+        """Other heading constants. Assumes all files in a given directory
         have the same constants.
         I do not know what these are, hence the name "other constants."
         They are the values that follow the single particle energies on
         the first non-comment line in the interaction files.
         """
-        self._other_constants = oc_from_filename(self.files[0])
+        return oc_from_filename(self._source_files()[0])
 
     def _organize_files(self, directory, dir_fmt, file_fmt):
         """Give the files standardized names and put them in a similarly-named
@@ -161,17 +175,10 @@ class DatumInt(Datum):
                 link(f, new_f)
         self._unorg_files, self.files = self.files, next_files
 
-    def _standardize_indexing(self):
-        self._standardize_mass_index_energy_map_indexing()
-        self._standardize_mass_interaction_index_energy_map_indexing()
-        self._particular_index_orbital_map = self._index_orbital_map
-        self._index_orbital_map = self.standard_index_orbital_map
-
-    def _standardize_mass_index_energy_map_indexing(self):
+    def _standardized_mass_index_energy_map(self, mie_map):
         """Reformat the mass -> index -> energy map indices to be with respect
         to the standard io_map
         """
-        mie_map = self._mass_index_spe_map
         std_mie_map = dict()
         for m, ie_map in mie_map.items():
             std_ie_map = dict()
@@ -179,10 +186,9 @@ class DatumInt(Datum):
                 next_idx = self._standard_index(idx)
                 std_ie_map[next_idx] = energy
             std_mie_map[m] = std_ie_map
-        self._mass_index_spe_map = std_mie_map
+        return std_mie_map
 
-    def _standardize_mass_interaction_index_energy_map_indexing(self):
-        miie_map = self._mass_interaction_index_energy_map
+    def _standardized_mass_interaction_index_energy_map(self, miie_map):
         std_miie_map = dict()
         for m, iie_map in miie_map.items():
             std_iie_map = dict()
@@ -190,7 +196,7 @@ class DatumInt(Datum):
                 next_ii = self._standardize_interaction_index_tuple(ii)
                 std_iie_map[next_ii] = energy
             std_miie_map[m] = std_iie_map
-        self._mass_interaction_index_energy_map = std_miie_map
+        return std_miie_map
 
     def _standard_orbital_index_map(self):
         return {v: k for k, v in self.standard_index_orbital_map.items()}
@@ -200,9 +206,13 @@ class DatumInt(Datum):
         next_tuple += tuple(ii_tuple[4:])
         return TwoBodyInteraction(*next_tuple)
 
+    @lazy_map
+    def _std_orbital_index_map(self):
+        return self._standard_orbital_index_map()
+
     def _standard_index(self, i):
-        io_map = self._index_orbital_map
-        soi_map = self._standard_orbital_index_map()
+        io_map = self._particular_index_orbital_map
+        soi_map = self._std_orbital_index_map
         return soi_map[io_map[i]]
 
     def index_orbital_map(self):
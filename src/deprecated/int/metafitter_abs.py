@@ -169,7 +169,11 @@ def single_particle_metafit_int(
         _data_map=DataMapInt,
         _get_plots=_get_plots_single_particle,
         _get_plot=_get_plot_single_particle,
-        _printer=_printer_for_single_particle_metafit
+        _printer=_printer_for_single_particle_metafit,
+        params_guess=None,
+        transformed_plots=None,
+        instrumentation=None,
+        instrumentation_jsonl=None,
 ):
     """A meta-fit for all the orbitals with a given e, hw, and rp,
      based on the given fit function
@@ -245,6 +249,14 @@ def single_particle_metafit_int(
     a particle plot from the available maps. Default gets the appropriate
     tuple for a single particle plot.
     :param _printer: The function to use to print results.
+    :param params_guess: (optional) initial guess of the fit parameters. If
+    None, the guess is made by fitting to the first plot.
+    :param transformed_plots: (optional) already transformed plots to fit
+    directly, instead of getting them from the data map and transforming them
+    :param instrumentation: (optional) Instrumentation in which to record
+    stage timings and counters (see metafit.metafitter_abs)
+    :param instrumentation_jsonl: (optional) path of a file to which to
+    append the timings and counters as a line of JSON
     :return: mf_results, lr_results, plots, fitfn, info_dict
     """
     if super_transform is None:
@@ -265,7 +277,10 @@ def single_particle_metafit_int(
         _cmap=_cmap, _legend_size=_legend_size, _savename=_savename,
         _plot_sort_key=_plot_sort_key, _get_data_from_map=_get_data,
         _data_map_type=_data_map, _get_plot=_get_plot, _get_plots=_get_plots,
-        _printer=_printer
+        _printer=_printer, params_guess=params_guess,
+        transformed_plots=transformed_plots,
+        instrumentation=instrumentation,
+        instrumentation_jsonl=instrumentation_jsonl
     )
 
 
@@ -5,10 +5,13 @@ from __future__ import print_function, division, unicode_literals
 
 from warnings import warn
 
+import numpy as np
+
 from State import State
 from parser import a_aeff_nhw_to_states_map
 
-from deprecated.Datum import Datum
+from deprecated.Datum import Datum, lazy_map
+from parsers.SpectralIndex import SpectralIndex
 
 MSG1 = (
     '\nInsufficient keyword arguments to evaluate {}.'
@@ -49,6 +52,17 @@ class GroundStateNotFoundException(Exception):
     pass
 
 
+def _get_spectral_index(states, j_tol):
+    """Returns the SpectralIndex of the given list of State, whose states are
+    the positions of the State in the list
+    :param states: list of State (see State.py)
+    :param j_tol: tolerance in matching J to a multiple of 1/2
+    """
+    return SpectralIndex(
+        states=np.arange(len(states)), energies=[s.E for s in states],
+        j_list=[s.J for s in states], j_tol=j_tol)
+
+
 # todo: This only filters out incorrect ground states for some cases
 # todo: Extend to make general
 def _get_ground_state(mass, states, nshell):
@@ -67,29 +81,34 @@ def _get_ground_state(mass, states, nshell):
             '\nGround state angular momentum not known for A={}, nshell={}.'
             'Using state with lowest energy.'.format(mass, nshell))
         return states[0]
+    i0, e0 = _get_spectral_index(states, j_tol=0).ground_state(j0)
+    if i0 is not None:
+        return states[i0]
     else:
-        for state in states:
-            if state.J == j0:
-                return state
-        else:
-            warn(
-                (
-                    '\nCould not find converged state with J={} for A={}'
-                    '\nAttempting to find approximate solution by rounding'
-                ).format(j0, mass)
-            )
-            return _get_ground_state_rounded(
-                mass=mass, states=states, nshell=nshell)
+        warn(
+            (
+                '\nCould not find converged state with J={} for A={}'
+                '\nAttempting to find approximate solution by rounding'
+            ).format(j0, mass)
+        )
+        return _get_ground_state_rounded(
+            mass=mass, states=states, nshell=nshell)
 
 
 def _get_ground_state_rounded(mass, states, nshell, round_place=4):
+    """Returns the lowest energy state whose J rounds to the ground state J
+    at round_place decimal places, or, if there is none, at successively
+    fewer places, down to 1. (The SpectralIndex matches each J to the
+    nearest multiple of 1/2, so a coarser rounding cannot be used.)
+    """
     j0 = get_ground_state_j(mass=mass, nshell=nshell)
-    if round_place < 0:
+    if round_place < 1:
         raise GroundStateNotFoundException(
             'Could not find state with J={} for A={}'.format(j0, mass))
-    for state in states:
-        if round(state.J, round_place) == j0:
-            return state
+    i0, e0 = _get_spectral_index(
+        states, j_tol=0.5 * 10 ** -round_place).ground_state(j0)
+    if i0 is not None:
+        return states[i0]
     else:
         return _get_ground_state_rounded(
             mass=mass, states=states, nshell=nshell, round_place=round_place-1)
@@ -131,19 +150,21 @@ class DatumNcsmOut(Datum):
         """
         super(DatumNcsmOut, self).__init__(
             directory=directory, exp=exp, files=files)
-        # maps
-        self._a_aeff_nhw_to_states_map = dict()
-        # setup methods
-        self._set_maps()
+        # maps are made from the files when first accessed
 
     def _set_maps(self):
-        self._set_a_aeff_nhw_to_states_map()
+        """Make all of the maps now, rather than on first access
+        """
+        getattr(self, '_a_aeff_nhw_to_states_map')
 
-    def _set_a_aeff_nhw_to_states_map(self):
+    @lazy_map
+    def _a_aeff_nhw_to_states_map(self):
         a_aeff_nhw_to_states = a_aeff_nhw_to_states_map(filepaths=self.files)
+        d = dict()
         for k, v in sorted(a_aeff_nhw_to_states.items()):
             if len(v) > 0:
-                self._a_aeff_nhw_to_states_map[k] = [State(*vi) for vi in v]
+                d[k] = [State(*vi) for vi in v]
+        return d
 
     def a_aeff_nmax_to_states_map(self, z):
         """Returns map
@@ -8,7 +8,7 @@ from deprecated.nushellx_lpt.parser import mass_to_n_to_state_data_map as mnbd_m
 from deprecated.nushellx_lpt.parser import mass_to_spe_line_data_map as mhd_map
 from deprecated.nushellx_lpt.parser import mass_to_zbt_map as mass_zbt_map
 
-from deprecated.Datum import Datum
+from deprecated.Datum import Datum, lazy_map
 from deprecated.nushellx_lpt.ExState import ExState
 
 
@@ -30,23 +30,24 @@ class DatumLpt(Datum):
         """
         super(DatumLpt, self).__init__(
             directory=directory, exp=exp, files=files)
-        self._mass_to_spe_line_map = None
-        self._mass_to_ex_states_map = None
-        self._mass_to_zbt_map = None
-        self._set_maps()
+        # Maps are made from the files when first accessed
 
     def _set_maps(self):
-        self._set_mass_to_spe_line_map()
-        self._set_mass_to_ex_states_map()
-        self._set_mass_to_zbt_map()
+        """Make all of the maps now, rather than on first access
+        """
+        for name in ('_mass_to_spe_line_map', '_mass_to_ex_states_map',
+                     '_mass_to_zbt_map'):
+            getattr(self, name)
 
-    def _set_mass_to_spe_line_map(self):
+    @lazy_map
+    def _mass_to_spe_line_map(self):
         try:
-            self._mass_to_spe_line_map = mhd_map(self.files)
+            return mhd_map(self.files)
         except ValueError:
-            self._mass_to_spe_line_map = None
+            return None
 
-    def _set_mass_to_ex_states_map(self):
+    @lazy_map
+    def _mass_to_ex_states_map(self):
         mass_n_body_map = mnbd_map(self.files)
         d = dict()
         for m, nb_map in mass_n_body_map.items():
@@ -54,10 +55,11 @@ class DatumLpt(Datum):
             for n, b in nb_map.items():
                 ex_states.append(ExState(n, *b))
             d[m] = ex_states
-        self._mass_to_ex_states_map = d
+        return d
 
-    def _set_mass_to_zbt_map(self):
-        self._mass_to_zbt_map = mass_zbt_map(fpath_list=self.files)
+    @lazy_map
+    def _mass_to_zbt_map(self):
+        return mass_zbt_map(fpath_list=self.files)
 
     def mass_to_spe_line_map(self):
         """Returns a map
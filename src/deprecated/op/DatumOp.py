@@ -13,7 +13,7 @@ from constants import F_PARSE_OP_RGX_0B as _RGX_0BT
 from constants import F_PARSE_OP_RGX_1B as _RGX_1BT
 from constants import F_PARSE_OP_RGX_2B as _RGX_2BT
 from constants import F_PARSE_OP_RGX_HERM as _RGX_H
-from deprecated.Datum import Datum
+from deprecated.Datum import Datum, lazy_map
 
 
 class DatumOp(Datum):
@@ -46,34 +46,54 @@ class DatumOp(Datum):
         self._rgx_0bt = _rgx_0bt
         self._rgx_1bt = _rgx_1bt
         self._rgx_2bt = _rgx_2bt
-
-        self._h_head = None
-        self._h_line = None
-        self._zbt = None
-        self._particles_to_1bt_trel_map = None
-        self._particles_interaction_to_2bt_trel_map = None
-
-        self._set_maps()
+        # Data is parsed from the file when first accessed
 
     def _set_maps(self):
-        h_head, h_line, zbt, trel_1bt_map, trel_2bt_map = data(
+        """Parse the file and make all of the maps now, rather than on first
+        access
+        """
+        getattr(self, '_particles_interaction_to_2bt_trel_map')
+
+    @lazy_map
+    def _data(self):
+        """(h_head, h_line, zbt, trel_1bt_map, trel_2bt_map) as parsed from
+        the file
+        """
+        return data(
             filepath=self.files[0],
             rgx_h=self._rgx_h,
             rgx_0bt=self._rgx_0bt,
             rgx_1bt=self._rgx_1bt,
             rgx_2bt=self._rgx_2bt
         )
-        self._h_head = h_head
-        self._h_line = h_line
-        self._zbt = zbt
-        self._particles_to_1bt_trel_map = dict()
-        for k, v, in trel_1bt_map.items():
-            self._particles_to_1bt_trel_map[TrelParticles(*k)] = v
-        self._particles_interaction_to_2bt_trel_map = dict()
-        for k, v in trel_2bt_map.items():
+
+    @property
+    def _h_head(self):
+        return self._data[0]
+
+    @property
+    def _h_line(self):
+        return self._data[1]
+
+    @property
+    def _zbt(self):
+        return self._data[2]
+
+    @lazy_map
+    def _particles_to_1bt_trel_map(self):
+        particles_to_1bt_trel_map = dict()
+        for k, v, in self._data[3].items():
+            particles_to_1bt_trel_map[TrelParticles(*k)] = v
+        return particles_to_1bt_trel_map
+
+    @lazy_map
+    def _particles_interaction_to_2bt_trel_map(self):
+        particles_interaction_to_2bt_trel_map = dict()
+        for k, v in self._data[4].items():
             next_k = TrelParticlesInteraction(
                 Particle(*k[0]), Particle(*k[1]), Interaction(*k[2]))
-            self._particles_interaction_to_2bt_trel_map[next_k] = v
+            particles_interaction_to_2bt_trel_map[next_k] = v
+        return particles_interaction_to_2bt_trel_map
 
     def h_head(self):
         """Returns the top line. I do not know what this is generally. In the
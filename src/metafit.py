@@ -41,6 +41,8 @@ from matplotlib import pyplot as plt
 from scipy.optimize import leastsq
 from scipy.stats import linregress
 from FitFunction import FitFunction
+from Instrumentation import Instrumentation, optional_timer
+from PlotBatch import PlotBatch
 from constants import P_TITLE, P_END
 from plotting import plot_the_plots
 
@@ -49,6 +51,10 @@ class FunctionDoesNotMatchParameterGuessException(Exception):
     pass
 
 
+class JacobianDoesNotMatchFiniteDifferenceException(Exception):
+    pass
+
+
 def exp_list_to_string(exp_list):
     """Get a concise string representation of an exp.
     """
@@ -65,40 +71,132 @@ def print_io_key(iomap, sortkey=lambda k: k, heading='Index key:'):
     print()
 
 
-def _mls(params, fitfn, lox, loy, const_lists, const_dicts):
+def _fit_values(fitfn, params, x, const_list, const_dict):
+    """Evaluate the fit function at each of the x values of a single plot
+    :param fitfn: the fit function. If this is a vectorized FitFunction, it is
+    evaluated on the whole x array at once; otherwise it is evaluated point by
+    point.
+    :param params: the parameters to give to the fit function
+    :param x: x array of values
+    :param const_list: list of constants associated with the plot
+    :param const_dict: dictionary of constants associated with the plot
+    :return: array of fit values, of the same shape as x
+    """
+    if isinstance(fitfn, FitFunction):
+        if fitfn.vectorized:
+            x = np.asarray(x, dtype=float)
+            return np.broadcast_to(
+                fitfn(x, params, const_list, const_dict), x.shape)
+        args = list([params])
+    else:
+        args = list(params)
+    args.extend([const_list, const_dict])
+    return np.array(list(map(lambda xi: fitfn(xi, *args), x)))
+
+
+def _mls(params, fitfn, xflat, yflat, offsets, const_lists, const_dicts):
     """Meta least squares function to be minimized.
     :param params: the parameters to give to the fit function
     :param fitfn: the fit function, which is of the form
     f(x, a, b, ..., n, *const) -> y, where x is a float, a...n are parameters
     to vary, const is a list of constants, and y is a float.
-    :param lox: x array of values
-    :param loy: y array of values
+    :param xflat: x arrays of all plots concatenated into one array
+    :param yflat: y arrays of all plots concatenated into one array
+    :param offsets: array of the index in xflat and yflat at which each plot
+    starts, followed by the total length
     :param const_lists: list of constants associated with each
-    :return: The difference between the flattened loy array and the flattened
+    :return: The difference between the flattened y array and the flattened
     yfit array
     """
-    yfit = list()
-    for x, cl, cd in zip(lox, const_lists, const_dicts):
-        if isinstance(fitfn, FitFunction):
-            args = list([params])
-        else:
-            args = list(params)
-        args.extend([cl, cd])
-        yfit.extend(list(map(lambda xi: fitfn(xi, *args), x)))
-    yflat = [item for y in loy for item in y]
-    return np.array(yflat) - np.array(yfit)
+    yfit = np.empty(len(yflat))
+    for i, j, cl, cd in zip(offsets, offsets[1:], const_lists, const_dicts):
+        yfit[i:j] = _fit_values(fitfn, params, xflat[i:j], cl, cd)
+    return yflat - yfit
+
+
+def _jacobian_values(fitfn, params, x, const_list, const_dict):
+    """Evaluate the derivatives of the fit function with respect to each of
+    the parameters at each of the x values of a single plot
+    :return: array of shape (num_fit_params, len(x))
+    """
+    if fitfn.vectorized:
+        return fitfn.jacobian(
+            np.asarray(x, dtype=float), params, const_list, const_dict)
+    return np.array(
+        [fitfn.jacobian(xi, params, const_list, const_dict) for xi in x]).T
+
+
+def _mls_jacobian(params, fitfn, xflat, yflat, offsets, const_lists,
+                  const_dicts):
+    """Jacobian of _mls with respect to the parameters, for use as the Dfun
+    argument to leastsq (with col_deriv=True). Takes the same arguments as
+    _mls.
+    :return: array of shape (num_fit_params, len(yflat))
+    """
+    jac = np.empty((len(params), len(yflat)))
+    for i, j, cl, cd in zip(offsets, offsets[1:], const_lists, const_dicts):
+        jac[:, i:j] = _jacobian_values(fitfn, params, xflat[i:j], cl, cd)
+    return -jac
+
+
+def _check_jacobian(params, args, rtol=1e-4, atol=1e-6):
+    """Compare the analytic jacobian of _mls at params with a central finite
+    difference estimate
+    :param params: parameters at which to compare
+    :param args: the other arguments to _mls
+    :param rtol: relative tolerance
+    :param atol: absolute tolerance
+    :raises JacobianDoesNotMatchFiniteDifferenceException: if the two do not
+    agree within the tolerances
+    """
+    params = np.array(params, dtype=float)
+    jac = _mls_jacobian(params, *args)
+    jac_fd = np.empty(jac.shape)
+    for k in range(len(params)):
+        h = 1e-6 * max(1.0, abs(params[k]))
+        dp = np.zeros(len(params))
+        dp[k] = h
+        jac_fd[k] = (_mls(params + dp, *args) - _mls(params - dp, *args)) / (2*h)
+    if not np.allclose(jac, jac_fd, rtol=rtol, atol=atol):
+        raise JacobianDoesNotMatchFiniteDifferenceException(
+            'Analytic jacobian of {} differs from the finite difference '
+            'estimate by up to {}'.format(
+                args[0].__name__, np.max(np.abs(jac - jac_fd))))
+
+
+def _flatten_plots(plots):
+    """Concatenate the plots into contiguous arrays
+    :param plots: list of plots (see definition of "plot" at top of file), or
+    a PlotBatch, in which case its arrays are used without copying
+    :return: (xflat, yflat, offsets, const_lists, const_dicts), where xflat
+    and yflat are the concatenated x and y arrays, and the data for the
+    plot at index k is in the slice offsets[k]:offsets[k+1]
+    """
+    batch = PlotBatch.from_plots(plots)
+    return (batch.x, batch.y, batch.offsets,
+            batch.const_lists, batch.const_dicts)
 
 
-def _meta_fit(plots, fitfn, params_guess, full_output=False, **lsqkwargs):
+def _meta_fit(plots, fitfn, params_guess, full_output=False,
+              use_jacobian=True, check_jacobian=False, instrumentation=None,
+              **lsqkwargs):
     """Perform a least squares fit using fitfn for multiple plots
     :param plots: A list of the 3-tuples each with (x, y, const), where x is an
     array of length L, y is an array of length L, and const is a list of
-    constants that are unique to the plot.
+    constants that are unique to the plot. May also be a PlotBatch.
     :param fitfn: A function of the form f(x, a, b, ...n, *const) -> y, where
     x is float, const is list, a to n are float parameters, and y is
     a float.
     :param params_guess: An initial guess of the fit parameters. The length of
     this list should be the same size as the number of arguments in fitfn - 1
+    :param use_jacobian: if true and fitfn is a FitFunction with an analytic
+    jacobian, it is given to leastsq. Otherwise, leastsq estimates the
+    jacobian by finite differences.
+    :param check_jacobian: if true, the analytic jacobian is compared with a
+    finite difference estimate at params_guess before fitting
+    :param instrumentation: (Optional) Instrumentation in which to count the
+    'residual evaluations' and 'jacobian evaluations' (including the initial
+    check calls made by leastsq) and the 'nfev' reported by leastsq
     :return: output of the leastsq function, i.e. (final_params, covariance_arr,
     infodict, message, integer_flag)
     """
@@ -108,27 +206,38 @@ def _meta_fit(plots, fitfn, params_guess, full_output=False, **lsqkwargs):
         num_fit_params = fitfn.__code__.co_argcount - 1
     if len(params_guess) != num_fit_params:
         raise FunctionDoesNotMatchParameterGuessException()
-    combined_x = list()
-    combined_y = list()
-    constants_lists = list()
-    constants_dicts = list()
-    for p in plots:
-        x, y, const_list, const_dict = p
-        combined_x.append(x)
-        combined_y.append(y)
-        constants_lists.append(const_list)
-        constants_dicts.append(const_dict)
-    return leastsq(
-        func=_mls, x0=params_guess,
-        args=(fitfn, combined_x, combined_y, constants_lists, constants_dicts),
-        full_output=full_output, **lsqkwargs
+    xflat, yflat, offsets, const_lists, const_dicts = _flatten_plots(plots)
+    args = (fitfn, xflat, yflat, offsets, const_lists, const_dicts)
+    if (use_jacobian and isinstance(fitfn, FitFunction) and
+            fitfn.has_jacobian() and 'Dfun' not in lsqkwargs):
+        if check_jacobian:
+            _check_jacobian(params_guess, args)
+        lsqkwargs.update({'Dfun': _mls_jacobian, 'col_deriv': True})
+    if instrumentation is None:
+        return leastsq(
+            func=_mls, x0=params_guess, args=args,
+            full_output=full_output, **lsqkwargs
+        )
+    if lsqkwargs.get('Dfun') is not None:
+        lsqkwargs['Dfun'] = instrumentation.counting(
+            lsqkwargs['Dfun'], 'jacobian evaluations')
+    # The full output is needed for nfev
+    result = leastsq(
+        func=instrumentation.counting(_mls, 'residual evaluations'),
+        x0=params_guess, args=args, full_output=True, **lsqkwargs
     )
+    instrumentation.count('nfev', result[2]['nfev'])
+    if full_output:
+        return result
+    else:
+        return result[0], result[4]
 
 
 # todo: combine transform, super_transform_pre, and super_transform_post into
 # todo: single super_transform argument
 def _meta_fit_with_transformation(
-        plots, super_transform, fitfn, full_output, idx):
+        plots, super_transform, fitfn, full_output, idx, params_guess=None,
+        instrumentation=None):
     """Perform a simultaneous fit on the given plots after transforming them
     with transform
     :param plots: list of plots. See definition of "plot" at top of file.
@@ -136,35 +245,48 @@ def _meta_fit_with_transformation(
     :param fitfn: fit function. See definition at top of file.
     :param full_output: if true, return full output of fit
     :param idx: I do not actually know what this is. It should be removed.
+    :param params_guess: (Optional) initial guess of the fit parameters, such
+    as the result of a previous fit on similar data. If None, the guess is
+    made by fitting to the first plot.
+    :param instrumentation: (Optional) Instrumentation in which to record the
+    time spent in each stage and the number of function evaluations. If
+    None, nothing is recorded.
     :return: mf_results, lr_results, plots, fitfn
     """
     # Transform plots
     if super_transform is not None:
-        plots = super_transform(plots)
+        with optional_timer(instrumentation, 'super_transform'):
+            plots = super_transform(plots)
+    if instrumentation is not None:
+        instrumentation.count('plots', len(plots))
     # Make an initial parameter guess based on the first plot
-    if isinstance(fitfn, FitFunction):
-        num_fit_params = fitfn.num_fit_params
+    if params_guess is not None:
+        param_guess = np.array(params_guess, dtype=float)
     else:
-        num_fit_params = fitfn.__code__.co_argcount - 1
-    param_guess = _meta_fit(
-        [plots[0]], fitfn, np.ones(num_fit_params)
-    )[0]
+        if isinstance(fitfn, FitFunction):
+            num_fit_params = fitfn.num_fit_params
+        else:
+            num_fit_params = fitfn.__code__.co_argcount - 1
+        with optional_timer(instrumentation, 'meta_fit_guess'):
+            param_guess = _meta_fit(
+                [plots[0]], fitfn, np.ones(num_fit_params),
+                instrumentation=instrumentation
+            )[0]
     # Do the meta-fit
-    mf_results = _meta_fit(plots, fitfn, param_guess, full_output=full_output)
+    with optional_timer(instrumentation, 'meta_fit'):
+        mf_results = _meta_fit(plots, fitfn, param_guess,
+                               full_output=full_output,
+                               instrumentation=instrumentation)
     params = mf_results[0]
     # Test goodness of fits
     lr_results = dict()
-    for p in plots:
-        x, y, const_list, const_dict = p
-        if isinstance(fitfn, FitFunction):
-            args = list([params])
-        else:
-            args = list(params)
-        args.extend([const_list, const_dict])
-        ypred = np.array(list(map(lambda xi: fitfn(xi, *args), x)))
-        yarr = np.array(y)
-        exp = const_dict['exp']
-        lr_results[(exp, const_dict[idx])] = linregress(yarr, ypred)
+    with optional_timer(instrumentation, 'linregress'):
+        for p in plots:
+            x, y, const_list, const_dict = p
+            ypred = _fit_values(fitfn, params, x, const_list, const_dict)
+            yarr = np.array(y)
+            exp = const_dict['exp']
+            lr_results[(exp, const_dict[idx])] = linregress(yarr, ypred)
     return mf_results, lr_results, plots, fitfn
 
 
@@ -192,6 +314,10 @@ def metafitter_abs(
         full_output=False,
         _code_pref='',  # todo: get rid of this parameter
         _std_io_map=None,
+        params_guess=None,
+        transformed_plots=None,
+        instrumentation=None,
+        instrumentation_jsonl=None,
 ):
     """An (abstract) function to be used by specific metafitters.
     Retrieves data from a given data map, transforms it, and fits to it
@@ -277,30 +403,61 @@ def metafitter_abs(
     :param _code_pref: Prefix to append to the code string.
     :param _std_io_map: A standard index -> orbital mapping scheme to use for
     generating the data representations
+    :param params_guess: (Optional) initial guess of the fit parameters. If
+    None, the guess is made by fitting to the first plot.
+    :param transformed_plots: (Optional) If included, these plots (already
+    transformed by super_transform, e.g. those returned by a previous call)
+    are fit directly, instead of getting the plots from the data map and
+    transforming them
+    :param instrumentation: (Optional) Instrumentation in which to record the
+    time spent in each stage (data_map, get_plots, super_transform,
+    meta_fit_guess, meta_fit, linregress, print, plot) and counters (exps,
+    files parsed, plots, residual evaluations, jacobian evaluations, nfev,
+    plots rendered). Its timings and counters are returned in the info dict
+    under 'instrumentation'. If None (and instrumentation_jsonl is None),
+    nothing is recorded.
+    :param instrumentation_jsonl: (Optional) path of a file to which to append
+    the timings and counters of this run as a line of JSON. If instrumentation
+    is None, a new Instrumentation is used for them.
     :return: mf_results, lr_results, plots, fitfn, info_dict
     """
+    instr = instrumentation
+    if instr is None and instrumentation_jsonl is not None:
+        instr = Instrumentation()
     code = _code_pref + code
     # Get index->orbital and index->mass->energy maps
-    if data_map is not None:
-        all_data_map = data_map
+    with optional_timer(instr, 'data_map'):
+        if data_map is not None:
+            all_data_map = data_map
+        else:
+            all_data_map = _data_map_type(
+                parent_directory=sourcedir,
+                exp_list=exp_list, exp_filter_fn=exp_filter_fn,
+                standard_indices=_std_io_map
+            )
+            if instr is not None:
+                instr.count('files parsed', all_data_map.map.num_files())
+        exp_list = all_data_map.map.keys()
+    if instr is not None:
+        instr.count('exps', len(exp_list))
+    if transformed_plots is not None:
+        plts = transformed_plots
+        fit_super_transform = None
     else:
-        all_data_map = _data_map_type(
-            parent_directory=sourcedir,
-            exp_list=exp_list, exp_filter_fn=exp_filter_fn,
-            standard_indices=_std_io_map
-        )
-    exp_list = all_data_map.map.keys()
-    plts = _get_plots(
-        exp_list=exp_list, all_data_map=all_data_map,
-        get_data=_get_data_from_map, print_key=print_key,
-        std_io_map=_std_io_map, get_plot=_get_plot
-    )
+        with optional_timer(instr, 'get_plots'):
+            plts = _get_plots(
+                exp_list=exp_list, all_data_map=all_data_map,
+                get_data=_get_data_from_map, print_key=print_key,
+                std_io_map=_std_io_map, get_plot=_get_plot
+            )
+        fit_super_transform = super_transform
     # Print index orbital map, if standard
     if print_key is True and _std_io_map is not None:
         print_io_key(_std_io_map, heading='Index key')
     rr = _meta_fit_with_transformation(
-        plots=plts, super_transform=super_transform,
+        plots=plts, super_transform=fit_super_transform,
         fitfn=fitfn, full_output=full_output, idx=_idx,
+        params_guess=params_guess, instrumentation=instr,
     )
     mf_results, lr_results, plots, fitfn = rr
     params = mf_results[0]
@@ -310,22 +467,28 @@ def metafitter_abs(
     )
     # Print results
     if print_results is True:
-        _printer(mf_results, lr_results, print_mf_results, print_lr_results,
-                 full_output, header=formatted_title)
+        with optional_timer(instr, 'print'):
+            _printer(mf_results, lr_results, print_mf_results,
+                     print_lr_results, full_output, header=formatted_title)
     # Plot results
     if show_plot is True:
-        plot_the_plots(
-            plots,
-            label=label, get_label_kwargs=_get_label_fmt_kwargs, idx_key=_idx,
-            title=formatted_title,
-            xlabel=xlabel, ylabel=ylabel,
-            data_line_style=_data_line_style, fit_line_style=_fit_line_style,
-            sort_key=_plot_sort_key,
-            cmap_name=_cmap,
-            show_fit=show_fit, fit_params=params, fitfn=fitfn,
-            include_legend=show_legend, legend_size=_legend_size,
-            dpath_fig=savedir_plots, fname=_savename, code=code
-        )
+        with optional_timer(instr, 'plot'):
+            plot_the_plots(
+                plots,
+                label=label, get_label_kwargs=_get_label_fmt_kwargs,
+                idx_key=_idx,
+                title=formatted_title,
+                xlabel=xlabel, ylabel=ylabel,
+                data_line_style=_data_line_style,
+                fit_line_style=_fit_line_style,
+                sort_key=_plot_sort_key,
+                cmap_name=_cmap,
+                show_fit=show_fit, fit_params=params, fitfn=fitfn,
+                include_legend=show_legend, legend_size=_legend_size,
+                dpath_fig=savedir_plots, fname=_savename, code=code
+            )
+        if instr is not None:
+            instr.count('plots rendered', len(plots))
         plt.show()
     # Make an info dict
     info = {
@@ -333,6 +496,12 @@ def metafitter_abs(
         'mf_name': mf_name,
         'ffn_name': fitfn.__name__,
         'ffn_code': fitfn.code if isinstance(fitfn, FitFunction) else '',
-        'exp_list': exp_list
+        'exp_list': exp_list,
     }
+    if instr is not None:
+        info['instrumentation'] = instr.as_dict()
+    if instrumentation_jsonl is not None:
+        instr.write_json_line(
+            instrumentation_jsonl, mf_name=mf_name, mf_code=code,
+            ffn_name=info['ffn_name'], ffn_code=info['ffn_code'])
     return rr + (info,)
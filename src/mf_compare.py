@@ -22,19 +22,188 @@ Definitions:
 from __future__ import division
 from __future__ import print_function
 
+import inspect
+import signal
 from itertools import combinations
 
 import numpy as np
 from deprecated.int import ExpInt
 
 from constants import DPATH_FILES_INT, STANDARD_IO_MAP
+from TransformCache import TransformCache, default_cache
 from constants import P_TITLE, P_BREAK, P_END, P_HEAD
 from deprecated.int.DataMapInt import DataMapInt
 
 
+# State shared with the subset refit workers. It is set before the process
+# pool is created, so that forked workers inherit it rather than having to
+# pickle the (unpicklable) fit function and data map.
+_SUBSET_REFIT_CONTEXT = dict()
+
+
+class CandidateTimeoutException(Exception):
+    pass
+
+
+# State shared with the tournament workers. As with _SUBSET_REFIT_CONTEXT,
+# it is set before the process pool is created so that forked workers
+# inherit it.
+_TOURNAMENT_CONTEXT = dict()
+
+
+def _raise_candidate_timeout(signum, frame):
+    raise CandidateTimeoutException()
+
+
+def _accepts_kwarg(fn, name):
+    """Returns true if fn can be given the keyword argument name, either
+    because it is one of its arguments or because it takes **kwargs
+    """
+    try:
+        spec = inspect.getargspec(fn)
+    except TypeError:
+        # Not a plain python function (e.g. a functools.partial), so its
+        # arguments cannot be checked
+        return True
+    return spec.keywords is not None or name in spec.args
+
+
+def _average_r2(lr_results):
+    """Returns the average r^2 value of the given linear regression results
+    """
+    r2 = 0
+    for v in lr_results.values():
+        r2 += v.rvalue ** 2
+    return r2 / len(lr_results)
+
+
+def _tournament_run(i):
+    """Run the metafitter on the i'th candidate fit function in the
+    tournament context and return (r2, res). If the candidate times out,
+    (None, None) is returned.
+    """
+    ctx = _TOURNAMENT_CONTEXT
+    mf_kwargs = dict(ctx['kwargs'])
+    if ctx['plots'] is not None:
+        mf_kwargs['transformed_plots'] = ctx['plots']
+    timeout = ctx['timeout']
+    if timeout is not None:
+        old_handler = signal.signal(signal.SIGALRM, _raise_candidate_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        with default_cache(ctx['transform_cache']):
+            res = ctx['metafitter'](
+                ctx['fitfns'][i], ctx['exp_list'],
+                imsrg_data_map=ctx['imsrg_data_map'], **mf_kwargs)
+    except CandidateTimeoutException:
+        return None, None
+    finally:
+        if timeout is not None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, old_handler)
+    return _average_r2(res[1]), res
+
+
+def _tournament_entry(i):
+    """Worker version of _tournament_run, which returns only the picklable
+    parts of the result: (i, r2, mf_results, lr_results, info_dict)
+    """
+    r2, res = _tournament_run(i)
+    if r2 is None:
+        return i, None, None, None, None
+    info = dict(res[4])
+    info['exp_list'] = list(info['exp_list'])
+    return i, r2, res[0], res[1], info
+
+
+def fit_function_tournament(
+        metafitter, fitfns, exp_list, imsrg_data_map, timeout=None,
+        share_plots=False, parallel=False, max_workers=None,
+        transform_cache=None, **kwargs
+):
+    """Generator that runs the metafitter with each of the candidate fit
+    functions, yielding (fitfn, r2, res) for each candidate that completes.
+    Candidates are run one after another until one of them completes. If
+    share_plots, its transformed plots are then shared with the remaining
+    candidates. The remaining candidates are run either in order or, if
+    parallel, in a pool of processes, in which case they are yielded in the
+    order in which they complete.
+    :param metafitter: the metafitter method. If share_plots is true, it
+    must accept a transformed_plots keyword argument.
+    :param fitfns: the list of fitfns to test
+    :param exp_list: list of exp to fit
+    :param imsrg_data_map: data map containing the data for all of exp_list,
+    shared by all of the candidates
+    :param timeout: (optional) maximum time in seconds to allow for each
+    candidate. Candidates taking longer are dropped. Relies on SIGALRM, so
+    must be called from the main thread.
+    :param share_plots: if true, the transformed plots from the first
+    candidate are passed to the metafitter for the remaining candidates,
+    rather than being regenerated for each one
+    :param parallel: if true, the candidates after the first are run in a
+    pool of processes
+    :param max_workers: maximum number of processes to use if parallel. If
+    None, the number of processors is used.
+    :param transform_cache: (optional) TransformCache to use as the default
+    cache while each candidate is run, so that the super-transforms made by
+    transforms_s.compose_super_transforms are applied to the plots only once
+    for all of the candidates. Worker processes start with a copy of the
+    cache as it is after the first candidate.
+    :param kwargs: keyword arguments to pass to the metafitter
+    :return: generator of (fitfn, r2, res) 3-tuples, where res is the
+    metafitter result (mf_results, lr_results, plots, fitfn, info_dict).
+    If parallel, the plots in res are those of the first completed
+    candidate.
+    """
+    if share_plots and not _accepts_kwarg(metafitter, 'transformed_plots'):
+        raise TypeError(
+            'share_plots requires a metafitter that accepts a '
+            'transformed_plots keyword argument; {} does not'.format(
+                metafitter.__name__))
+    _TOURNAMENT_CONTEXT.update(
+        metafitter=metafitter, fitfns=fitfns, exp_list=exp_list,
+        imsrg_data_map=imsrg_data_map, plots=None, timeout=timeout,
+        transform_cache=transform_cache, kwargs=kwargs,
+    )
+    try:
+        # Run candidates in order until the first that completes
+        plots = None
+        remaining = list()
+        for i in range(len(fitfns)):
+            r2, res = _tournament_run(i)
+            if r2 is not None:
+                plots = res[2]
+                if share_plots:
+                    _TOURNAMENT_CONTEXT['plots'] = plots
+                remaining = range(i + 1, len(fitfns))
+                yield fitfns[i], r2, res
+                break
+        # Run the remaining candidates
+        if not parallel:
+            for i in remaining:
+                r2, res = _tournament_run(i)
+                if r2 is not None:
+                    yield fitfns[i], r2, res
+        elif len(remaining) > 0:
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(_tournament_entry, i)
+                           for i in remaining]
+                for future in as_completed(futures):
+                    i, r2, mf_results, lr_results, info = future.result()
+                    if r2 is not None:
+                        fitfn = fitfns[i]
+                        yield fitfn, r2, (
+                            mf_results, lr_results, plots, fitfn, info)
+    finally:
+        _TOURNAMENT_CONTEXT.clear()
+
+
 def max_r2_value(
         metafitter, fitfns, e_hw_pairs, print_r2_results=False,
-        dpath_source=DPATH_FILES_INT, std_io_map=STANDARD_IO_MAP, **kwargs
+        dpath_source=DPATH_FILES_INT, std_io_map=STANDARD_IO_MAP,
+        timeout=None, share_plots=False, parallel=False, max_workers=None,
+        cache_transforms=True, **kwargs
 ):
     """Returns the fit function (and its optimized results) that produces the
     largest total r^2 value
@@ -45,6 +214,16 @@ def max_r2_value(
     :param fitfns: the list of fitfns to test
     :param e_hw_pairs: the (e, hw) pairs to optimize
     :param std_io_map: A standard io-mapping scheme to use
+    :param timeout: (optional) maximum time in seconds to allow for each fit
+    function. Fit functions taking longer are left out of the results.
+    :param share_plots: if true, the plots are generated and transformed
+    only once, and shared by all of the fits. The metafitter must then accept
+    a transformed_plots keyword argument.
+    :param parallel: if true, the fits are done in a pool of processes
+    :param max_workers: maximum number of processes to use if parallel
+    :param cache_transforms: if true, the outputs of the super-transforms
+    made by compose_super_transforms are cached and shared by all of the
+    fits (see fit_function_tournament)
     :param kwargs: keyword arguments to pass to the metafitter
     :return: best fit function, results
     """
@@ -54,18 +233,14 @@ def max_r2_value(
         standard_indices=std_io_map
     )
     fn_res_r2_map = dict()
-    for fitfn in fitfns:
-        try:
-            res = metafitter(
-                fitfn, exp_list, imsrg_data_map=imsrg_data_map, **kwargs)
-        except TypeError:
-            continue
-        lg_res = res[1]
-        r2 = 0
-        for v in lg_res.values():
-            r = v.rvalue
-            r2 += r ** 2
-        r2 /= len(lg_res)
+    for fitfn, r2, res in fit_function_tournament(
+            metafitter=metafitter, fitfns=fitfns, exp_list=exp_list,
+            imsrg_data_map=imsrg_data_map, timeout=timeout,
+            share_plots=share_plots,
+            parallel=parallel, max_workers=max_workers,
+            transform_cache=TransformCache() if cache_transforms else None,
+            **kwargs
+    ):
         fn_res_r2_map[fitfn] = (res, r2)
     rank_map = dict()
     result_map = dict()
@@ -98,10 +273,73 @@ def _printer_for_max_r2_value(rank_map, metafitter, e_hw_pairs):
         print(body_str)
 
 
+def _subset_refit(i):
+    ctx = _SUBSET_REFIT_CONTEXT
+    mf_kwargs = dict(imsrg_data_map=ctx['imsrg_data_map'])
+    if ctx['params_guess'] is not None:
+        mf_kwargs['params_guess'] = ctx['params_guess']
+    with default_cache(ctx['transform_cache']):
+        params = ctx['metafitter'](
+            ctx['fitfn'], ctx['subsets'][i], **mf_kwargs)[0][0]
+    return i, params
+
+
+def subset_refits(
+        metafitter, fitfn, e_hw_pairs, depth, imsrg_data_map,
+        params_guess=None, parallel=False, max_workers=None,
+        transform_cache=None
+):
+    """Generator that refits the metafitter on every sub-combination of
+    e_hw_pairs of length len(e_hw_pairs) - 1 down to
+    len(e_hw_pairs) - depth, yielding each result as soon as it is done.
+    :param metafitter: meta-fitting method to use
+    :param fitfn: fit function to use
+    :param e_hw_pairs: set of (e, hw) pairs to look at
+    :param depth: depth of sub-combinations of e_hw_pairs to look at
+    :param imsrg_data_map: data map containing the data for all of
+    e_hw_pairs, shared by all of the fits
+    :param params_guess: (optional) initial parameter guess to pass to the
+    metafitter for every subset, e.g. the parameters from the full set. If
+    None, the metafitter makes its own guess.
+    :param parallel: if true, the fits are done in a pool of processes and
+    yielded in the order in which they complete. Otherwise they are done
+    one after another, in the order of the combinations.
+    :param max_workers: maximum number of processes to use if parallel. If
+    None, the number of processors is used.
+    :param transform_cache: (optional) TransformCache to use as the default
+    cache while each subset is fit (see fit_function_tournament)
+    :return: generator of (sub_e_hw_pairs, params) 2-tuples
+    """
+    subsets = list()
+    for length in range(len(e_hw_pairs) - 1, len(e_hw_pairs) - depth - 1, -1):
+        subsets.extend(combinations(e_hw_pairs, length))
+    _SUBSET_REFIT_CONTEXT.update(
+        metafitter=metafitter, fitfn=fitfn, subsets=subsets,
+        imsrg_data_map=imsrg_data_map, params_guess=params_guess,
+        transform_cache=transform_cache,
+    )
+    try:
+        if not parallel:
+            for i in range(len(subsets)):
+                yield subsets[i], _subset_refit(i)[1]
+        else:
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(_subset_refit, i)
+                           for i in range(len(subsets))]
+                for future in as_completed(futures):
+                    i, params = future.result()
+                    yield subsets[i], params
+    finally:
+        _SUBSET_REFIT_CONTEXT.clear()
+
+
 def compare_params(
         metafitter, fitfn, e_hw_pairs, depth, statfn=np.std,
         print_compare_results=False, dpath_source=DPATH_FILES_INT,
-        std_io_map=STANDARD_IO_MAP, **kwargs
+        std_io_map=STANDARD_IO_MAP, warm_start=False, parallel=False,
+        max_workers=None, subset_callback=None, cache_transforms=True,
+        **kwargs
 ):
     """Compare parameter results for a given metafitter on a given fitfn using
     combinations of the given e_hw_pairs to the depth given by depth. The
@@ -122,6 +360,17 @@ def compare_params(
     :param dpath_source: directory from which to retrieve the files
     :param std_io_map: a standard index -> orbital mapping scheme to use fo the
     generated imsrg_data_map
+    :param warm_start: if true, the parameters from the fit to all of
+    e_hw_pairs are used as the initial guess for each of the subset fits.
+    This is only done if the metafitter accepts a params_guess keyword
+    argument.
+    :param parallel: if true, the subset fits are done in a pool of processes
+    :param max_workers: maximum number of processes to use if parallel
+    :param subset_callback: (optional) function f(sub_e_hw_pairs, params)
+    called with the result of each subset fit as soon as it completes
+    :param cache_transforms: if true, the outputs of the super-transforms
+    made by compose_super_transforms are cached and shared by all of the
+    fits (see fit_function_tournament)
     :param kwargs: keyword arguments to be passed to the metafitter
     :return: a list of (param, result, relative result) 3-tuples
     """
@@ -130,14 +379,22 @@ def compare_params(
         dpath_source, exp_list=exp_list, standard_indices=std_io_map)
     if depth > len(e_hw_pairs) - 1:
         depth = len(e_hw_pairs) - 1
-    params = metafitter(fitfn, e_hw_pairs,
-                        imsrg_data_map=imsrg_data_map, **kwargs)[0][0]
+    transform_cache = TransformCache() if cache_transforms else None
+    with default_cache(transform_cache):
+        params = metafitter(fitfn, e_hw_pairs,
+                            imsrg_data_map=imsrg_data_map, **kwargs)[0][0]
     all_params_lists = list([params])
-    for length in range(len(e_hw_pairs) - 1, len(e_hw_pairs) - depth - 1, -1):
-        for sub_e_hw_pairs in combinations(e_hw_pairs, length):
-            mod_params = metafitter(fitfn, sub_e_hw_pairs,
-                                    imsrg_data_map=imsrg_data_map)[0][0]
-            all_params_lists.append(mod_params)
+    use_guess = warm_start and _accepts_kwarg(metafitter, 'params_guess')
+    for sub_e_hw_pairs, mod_params in subset_refits(
+            metafitter=metafitter, fitfn=fitfn, e_hw_pairs=e_hw_pairs,
+            depth=depth, imsrg_data_map=imsrg_data_map,
+            params_guess=params if use_guess else None,
+            parallel=parallel, max_workers=max_workers,
+            transform_cache=transform_cache
+    ):
+        if subset_callback is not None:
+            subset_callback(sub_e_hw_pairs, mod_params)
+        all_params_lists.append(mod_params)
     individual_params_lists = _distributions_from_lol(all_params_lists)
     param_result_list = list()
     for param, param_list in zip(params, individual_params_lists):
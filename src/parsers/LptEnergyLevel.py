@@ -22,3 +22,13 @@ class LptEnergyLevel(namedtuple(
         v = self._asdict().values()
         v[3:5] = j_str, t_str
         return s.format(*v)
+
+
+# noinspection PyClassHasNoInit
+class LptEnergyLevelArrays(namedtuple(
+    'LptEnergyLevelArrays', ['N', 'NJ', 'E', 'J', 'Tz', 'p']
+)):
+    """Holds the body data for *.lpt files as parallel arrays, in the order
+    of the lines in the file
+    """
+    __slots__ = ()
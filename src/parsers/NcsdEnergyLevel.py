@@ -19,3 +19,21 @@ class NcsdEnergyLevel(namedtuple('NcsdEnergyLevel', ['N', 'J', 'T'])):
 
     def __str__(self):
         return str(tuple(self._asdict().values())).replace(', None', '')
+
+
+# noinspection PyClassHasNoInit
+class NcsdEnergyLevelArrays(namedtuple(
+    'NcsdEnergyLevelArrays', ['N', 'J', 'T', 'E']
+)):
+    """Stores the data for all of the states in a file as parallel arrays,
+    ordered by state number
+        N:
+            state numbers
+        J:
+            angular momenta
+        T:
+            isospins
+        E:
+            energies
+    """
+    __slots__ = ()
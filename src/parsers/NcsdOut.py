@@ -4,8 +4,10 @@ Store dat from NCSD output *.out files
 from __future__ import print_function, division, unicode_literals
 from re import compile
 from os import path
+import numpy as np
 from Parser import Parser
-from NcsdEnergyLevel import NcsdEnergyLevel
+from NcsdEnergyLevel import NcsdEnergyLevel, NcsdEnergyLevelArrays
+from SpectralIndex import SpectralIndex
 
 
 RGX_SPLIT = compile(b'\s*[=#]\s*|\s+')
@@ -25,6 +27,8 @@ class NcsdOut(Parser):
         self.nhw = 0
         self.nmax = 0
         self.energy_levels = dict()
+        self._energy_level_arrays = None
+        self._spectral_index = None
         super(NcsdOut, self).__init__(filepath)
 
     def __lt__(self, other):
@@ -39,6 +43,32 @@ class NcsdOut(Parser):
     def __hash__(self):
         return hash((self.z, self.n, self.nmax))
 
+    def energy_level_arrays(self):
+        """Returns the energy levels as an NcsdEnergyLevelArrays, in which
+        the N, J, T, and energy of the states are stored as numpy arrays in
+        order of N. The arrays are made on the first call.
+        """
+        if self._energy_level_arrays is None:
+            levels = sorted(self.energy_levels.items())
+            self._energy_level_arrays = NcsdEnergyLevelArrays(
+                N=np.array([s.N for s, e in levels], dtype=int),
+                J=np.array([s.J for s, e in levels], dtype=float),
+                T=np.array([s.T for s, e in levels], dtype=float),
+                E=np.array([e for s, e in levels], dtype=float),
+            )
+        return self._energy_level_arrays
+
+    def spectral_index(self):
+        """Returns the SpectralIndex of the energy levels by J and T. It is
+        made when the file is parsed.
+        """
+        if self._spectral_index is None:
+            levels = self.energy_level_arrays()
+            self._spectral_index = SpectralIndex(
+                states=levels.N, energies=levels.E, j_list=levels.J,
+                sub_list=levels.T)
+        return self._spectral_index
+
     def _get_data_aeff(self):
         fname = path.split(self.filepath)[-1]
         self.aeff = int(compile(b'_').split(fname)[1])
@@ -49,7 +79,7 @@ class NcsdOut(Parser):
             self.z = int(split_line[1])
             self.n = int(split_line[3])
             self.hw = int(float(split_line[5]))
-        super(NcsdOut, self)._get_data_line_fn(
+        self._add_rule(
             line_regex=RGX_ZN_LINE, match_fn=match_fn,
             data_name='Z, N, and HW')
 
@@ -60,7 +90,7 @@ class NcsdOut(Parser):
                 self.beta_cm = 0
             else:
                 self.beta_cm = float(split_line[-1])
-        super(NcsdOut, self)._get_data_line_fn(
+        self._add_rule(
             line_regex=RGX_BETA_CM_LINE, match_fn=match_fn,
             data_name='BETA CM')
 
@@ -69,7 +99,7 @@ class NcsdOut(Parser):
             split_line = RGX_SPLIT.split(line.strip())
             self.nhw = int(split_line[1])
             self.nmax = int(split_line[3])
-        super(NcsdOut, self)._get_data_line_fn(
+        self._add_rule(
             line_regex=RGX_NHW_NMAX_LINE, match_fn=match_fn,
             data_name='NHW and NMAX')
 
@@ -81,9 +111,9 @@ class NcsdOut(Parser):
             j = round(float(split_line[5]), 1)
             t = round(float(split_line[7]), 1)
             self.energy_levels[NcsdEnergyLevel(n, j, t)] = e
-        super(NcsdOut, self)._get_data_lines_fn(
+        self._add_rule(
             line_regex=RGX_ENERGY_LEVELS_LINE, match_fn=match_fn,
-            data_name='ENERGY LEVELS')
+            data_name='ENERGY LEVELS', first_only=False)
 
     def _get_data(self):
         self._get_data_aeff()
@@ -91,6 +121,8 @@ class NcsdOut(Parser):
         self._get_data_beta_cm()
         self._get_data_nhw_nmax()
         self._get_data_energy_levels()
+        self._scan()
+        self.spectral_index()
 
 
 # n = NcsdOut('~/workspace/triumf/tr-c-ncsm/old/'
@@ -2,28 +2,45 @@
 Store dat from Nushell Interaction *.int files
 """
 from __future__ import print_function, division, unicode_literals
-from re import compile
-from Parser import Parser, ItemNotFoundInFileException
+from re import compile, MULTILINE
+from os import path
+import numpy as np
+from Parser import Parser, StopScan
 from NushellOrbital import NushellOrbital
-from NushellTbme import NushellTbme
+from TbmeStore import TbmeStore
 
 
 RGX_ZERO_BODY_TERM = compile('.*Zero\sbody\sterm:')
 RGX_INDEX_LINE = compile('^\s*!(\s+\d+){5}')
 RGX_SINGLE_PARTICLE_ENERGIES = compile('-999')
 RGX_TWO_BODY_MATRIX_ELEMENTS = compile('\s*(\d+\s+){6}-?\d+\.\d+')
+RGX_TWO_BODY_MATRIX_ELEMENTS_BLOCK = compile(
+    br'^[ \t]*(\d+[ \t]+){6}-?\d+\.\d+', MULTILINE)
 RGX_PRESC_LINE = compile('^\s*!\s*Effective')
 RGX_PRESC_STR = compile('.*\s*\d+,\s*\d+,\s*\d+\s*.*')
 
 
 class NushellxInt(Parser):
+    """Parser for *.int files. The two-body matrix elements, which are
+    all of the lines from the first one to the end of the file, are read
+    with a single bulk conversion to an array. If that block turns out
+    not to hold only TBME lines, the file is parsed again line by line.
+    """
+    _bulk_tbme = True
+
     def __init__(self, filepath):
+        self._reset()
+        super(NushellxInt, self).__init__(filepath)
+
+    def _reset(self):
+        """Set the data to their values before the file is parsed"""
         self.a_prescription = None
         self.zero_body_term = 0
         self.index_map = dict()
         self.single_particle_energies = list()
-        self.two_body_matrix_elements = dict()
-        super(NushellxInt, self).__init__(filepath)
+        self.two_body_matrix_elements = None
+        self._tbme_labels = list()
+        self._tbme_values = list()
 
     def _get_a_prescription(self):
         def match_fn(line):
@@ -34,17 +51,18 @@ class NushellxInt(Parser):
                 self.a_prescription = tuple([int(p) for p in presc])
             else:
                 self.a_prescription = (int(presc_str.strip()),) * 3
-        try:
-            super(NushellxInt, self)._get_data_line_fn(
-                line_regex=RGX_PRESC_LINE, match_fn=match_fn,
-                data_name='A PRESCRIPTION')
-        except ItemNotFoundInFileException:
+
+        # noinspection PyUnusedLocal
+        def not_found_fn(exc):
             pass
+        self._add_rule(
+            line_regex=RGX_PRESC_LINE, match_fn=match_fn,
+            data_name='A PRESCRIPTION', not_found_fn=not_found_fn)
 
     def _get_zero_body_term(self):
         def match_fn(line):
             self.zero_body_term = float(line.strip().split(' ')[-1])
-        super(NushellxInt, self)._get_data_line_fn(
+        self._add_rule(
             line_regex=RGX_ZERO_BODY_TERM, match_fn=match_fn,
             data_name='ZERO BODY TERM')
 
@@ -52,33 +70,126 @@ class NushellxInt(Parser):
         def match_fn(line):
             nums = map(lambda s: int(s), line.strip().split()[1:])
             self.index_map[nums[0]] = NushellOrbital(*nums[1:])
-        super(NushellxInt, self)._get_data_lines_fn(
+        self._add_rule(
             line_regex=RGX_INDEX_LINE, match_fn=match_fn,
-            data_name='INDEX MAP')
+            data_name='INDEX MAP', first_only=False)
 
     def _get_single_particle_energies(self):
         def match_fn(line):
             nums = map(lambda s: float(s), line.strip().split()[1:])
             self.single_particle_energies.extend(nums[:len(self.index_map)])
-        super(NushellxInt, self)._get_data_lines_fn(
+        self._add_rule(
             line_regex=RGX_SINGLE_PARTICLE_ENERGIES, match_fn=match_fn,
-            data_name='SINGLE PARTICLE ENERGIES')
+            data_name='SINGLE PARTICLE ENERGIES', first_only=False)
 
     def _get_two_body_matrix_elements(self):
+        if self._bulk_tbme:
+            # The TBME block is read by _read_two_body_matrix_elements_block
+            # noinspection PyUnusedLocal
+            def match_fn(line):
+                raise StopScan()
+            self._add_rule(
+                line_regex=RGX_TWO_BODY_MATRIX_ELEMENTS, match_fn=match_fn,
+                data_name='TWO BODY MATRIX ELEMENTS')
+            return
+
         def match_fn(line):
             tbme = map(lambda s: int(s), line.strip().split()[:6])
             value = float(line.strip().split()[-1])
-            self.two_body_matrix_elements[NushellTbme(*tbme)] = value
-        super(NushellxInt, self)._get_data_lines_fn(
+            self._tbme_labels.append(tbme)
+            self._tbme_values.append(value)
+        self._add_rule(
             line_regex=RGX_TWO_BODY_MATRIX_ELEMENTS, match_fn=match_fn,
-            data_name='TWO BODY MATRIX ELEMENTS')
+            data_name='TWO BODY MATRIX ELEMENTS', first_only=False)
 
-    def _get_data(self):
+    def _read_two_body_matrix_elements_block(self):
+        """Read the block of lines from the first TBME line to the end of the
+        file as a single array of numbers
+        :return: (labels, values), the (n, 6) array of TBME labels and the
+        array of the n values, or None if the block is not made up only of
+        lines of 6 labels and a value
+        """
+        with open(self.filepath, 'rb') as f:
+            data = f.read()
+        m = RGX_TWO_BODY_MATRIX_ELEMENTS_BLOCK.search(data)
+        if m is None:
+            return None
+        block = data[m.start():].rstrip()
+        try:
+            nums = np.array(block.split(), dtype=np.float64)
+        except ValueError:
+            return None
+        num_lines = block.count(b'\n') + 1
+        if len(nums) != 7 * num_lines:
+            return None
+        nums = nums.reshape(num_lines, 7)
+        labels = nums[:, :6]
+        if np.any(labels < 0) or np.any(labels != np.floor(labels)):
+            return None
+        return labels.astype(np.int64), nums[:, 6]
+
+    def _set_two_body_matrix_elements(self):
+        """Store the parsed TBMEs in a TbmeStore, which maps NushellTbme to
+        value as the dict used to
+        """
+        self.two_body_matrix_elements = TbmeStore.from_lists(
+            self._tbme_labels, self._tbme_values)
+        del self._tbme_labels, self._tbme_values
+
+    def _scan_lines(self):
+        """Add the rules for each of the data and scan the file with them"""
         self._get_a_prescription()
         self._get_zero_body_term()
         self._get_index_map()
         self._get_single_particle_energies()
         self._get_two_body_matrix_elements()
+        self._scan()
+
+    def _get_data(self):
+        self._scan_lines()
+        if self._bulk_tbme and self.two_body_matrix_elements is None:
+            block = self._read_two_body_matrix_elements_block()
+            if block is not None:
+                self._tbme_labels, self._tbme_values = block
+            else:
+                # Fall back to parsing every line with the regexes
+                self._bulk_tbme = False
+                self._reset()
+                self._scan_lines()
+        self._set_two_body_matrix_elements()
+
+
+class NushellxIntNpy(NushellxInt):
+    """NushellxInt that keeps its TBMEs in .npy files next to the *.int
+    file. These are written the first time the file is parsed, and on later
+    parses, as long as they are newer than the file, they are memory-mapped
+    and reading of the file stops at the first TBME line.
+    """
+    def _tbme_fpath_prefix(self):
+        return path.abspath(self.filepath)
+
+    def _get_two_body_matrix_elements(self):
+        prefix = self._tbme_fpath_prefix()
+        mtime = TbmeStore.exists(prefix)
+        if mtime is None or mtime < path.getmtime(self.filepath):
+            return super(NushellxIntNpy, self)._get_two_body_matrix_elements()
+
+        # noinspection PyUnusedLocal
+        def match_fn(line):
+            raise StopScan()
+        self._add_rule(
+            line_regex=RGX_TWO_BODY_MATRIX_ELEMENTS, match_fn=match_fn,
+            data_name='TWO BODY MATRIX ELEMENTS')
+        self.two_body_matrix_elements = TbmeStore.load(prefix)
+
+    def _set_two_body_matrix_elements(self):
+        if self.two_body_matrix_elements is None:
+            super(NushellxIntNpy, self)._set_two_body_matrix_elements()
+            prefix = self._tbme_fpath_prefix()
+            self.two_body_matrix_elements.save(prefix)
+            self.two_body_matrix_elements = TbmeStore.load(prefix)
+        else:
+            del self._tbme_labels, self._tbme_values
 
 
 # n = NushellxInt('~/workspace/triumf/tr-c-nushellx/old/'
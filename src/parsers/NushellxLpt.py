@@ -3,9 +3,10 @@ Store dat from Nushell output *.lpt files
 """
 from __future__ import print_function, division, unicode_literals
 from re import compile
+import numpy as np
 from Parser import Parser
-from LptEnergyLevel import LptEnergyLevel
-from Parser import ItemNotFoundInFileException
+from LptEnergyLevel import LptEnergyLevel, LptEnergyLevelArrays
+from SpectralIndex import SpectralIndex
 
 RGX_SPLIT = compile(b'\s*[=#]\s*|\s+')
 RGX_AZ_LINE = compile(b'.*a\s*=\s*\d+\s+z\s*=\s*\d+')
@@ -19,30 +20,62 @@ class NushellxLpt(Parser):
         self.z = 0
         self.single_particle_energies = list()
         self.energy_levels = list()
+        self._energy_level_arrays = None
+        self._spectral_index = None
         super(NushellxLpt, self).__init__(filepath)
 
+    def energy_level_arrays(self):
+        """Returns the energy levels as an LptEnergyLevelArrays, in which
+        each field of the levels is stored as a numpy array, in the order of
+        energy_levels. The arrays are made on the first call.
+        """
+        if self._energy_level_arrays is None:
+            levels = self.energy_levels
+            self._energy_level_arrays = LptEnergyLevelArrays(
+                N=np.array([s.N for s in levels], dtype=int),
+                NJ=np.array([s.NJ for s in levels], dtype=int),
+                E=np.array([s.E for s in levels], dtype=float),
+                J=np.array([s.J for s in levels], dtype=float),
+                Tz=np.array([s.Tz for s in levels], dtype=float),
+                p=np.array([s.p for s in levels], dtype=int),
+            )
+        return self._energy_level_arrays
+
+    def spectral_index(self):
+        """Returns the SpectralIndex of the energy levels by J and parity.
+        It is made when the file is parsed.
+        """
+        if self._spectral_index is None:
+            levels = self.energy_level_arrays()
+            self._spectral_index = SpectralIndex(
+                states=levels.N, energies=levels.E, j_list=levels.J,
+                sub_list=levels.p)
+        return self._spectral_index
+
     def _get_data_az(self):
         def match_fn(line):
             self.a = int(RGX_SPLIT.split(line.strip())[1])
             self.z = int(RGX_SPLIT.split(line.strip())[3])
-        try:
-            super(NushellxLpt, self)._get_data_line_fn(
-                line_regex=RGX_AZ_LINE, match_fn=match_fn, data_name='A and Z')
-        except ItemNotFoundInFileException as e:
-            print(e.message)
-            raise  # critical issue: raise
+
+        def not_found_fn(exc):
+            print(exc.message)
+            raise exc  # critical issue: raise
+        self._add_rule(
+            line_regex=RGX_AZ_LINE, match_fn=match_fn, data_name='A and Z',
+            not_found_fn=not_found_fn)
 
     def _get_data_spe(self):
         def match_fn(line):
             nums = map(lambda s: float(s), line.strip().split()[3:-1])
             self.single_particle_energies.extend(nums)
-        try:
-            super(NushellxLpt, self)._get_data_lines_fn(
-                line_regex=RGX_SPE_LINE, match_fn=match_fn,
-                data_name='SINGLE PARTICLE ENERGIES'
-            )
-        except ItemNotFoundInFileException as e:
-            print(e.message)  # non-critical: continue
+
+        def not_found_fn(exc):
+            print(exc.message)  # non-critical: continue
+        self._add_rule(
+            line_regex=RGX_SPE_LINE, match_fn=match_fn,
+            data_name='SINGLE PARTICLE ENERGIES', first_only=False,
+            not_found_fn=not_found_fn
+        )
 
     def _get_data_energy_levels(self):
         def match_fn(line):
@@ -62,18 +95,21 @@ class NushellxLpt(Parser):
             else:
                 t = float(split_line[4])
             self.energy_levels.append(LptEnergyLevel(n, nj, e, j, t, p))
-        try:
-            super(NushellxLpt, self)._get_data_lines_fn(
-                line_regex=RGX_ENERGY_LEVEL_LINE, match_fn=match_fn,
-                data_name='ENERGY LEVELS'
-            )
-        except ItemNotFoundInFileException as exc:
+
+        def not_found_fn(exc):
             print(exc.message)  # non-critical issue: continue
+        self._add_rule(
+            line_regex=RGX_ENERGY_LEVEL_LINE, match_fn=match_fn,
+            data_name='ENERGY LEVELS', first_only=False,
+            not_found_fn=not_found_fn
+        )
 
     def _get_data(self):
         self._get_data_az()
         self._get_data_spe()
         self._get_data_energy_levels()
+        self._scan()
+        self.spectral_index()
 
 
 # n = NushellxLpt('~/workspace/triumf/tr-c-nushellx/old/'
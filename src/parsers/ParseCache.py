@@ -0,0 +1,112 @@
+"""ParseCache.py
+Persistent on-disk cache of parsed files
+"""
+from __future__ import print_function, division, unicode_literals
+from os import path, stat, makedirs, rename, remove, listdir
+from hashlib import sha1
+from Parser import ItemNotFoundInFileException
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+
+DPATH_PARSE_CACHE = '~/.cache/tr-A_dependence_plots/parse'
+CACHE_VERSION = 4
+CACHE_EXT = '.pkl'
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def _file_digest(filepath):
+    h = sha1()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ParseCache(object):
+    """Stores parsed Parser objects in a cache directory, so that files that
+    have not changed since they were last parsed need not be parsed again.
+    An entry is valid as long as the (path, mtime, size) of the file are
+    unchanged and, if check_hash is true, the SHA-1 of its contents also
+    matches.
+    """
+    def __init__(self, dirpath=DPATH_PARSE_CACHE, check_hash=False):
+        """Initialize a ParseCache in the given directory
+        :param dirpath: directory in which to store the cache entries. It is
+        created if it does not exist.
+        :param check_hash: if true, the contents of the file are also hashed
+        and compared, in case the file changed without its mtime or size
+        changing
+        """
+        self.dirpath = path.expanduser(dirpath)
+        self.check_hash = check_hash
+        if not path.exists(self.dirpath):
+            makedirs(self.dirpath)
+
+    def _entry_path(self, filepath, parser):
+        key = '{}:{}'.format(parser.__name__, filepath)
+        return path.join(
+            self.dirpath, sha1(key.encode('utf-8')).hexdigest() + CACHE_EXT)
+
+    def _load(self, entry_path):
+        try:
+            with open(entry_path, 'rb') as f:
+                return pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError,
+                AttributeError, ImportError, ValueError):
+            return None
+
+    def _dump(self, entry_path, entry):
+        tmp_path = entry_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+        rename(tmp_path, entry_path)
+
+    def parse(self, filepath, parser):
+        """Returns the parser object for the given filepath, loading it from
+        the cache if the entry is valid and otherwise parsing the file and
+        storing the result. Files for which the parser raised an
+        ItemNotFoundInFileException are cached as such, and the exception is
+        raised again on later calls.
+        :param filepath: path to the file to parse
+        :param parser: Parser subclass with which to parse the file
+        :return: parsed object of type parser
+        """
+        filepath = path.abspath(filepath)
+        st = stat(filepath)
+        entry_path = self._entry_path(filepath, parser)
+        entry = self._load(entry_path)
+        digest = None
+        if entry is not None:
+            version, fpath, mtime, size, digest0, parsed, msg = entry
+            valid = (version, fpath, mtime, size) == (
+                CACHE_VERSION, filepath, st.st_mtime, st.st_size)
+            if valid and self.check_hash:
+                digest = _file_digest(filepath)
+                valid = digest0 is None or digest == digest0
+            if valid:
+                if parsed is None:
+                    raise ItemNotFoundInFileException(msg)
+                return parsed
+        if self.check_hash and digest is None:
+            digest = _file_digest(filepath)
+        try:
+            parsed = parser(filepath)
+            msg = None
+        except ItemNotFoundInFileException as exc:
+            parsed = None
+            msg = str(exc)
+        self._dump(entry_path, (CACHE_VERSION, filepath, st.st_mtime,
+                                st.st_size, digest, parsed, msg))
+        if parsed is None:
+            raise ItemNotFoundInFileException(msg)
+        return parsed
+
+    def clear(self):
+        """Remove all entries from the cache directory
+        """
+        for fname in listdir(self.dirpath):
+            if fname.endswith(CACHE_EXT):
+                remove(path.join(self.dirpath, fname))
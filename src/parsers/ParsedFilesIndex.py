@@ -0,0 +1,86 @@
+"""ParsedFilesIndex.py
+In-memory index of the parsed files in a directory, which can be brought up
+to date by parsing only the files that are new or have changed
+"""
+from __future__ import print_function, division, unicode_literals
+from os import stat
+from parse_files import _find_files_in_dir, _parse_file
+
+
+class ParsedFilesIndex(object):
+    """Keeps a map
+        filepath -> parsed file
+    for the files in a directory (recursively) whose names match a regex.
+    Each call to update() scans the directory and parses only the files that
+    were added or whose (mtime, size) changed since the last call, and drops
+    the files that were removed.
+    """
+    def __init__(self, dirpath, fname_regex, parser, cache=None):
+        """Initialize an empty index. Call update() to fill it.
+        :param dirpath: directory in which to look for files
+        :param fname_regex: regex that file names must match
+        :param parser: Parser subclass with which to parse the files
+        :param cache: (Optional) ParseCache to use when parsing files
+        """
+        self.dirpath = dirpath
+        self.fname_regex = fname_regex
+        self.parser = parser
+        self.cache = cache
+        self._fpath_to_stat = dict()
+        self._fpath_to_parsed = dict()
+
+    def update(self):
+        """Scan the directory, parsing new and changed files
+        :return: (added, changed, removed), the sorted lists of file paths
+        that were added, changed, or removed since the last update. Files for
+        which the parser raised ItemNotFoundInFileException are counted as
+        present, but have no parsed file.
+        """
+        added, changed = list(), list()
+        fpaths = _find_files_in_dir(
+            dirpath=self.dirpath, fname_regex=self.fname_regex)
+        for fpath in fpaths:
+            try:
+                st = stat(fpath)
+            except OSError:  # removed since it was found
+                continue
+            st = (st.st_mtime, st.st_size)
+            if fpath not in self._fpath_to_stat:
+                added.append(fpath)
+            elif st != self._fpath_to_stat[fpath]:
+                changed.append(fpath)
+            else:
+                continue
+            self._fpath_to_stat[fpath] = st
+            parsed = _parse_file(fpath, self.parser, self.cache)
+            if parsed is not None:
+                self._fpath_to_parsed[fpath] = parsed
+            else:
+                self._fpath_to_parsed.pop(fpath, None)
+        removed = sorted(set(self._fpath_to_stat) - set(fpaths))
+        for fpath in removed:
+            del self._fpath_to_stat[fpath]
+            self._fpath_to_parsed.pop(fpath, None)
+        return sorted(added), sorted(changed), removed
+
+    def __contains__(self, fpath):
+        return fpath in self._fpath_to_stat
+
+    def forget(self, fpaths):
+        """Drop the given files from the index, so that the next update()
+        parses them again, as added files
+        :param fpaths: file paths to drop
+        """
+        for fpath in fpaths:
+            self._fpath_to_stat.pop(fpath, None)
+            self._fpath_to_parsed.pop(fpath, None)
+
+    def parsed_files(self, fpaths=None):
+        """Returns the list of parsed files, in order of file path
+        :param fpaths: (Optional) if given, only the parsed files for these
+        paths are returned
+        """
+        if fpaths is None:
+            fpaths = self._fpath_to_parsed.keys()
+        return [self._fpath_to_parsed[f] for f in sorted(fpaths)
+                if f in self._fpath_to_parsed]
@@ -2,7 +2,8 @@
 General class for parsing text files
 """
 from __future__ import print_function, division, unicode_literals
-from re import match
+from collections import namedtuple
+from re import compile
 from os import path
 
 
@@ -10,9 +11,38 @@ class ItemNotFoundInFileException(Exception):
     pass
 
 
+class StopScan(Exception):
+    """Raised by a rule's match_fn to stop reading the file. The rule is
+    counted as having matched.
+    """
+    pass
+
+
+# noinspection PyClassHasNoInit
+class LineRule(namedtuple(
+    'LineRule',
+    ['line_regex', 'match_fn', 'data_name', 'first_only', 'not_found_fn']
+)):
+    """A rule used in the single-pass scan of a file
+        line_regex:
+            compiled regex, tested against the start of each line
+        match_fn:
+            function f(line) called for each line that matches line_regex
+        data_name:
+            name of the data section, used in error messages
+        first_only:
+            if true, the rule is dropped after its first match
+        not_found_fn:
+            function f(exception) called if no line matched. If None, the
+            ItemNotFoundInFileException is raised
+    """
+    __slots__ = ()
+
+
 class Parser(object):
     def __init__(self, filepath):
         self.filepath = filepath
+        self._rules = list()
         self._get_data()
 
     def __repr__(self):
@@ -29,21 +59,70 @@ class Parser(object):
         """
         raise NotImplementedError()
 
+    def _add_rule(self, line_regex, match_fn, data_name, first_only=True,
+                  not_found_fn=None):
+        """Register a rule to be applied in the next call to _scan()
+        :param line_regex: regex (string or compiled) to match lines against
+        :param match_fn: function f(line) to call for each matching line
+        :param data_name: name of the data, for error messages
+        :param first_only: if true, only the first matching line is passed
+        to match_fn; otherwise every matching line is
+        :param not_found_fn: (Optional) function f(exception) to call if no
+        line matches. If None, the exception is raised.
+        """
+        self._rules.append(LineRule(
+            line_regex=compile(line_regex), match_fn=match_fn,
+            data_name=data_name, first_only=first_only,
+            not_found_fn=not_found_fn
+        ))
+
+    def _scan(self, rules=None):
+        """Read the file exactly once, passing each line to the match_fn of
+        every active rule whose regex matches it. First-only rules are
+        deactivated after their first match and reading stops early once no
+        rules remain active, or once a match_fn raises StopScan. Rules that
+        never matched are then handled in the order they were given.
+        :param rules: list of LineRule to apply. If None, the rules registered
+        with _add_rule() are applied (and cleared).
+        """
+        if rules is None:
+            rules, self._rules = self._rules, list()
+        matched = [False] * len(rules)
+        active = list(range(len(rules)))
+        if len(active) > 0:
+            try:
+                for line in self._lines():
+                    done = list()
+                    for i in active:
+                        rule = rules[i]
+                        if rule.line_regex.match(line):
+                            matched[i] = True
+                            rule.match_fn(line)
+                            if rule.first_only:
+                                done.append(i)
+                    if len(done) > 0:
+                        active = [i for i in active if i not in done]
+                        if len(active) == 0:
+                            break
+            except StopScan:
+                pass
+        for rule, m in zip(rules, matched):
+            if m:
+                continue
+            exc = ItemNotFoundInFileException(
+                'Did not find {} in {}'.format(rule.data_name, self.filepath))
+            if rule.not_found_fn is None:
+                raise exc
+            rule.not_found_fn(exc)
+
     def _get_data_line_fn(self, line_regex, match_fn, data_name):
-        for line in self._lines():
-            if match(line_regex, line):
-                match_fn(line)
-                break
-        else:
-            raise ItemNotFoundInFileException(
-                'Did not find {} in {}'.format(data_name, self.filepath))
+        self._scan(rules=[LineRule(
+            line_regex=compile(line_regex), match_fn=match_fn,
+            data_name=data_name, first_only=True, not_found_fn=None
+        )])
 
     def _get_data_lines_fn(self, line_regex, match_fn, data_name):
-        matched = False
-        for line in self._lines():
-            if match(line_regex, line):
-                match_fn(line)
-                matched = True
-        if not matched:
-            raise ItemNotFoundInFileException(
-                'Did not find {} in {}'.format(data_name, self.filepath))
+        self._scan(rules=[LineRule(
+            line_regex=compile(line_regex), match_fn=match_fn,
+            data_name=data_name, first_only=False, not_found_fn=None
+        )])
@@ -0,0 +1,98 @@
+"""SpectralIndex.py
+Index of the energy levels of a file by angular momentum J and a second
+quantum number (isospin T for NCSD files, parity for NuShellX files), for
+fast ground state and lowest-k queries
+"""
+from __future__ import print_function, division, unicode_literals
+import numpy as np
+
+
+# Largest difference between a J value and a multiple of 1/2 for the J to be
+# taken as that multiple of 1/2
+J_TOLERANCE = 0.05
+
+
+def _twice_j_key(j, j_tol=J_TOLERANCE):
+    """Returns the integer 2*J for the J value, or None if j is not within
+    j_tol of a multiple of 1/2
+    """
+    twice_j = int(round(2 * j))
+    if abs(j - twice_j / 2) > j_tol:
+        return None
+    return twice_j
+
+
+class SpectralIndex(object):
+    """Groups the energy levels of a file by J and by (J, sub), where sub is a
+    second quantum number of the levels. Each group holds the indices of its
+    levels in order of increasing energy (equal energies in the order the
+    levels were given), so that the lowest k levels of a group are its first
+    k entries.
+    J values are matched to multiples of 1/2 within j_tol, so that queries
+    need not give J exactly as it was parsed. Levels whose J is not within
+    j_tol of any multiple of 1/2 are left out of all groups.
+    """
+    def __init__(self, states, energies, j_list, sub_list=None,
+                 j_tol=J_TOLERANCE):
+        """Make the index from parallel arrays of the levels
+        :param states: array of the state of each level (e.g. state number)
+        :param energies: array of the energy of each level
+        :param j_list: array of the J of each level
+        :param sub_list: (Optional) array of the second quantum number of
+        each level, by which the levels of each J are further grouped
+        :param j_tol: tolerance in matching J to a multiple of 1/2
+        """
+        self.states = np.asarray(states)
+        self.energies = np.asarray(energies, dtype=float)
+        self.j_tol = j_tol
+        j_arr = np.asarray(j_list, dtype=float)
+        twice_j = np.rint(2 * j_arr)
+        order = np.argsort(self.energies, kind='mergesort')
+        order = order[np.abs(j_arr - twice_j / 2)[order] <= j_tol]
+        twice_j = twice_j[order].astype(int)
+        self._j_groups = dict()
+        for key in np.unique(twice_j):
+            self._j_groups[int(key)] = order[twice_j == key]
+        self._j_sub_groups = dict()
+        if sub_list is not None:
+            sub_arr = np.asarray(sub_list)
+            for key, idx in self._j_groups.items():
+                subs = sub_arr[idx]
+                for sub in np.unique(subs):
+                    self._j_sub_groups[(key, sub.item())] = idx[subs == sub]
+
+    def _group(self, j, sub=None):
+        key = _twice_j_key(j, self.j_tol)
+        if key is None:
+            return None
+        elif sub is None:
+            return self._j_groups.get(key)
+        else:
+            return self._j_sub_groups.get((key, sub))
+
+    def js(self):
+        """Returns the sorted list of the J values in the index"""
+        return [k / 2 for k in sorted(self._j_groups)]
+
+    def ground_state(self, j, sub=None):
+        """Returns (state, energy) for the lowest level with the given J (and
+        sub, if given), or (None, None) if there is no such level
+        """
+        idx = self._group(j, sub)
+        if idx is None:
+            return None, None
+        i0 = idx[0]
+        return self.states[i0], self.energies[i0]
+
+    def lowest(self, j, k=None, sub=None):
+        """Returns (states, energies), the arrays of the k lowest levels with
+        the given J (and sub, if given), in order of increasing energy. If k
+        is None, all of the levels are returned. The arrays are empty if
+        there are no such levels.
+        """
+        idx = self._group(j, sub)
+        if idx is None:
+            idx = np.empty(0, dtype=int)
+        elif k is not None:
+            idx = idx[:k]
+        return self.states[idx], self.energies[idx]
@@ -0,0 +1,158 @@
+"""TbmeStore.py
+Compact array-backed storage of the two-body matrix elements from *.int files
+"""
+from __future__ import print_function, division, unicode_literals
+from os import path, rename
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import numpy as np
+from NushellTbme import NushellTbme
+
+
+LABEL_DTYPE = np.int16
+LABEL_BITS = 10
+LABEL_MAX = (1 << LABEL_BITS) - 1
+NUM_LABELS = 6
+LABELS_EXT = '.tbme_labels.npy'
+VALUES_EXT = '.tbme_values.npy'
+
+
+def _pack(labels):
+    """Packs each row of the (n, 6) array of labels into a single integer
+    key, with LABEL_BITS bits per label
+    """
+    keys = np.zeros(len(labels), dtype=np.int64)
+    for i in range(NUM_LABELS):
+        keys = (keys << LABEL_BITS) | labels[:, i].astype(np.int64)
+    return keys
+
+
+class TbmeStore(Mapping):
+    """Read-only mapping
+        NushellTbme -> value
+    in which the (a, b, c, d, j, t) labels are stored as an (n, 6) array of
+    small integers and the values as a float64 array, rather than as one
+    Python object per matrix element. Lookups are done by binary search on
+    the labels packed into single integers.
+    A store loaded with load() is backed by memory-mapped .npy files, and is
+    pickled as the path to those files, rather than as its data.
+    """
+    def __init__(self, labels, values, fpath_prefix=None):
+        """Initialize the store from arrays of unique labels and their values
+        :param labels: (n, 6) array of (a, b, c, d, j, t) labels
+        :param values: array of the n associated values
+        :param fpath_prefix: (Optional) path prefix of the .npy files from
+        which the arrays were loaded
+        """
+        self.labels = labels
+        self.values = values
+        self.fpath_prefix = fpath_prefix
+        self._sorted_keys = None
+        self._order = None
+
+    @classmethod
+    def from_lists(cls, labels_list, values_list):
+        """Make a store from a list of 6-tuples of labels and the list of
+        associated values. As for a dict, if a label is repeated, the last
+        value is kept.
+        """
+        labels = np.array(labels_list, dtype=np.int64).reshape(-1, NUM_LABELS)
+        if len(labels) > 0 and (labels.min() < 0 or labels.max() > LABEL_MAX):
+            raise ValueError(
+                'TBME labels must be in the range [0, {}]'.format(LABEL_MAX))
+        values = np.array(values_list, dtype=np.float64)
+        keys = _pack(labels)
+        # Index of the last occurrence of each key, in order of occurrence
+        last = len(keys) - 1 - np.unique(keys[::-1], return_index=True)[1]
+        last.sort()
+        return cls(labels=labels[last].astype(LABEL_DTYPE),
+                   values=values[last])
+
+    @classmethod
+    def load(cls, fpath_prefix, mmap_mode='r'):
+        """Load a store saved with save()
+        :param fpath_prefix: path prefix given to save()
+        :param mmap_mode: mode with which to memory-map the arrays. If None,
+        the arrays are read into memory.
+        """
+        return cls(
+            labels=np.load(fpath_prefix + LABELS_EXT, mmap_mode=mmap_mode),
+            values=np.load(fpath_prefix + VALUES_EXT, mmap_mode=mmap_mode),
+            fpath_prefix=fpath_prefix if mmap_mode is not None else None
+        )
+
+    @staticmethod
+    def exists(fpath_prefix):
+        """Returns the modification time of the oldest of the files saved at
+        fpath_prefix, or None if they do not all exist
+        """
+        fpaths = [fpath_prefix + LABELS_EXT, fpath_prefix + VALUES_EXT]
+        if not all(path.exists(f) for f in fpaths):
+            return None
+        return min(path.getmtime(f) for f in fpaths)
+
+    def save(self, fpath_prefix):
+        """Save the arrays as .npy files at the given path prefix, so that
+        they may be loaded (and memory-mapped) with load()
+        """
+        for ext, arr in ((LABELS_EXT, self.labels), (VALUES_EXT, self.values)):
+            tmp_path = fpath_prefix + ext + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, arr)
+            rename(tmp_path, fpath_prefix + ext)
+
+    def _index(self):
+        if self._sorted_keys is None:
+            keys = _pack(np.asarray(self.labels))
+            self._order = np.argsort(keys, kind='mergesort')
+            self._sorted_keys = keys[self._order]
+        return self._sorted_keys, self._order
+
+    def lookup(self, labels, default=np.nan):
+        """Returns the values for each row in the (m, 6) array of labels,
+        with default for labels not in the store
+        """
+        labels = np.asarray(labels, dtype=np.int64).reshape(-1, NUM_LABELS)
+        sorted_keys, order = self._index()
+        keys = _pack(labels)
+        i = np.clip(np.searchsorted(sorted_keys, keys), 0,
+                    max(len(sorted_keys) - 1, 0))
+        found = np.zeros(len(keys), dtype=bool)
+        if len(sorted_keys) > 0:
+            found = sorted_keys[i] == keys
+        out = np.full(len(keys), default, dtype=np.float64)
+        out[found] = np.asarray(self.values)[order[i[found]]]
+        return out
+
+    def __getitem__(self, key):
+        if len(key) != NUM_LABELS or any(
+                k is None or not 0 <= k <= LABEL_MAX for k in key):
+            raise KeyError(key)
+        sorted_keys, order = self._index()
+        k = _pack(np.array([key], dtype=np.int64))[0]
+        i = np.searchsorted(sorted_keys, k)
+        if i == len(sorted_keys) or sorted_keys[i] != k:
+            raise KeyError(key)
+        return float(self.values[order[i]])
+
+    def __iter__(self):
+        for row in np.asarray(self.labels).tolist():
+            yield NushellTbme(*row)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getstate__(self):
+        if self.fpath_prefix is not None:
+            return {'fpath_prefix': self.fpath_prefix}
+        return {'labels': np.asarray(self.labels),
+                'values': np.asarray(self.values)}
+
+    def __setstate__(self, state):
+        if 'fpath_prefix' in state:
+            other = TbmeStore.load(state['fpath_prefix'])
+            state = {'labels': other.labels, 'values': other.values,
+                     'fpath_prefix': other.fpath_prefix}
+        self.__init__(**state)
@@ -6,34 +6,111 @@ from os import walk, path
 from re import match, compile
 from Parser import ItemNotFoundInFileException
 from NcsdOut import NcsdOut
-from NushellxInt import NushellxInt
+from NushellxInt import NushellxInt, NushellxIntNpy
 from NushellxLpt import NushellxLpt
 
 
-def _parse_files_in_dir(dirpath, fname_regex, parser):
-    parsed_files = list()
+RGX_FNAME_NCSD_OUT = compile('^\D+\d+_\d+.*\.out$')
+RGX_FNAME_NUSHELLX_INT = compile('.*\.int$')
+RGX_FNAME_NUSHELLX_LPT = compile('.*y\.lpt$')
+
+
+def _find_files_in_dir(dirpath, fname_regex):
+    """Returns the paths of all files in dirpath (recursively) whose names
+    match fname_regex, in the order they are walked
+    """
+    fpaths = list()
     for root, dnames, fnames in walk(path.expanduser(dirpath)):
         for fname in fnames:
             if match(fname_regex, fname):
-                try:
-                    parsed_files.append(parser(path.join(root, fname)))
-                except ItemNotFoundInFileException:
-                    continue
-    return parsed_files
+                fpaths.append(path.join(root, fname))
+    return fpaths
+
+
+def _parse_file(fpath, parser, cache=None):
+    """Parse the file at fpath with parser, using cache if given. Returns None
+    if the parser raised ItemNotFoundInFileException.
+    """
+    try:
+        if cache is not None:
+            return cache.parse(fpath, parser)
+        else:
+            return parser(fpath)
+    except ItemNotFoundInFileException:
+        return None
+
 
+def _parse_chunk(fpaths, parser, cache=None):
+    """Parse each file in fpaths. This is the unit of work given to each
+    worker process in parallel mode.
+    """
+    return [_parse_file(fpath, parser, cache) for fpath in fpaths]
 
-def parse_ncsd_out_files(dirpath):
+
+def _parse_files_in_dir(dirpath, fname_regex, parser, cache=None,
+                        parallel=False, max_workers=None, chunksize=1):
+    """Parse all files in dirpath (recursively) whose names match fname_regex.
+    Files for which the parser raises an ItemNotFoundInFileException are
+    skipped.
+    :param dirpath: directory in which to look for files
+    :param fname_regex: regex that file names must match
+    :param parser: Parser subclass with which to parse the files
+    :param cache: (Optional) ParseCache from which to retrieve unchanged
+    files, rather than parsing them again
+    :param parallel: if true, the files are found first and then parsed in a
+    process pool. The returned list is in the same order either way.
+    :param max_workers: number of worker processes to use in parallel mode.
+    If None, the number of processors is used.
+    :param chunksize: number of files given to a worker process at a time
+    in parallel mode
+    :return: list of parsed files
+    """
+    fpaths = _find_files_in_dir(dirpath=dirpath, fname_regex=fname_regex)
+    if not parallel:
+        results = [_parse_file(fpath, parser, cache) for fpath in fpaths]
+    else:
+        # concurrent.futures requires the futures backport in python 2, so
+        # it is only imported when it is needed
+        from concurrent.futures import ProcessPoolExecutor
+        chunks = [fpaths[i:i + chunksize]
+                  for i in range(0, len(fpaths), chunksize)]
+        results = list()
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_parse_chunk, chunk, parser, cache)
+                       for chunk in chunks]
+            for future in futures:
+                results.extend(future.result())
+    return [parsed for parsed in results if parsed is not None]
+
+
+def parse_ncsd_out_files(dirpath, cache=None, **kwargs):
+    """Parse all NCSD *.out files in dirpath. Other keyword arguments (parallel,
+    max_workers, chunksize) are passed to _parse_files_in_dir
+    """
     return _parse_files_in_dir(
-        dirpath=dirpath, fname_regex=compile('^\D+\d+_\d+.*\.out$'),
-        parser=NcsdOut
+        dirpath=dirpath, fname_regex=RGX_FNAME_NCSD_OUT,
+        parser=NcsdOut, cache=cache, **kwargs
     )
 
 
-def parse_nushellx_int_files(dirpath):
+def parse_nushellx_int_files(dirpath, cache=None, tbme_npy=False, **kwargs):
+    """Parse all NuShellX *.int files in dirpath. If tbme_npy is true, the
+    TBMEs are kept in memory-mapped .npy files next to each file (see
+    NushellxIntNpy). Other keyword arguments (parallel, max_workers,
+    chunksize) are passed to _parse_files_in_dir
+    """
     return _parse_files_in_dir(
-        dirpath=dirpath, fname_regex=compile('.*\.int$'), parser=NushellxInt)
+        dirpath=dirpath, fname_regex=RGX_FNAME_NUSHELLX_INT,
+        parser=NushellxIntNpy if tbme_npy else NushellxInt,
+        cache=cache, **kwargs
+    )
 
 
-def parse_nushellx_lpt_files(dirpath):
+def parse_nushellx_lpt_files(dirpath, cache=None, **kwargs):
+    """Parse all NuShellX *.lpt files in dirpath. Other keyword arguments (parallel,
+    max_workers, chunksize) are passed to _parse_files_in_dir
+    """
     return _parse_files_in_dir(
-        dirpath=dirpath, fname_regex=compile('.*y\.lpt$'), parser=NushellxLpt)
+        dirpath=dirpath, fname_regex=RGX_FNAME_NUSHELLX_LPT, parser=NushellxLpt,
+        cache=cache, **kwargs
+    )
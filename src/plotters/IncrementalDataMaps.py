@@ -0,0 +1,167 @@
+"""IncrementalDataMaps.py
+Data maps from a results tree that are kept up to date as files are added or
+changed, by parsing only the new and changed files
+"""
+from __future__ import division, print_function, unicode_literals
+from os import path
+from data_maps import NoUniqueMapError
+from data_maps import _get_state_to_energy_map
+from data_maps import _get_ncsd_out_ground_state_energy
+from data_maps import _get_int_lpt_ground_state_energy
+from parsers.NcsdOut import NcsdOut
+from parsers.NushellxInt import NushellxInt
+from parsers.NushellxLpt import NushellxLpt
+from parsers.ParsedFilesIndex import ParsedFilesIndex
+from parsers.parse_files import RGX_FNAME_NCSD_OUT
+from parsers.parse_files import RGX_FNAME_NUSHELLX_INT
+from parsers.parse_files import RGX_FNAME_NUSHELLX_LPT
+
+
+class IncrementalDataMaps(object):
+    """Holds the maps
+        (A, Aeff) -> NcsdOut
+        (A, Aeff) -> (j, t) -> energy
+        (A, Aeff) -> ground state energy
+        (presc, A) -> (NushellxInt, NushellxLpt)
+        (presc, A) -> ground state energy
+    as given by the functions in data_maps.py, for the files in an NCSD
+    directory and a NuShellX directory. Each call to update() parses only
+    the files that are new or changed and updates the entries of the maps
+    that depend on them, in place.
+    """
+    def __init__(self, dpath_ncsd_files=None, dpath_nushell_files=None,
+                 parse_cache=None):
+        """Initialize the empty maps. Call update() to fill them.
+        :param dpath_ncsd_files: (Optional) directory of NCSD *.out files
+        :param dpath_nushell_files: (Optional) directory of NuShellX *.int
+        and *.lpt files
+        :param parse_cache: (Optional) ParseCache to use when parsing files
+        """
+        self._ncsd_index = None
+        self._int_index = None
+        self._lpt_index = None
+        if dpath_ncsd_files is not None:
+            self._ncsd_index = ParsedFilesIndex(
+                dirpath=dpath_ncsd_files, fname_regex=RGX_FNAME_NCSD_OUT,
+                parser=NcsdOut, cache=parse_cache)
+        if dpath_nushell_files is not None:
+            self._int_index = ParsedFilesIndex(
+                dirpath=dpath_nushell_files,
+                fname_regex=RGX_FNAME_NUSHELLX_INT,
+                parser=NushellxInt, cache=parse_cache)
+            self._lpt_index = ParsedFilesIndex(
+                dirpath=dpath_nushell_files,
+                fname_regex=RGX_FNAME_NUSHELLX_LPT,
+                parser=NushellxLpt, cache=parse_cache)
+        self._fpath_to_a_aeff = dict()
+        self._dpath_to_presc_a = dict()
+        self.a_aeff_to_ncsd_out = dict()
+        self.a_aeff_to_state_to_energy = dict()
+        self.a_aeff_to_ground_state_energy = dict()
+        self.presc_a_to_int_and_lpt = dict()
+        self.presc_a_to_ground_state_energy = dict()
+
+    def update(self):
+        """Parse new and changed files and update the maps
+        :return: (a_aeff_changed, presc_a_changed), the sets of (A, Aeff) and
+        (presc, A) keys whose entries were added, changed, or removed
+        """
+        return self._update_ncsd(), self._update_vce()
+
+    def _update_ncsd(self):
+        if self._ncsd_index is None:
+            return set()
+        added, changed, removed = self._ncsd_index.update()
+        # The files that are no longer in the index (removed) or have been
+        # parsed again replace their old entries
+        replaced = [f for f in self._fpath_to_a_aeff
+                    if f not in self._ncsd_index or f in added or
+                    f in changed]
+        # Check that the map stays unique before changing any of it, so that
+        # the maps are left as they were if NoUniqueMapError is raised
+        a_aeff_kept = set(self._fpath_to_a_aeff.values())
+        a_aeff_kept -= set(self._fpath_to_a_aeff[f] for f in replaced)
+        new_entries = list()
+        for fpath in added + changed:
+            ncsd_out = self._ncsd_index.parsed_files([fpath])
+            if len(ncsd_out) == 0:
+                continue
+            ncsd_out = ncsd_out[0]
+            a_aeff = (ncsd_out.z + ncsd_out.n, ncsd_out.aeff)
+            if a_aeff in a_aeff_kept:
+                # Have the next update parse these files again
+                self._ncsd_index.forget(added + changed)
+                raise NoUniqueMapError(
+                    'Multiple files with (A, Aeff) = ({}, {}) in given list'
+                    ''.format(*a_aeff))
+            a_aeff_kept.add(a_aeff)
+            new_entries.append((fpath, a_aeff, ncsd_out))
+        changed_keys = set()
+        for fpath in replaced:
+            a_aeff = self._fpath_to_a_aeff.pop(fpath)
+            self._remove_a_aeff(a_aeff)
+            changed_keys.add(a_aeff)
+        for fpath, a_aeff, ncsd_out in new_entries:
+            self._fpath_to_a_aeff[fpath] = a_aeff
+            self.a_aeff_to_ncsd_out[a_aeff] = ncsd_out
+            self.a_aeff_to_state_to_energy[a_aeff] = _get_state_to_energy_map(
+                ncsd_out)
+            e0 = _get_ncsd_out_ground_state_energy(ncsd_out)
+            if e0 is not None:
+                self.a_aeff_to_ground_state_energy[a_aeff] = e0
+            changed_keys.add(a_aeff)
+        return changed_keys
+
+    def _remove_a_aeff(self, a_aeff):
+        for m in (self.a_aeff_to_ncsd_out, self.a_aeff_to_state_to_energy,
+                  self.a_aeff_to_ground_state_energy):
+            m.pop(a_aeff, None)
+
+    def _update_vce(self):
+        if self._int_index is None:
+            return set()
+        int_delta = self._int_index.update()
+        lpt_delta = self._lpt_index.update()
+        dpaths = set()
+        for fpath in sum(int_delta + lpt_delta, list()):
+            dpaths.add(path.split(fpath)[0])
+        if len(dpaths) == 0:
+            return set()
+        # As in data_maps._get_dpath_to_parsed_file_map, the last file (in
+        # order of path) in each directory is used
+        dpath_to_int = dict()
+        for intfile in self._int_index.parsed_files():
+            dpath_to_int[path.split(intfile.filepath)[0]] = intfile
+        dpath_to_lpt = dict()
+        for lptfile in self._lpt_index.parsed_files():
+            dpath_to_lpt[path.split(lptfile.filepath)[0]] = lptfile
+        changed_keys = set()
+        for dpath in sorted(dpaths):
+            if dpath in self._dpath_to_presc_a:
+                changed_keys.add(self._dpath_to_presc_a.pop(dpath))
+            if dpath not in dpath_to_int or dpath not in dpath_to_lpt:
+                continue
+            intfile, lptfile = dpath_to_int[dpath], dpath_to_lpt[dpath]
+            if intfile.a_prescription is None:
+                continue
+            presc_a = (intfile.a_prescription, lptfile.a)
+            self._dpath_to_presc_a[dpath] = presc_a
+            changed_keys.add(presc_a)
+        # Make the entries of the changed keys again from all of the
+        # directories that give them, so that a key is kept while any
+        # directory still gives it. The last directory (in order of path)
+        # is used.
+        for presc_a in changed_keys:
+            self.presc_a_to_int_and_lpt.pop(presc_a, None)
+            self.presc_a_to_ground_state_energy.pop(presc_a, None)
+        for dpath, presc_a in sorted(self._dpath_to_presc_a.items()):
+            if presc_a not in changed_keys:
+                continue
+            intfile, lptfile = dpath_to_int[dpath], dpath_to_lpt[dpath]
+            self.presc_a_to_int_and_lpt[presc_a] = (intfile, lptfile)
+            e0 = _get_int_lpt_ground_state_energy(intfile, lptfile)
+            if e0 is not None:
+                self.presc_a_to_ground_state_energy[presc_a] = e0
+            else:
+                self.presc_a_to_ground_state_energy.pop(presc_a, None)
+        return changed_keys
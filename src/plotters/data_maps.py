@@ -27,24 +27,17 @@ def _get_ground_state_j(mass, z):
         return None
 
 
-def _get_ground_state(states, energies, j_list, j0=None):
-    """Gets the ground state and ground energy from the list of states, 
-    energies, and angular momenta. This is chosen by finding the state with
-    lowest associated energy for which angular momentum matches j0
-    :param states: list of energy states
-    :param energies: list of energies assocated with `states`
-    :param j_list: list of J associated with `states`
+def _get_ground_state(spectral_index, j0=None):
+    """Gets the ground state and ground energy from the SpectralIndex of a
+    file's energy levels. This is the state with lowest energy whose angular
+    momentum matches j0 (within the tolerance of the index).
+    :param spectral_index: SpectralIndex of the energy levels
+    :param j0: angular momentum of the ground state
     :return ground state, ground energy if found; returns None, None
     """
-    states_sorted = sorted(
-        list(zip(states, energies, j_list)), key=lambda x: x[1])
-    for s, e, j in states_sorted:
-        if j == j0:
-            return s, e
-    else:
+    if j0 is None:
         return None, None
-        # s0, e0, j0 = states_sorted[0]
-        # return s0, e
+    return spectral_index.ground_state(j0)
 
 
 def _get_a_aeff_to_ncsd_out_map(parsed_ncsd_out_files):
@@ -64,6 +57,17 @@ def _get_a_aeff_to_ncsd_out_map(parsed_ncsd_out_files):
     return a_aeff_to_parsed_file
 
 
+def _get_state_to_energy_map(ncsd_out):
+    """Returns a map (j, t) -> energy for the given NcsdOut
+    """
+    state_to_energy = dict()
+    for state, e in sorted(ncsd_out.energy_levels.items(),
+                           key=lambda i: i[1]):
+        if state not in state_to_energy:
+            state_to_energy[state] = e
+    return state_to_energy
+
+
 def get_a_aeff_to_state_to_energy_map(parsed_ncsd_out_files):
     """Given a list of NcsdOut and optional arguments nmax and z, returns a map
         (a, aeff) -> (j, t) -> energy
@@ -71,18 +75,20 @@ def get_a_aeff_to_state_to_energy_map(parsed_ncsd_out_files):
     a_aeff_to_state_to_energy = dict()
     for a_aeff, ncsd_out in _get_a_aeff_to_ncsd_out_map(
             parsed_ncsd_out_files).items():
-        state_to_energy = dict()
-        for state, e in sorted(ncsd_out.energy_levels.items(),
-                               key=lambda i: i[1]):
-            if state not in state_to_energy:
-                state_to_energy[state] = e
-        a_aeff_to_state_to_energy[a_aeff] = state_to_energy
+        a_aeff_to_state_to_energy[a_aeff] = _get_state_to_energy_map(ncsd_out)
     return a_aeff_to_state_to_energy
 
 
-def get_state_to_a_aeff_to_energy_map(parsed_ncsd_out_files):
-    a_aeff_to_state_to_energy = get_a_aeff_to_state_to_energy_map(
-        parsed_ncsd_out_files=parsed_ncsd_out_files)
+def get_state_to_a_aeff_to_energy_map(
+        parsed_ncsd_out_files=None, a_aeff_to_state_to_energy=None):
+    """Returns a map
+        (j, t) -> (a, aeff) -> energy
+    from either the given list of NcsdOut or the (a, aeff) -> (j, t) ->
+    energy map, if given
+    """
+    if a_aeff_to_state_to_energy is None:
+        a_aeff_to_state_to_energy = get_a_aeff_to_state_to_energy_map(
+            parsed_ncsd_out_files=parsed_ncsd_out_files)
     state_to_a_aeff_to_energy = dict()
     for a_aeff, state_to_energy in a_aeff_to_state_to_energy.items():
         for state, energy in state_to_energy.items():
@@ -92,17 +98,22 @@ def get_state_to_a_aeff_to_energy_map(parsed_ncsd_out_files):
     return state_to_a_aeff_to_energy
 
 
+def _get_ncsd_out_ground_state_energy(ncsd_out):
+    """Returns the ground state energy from the given NcsdOut, or None if it
+    is not found
+    """
+    j0 = _get_ground_state_j(mass=ncsd_out.z + ncsd_out.n, z=ncsd_out.z)
+    s0, e0 = _get_ground_state(
+        spectral_index=ncsd_out.spectral_index(), j0=j0)
+    return e0
+
+
 def get_a_aeff_to_ground_state_energy_map(parsed_ncsd_out_files):
     a_aeff_to_ground_state_energy = dict()
     for a_aeff, ncsd_out in _get_a_aeff_to_ncsd_out_map(
             parsed_ncsd_out_files=parsed_ncsd_out_files
     ).items():
-        states = ncsd_out.energy_levels.keys()
-        energies = [ncsd_out.energy_levels[s] for s in states]
-        j_list = [s.J for s in states]
-        j0 = _get_ground_state_j(mass=a_aeff[0], z=ncsd_out.z)
-        s0, e0 = _get_ground_state(states=states, energies=energies,
-                                   j_list=j_list, j0=j0)
+        e0 = _get_ncsd_out_ground_state_energy(ncsd_out)
         if e0 is not None:
             a_aeff_to_ground_state_energy[a_aeff] = e0
     return a_aeff_to_ground_state_energy
@@ -168,20 +179,26 @@ def get_state_to_presc_a_to_energy_map(parsed_int_files, parsed_lpt_files):
     return state_to_presc_a_to_energy
 
 
+def _get_int_lpt_ground_state_energy(intfile, lptfile):
+    """Returns the ground state energy from the given NushellxLpt plus the
+    zero body term from the given NushellxInt, or None if it is not found
+    """
+    j0 = _get_ground_state_j(mass=lptfile.a, z=lptfile.z)
+    s0, e0 = _get_ground_state(
+        spectral_index=lptfile.spectral_index(), j0=j0)
+    if e0 is None:
+        return None
+    return e0 + intfile.zero_body_term
+
+
 def get_presc_a_to_ground_state_energy_map(parsed_int_files, parsed_lpt_files):
     presc_a_to_ground_state_energy = dict()
     presc_a_to_int_and_lpt = _get_presc_a_to_int_and_lpt_map(
         parsed_int_files=parsed_int_files, parsed_lpt_files=parsed_lpt_files)
     for presc_a, int_lpt in presc_a_to_int_and_lpt.items():
-        states = int_lpt[1].energy_levels
-        energies = [s.E for s in states]
-        j_list = [s.J for s in states]
-        j0 = _get_ground_state_j(mass=presc_a[1], z=int_lpt[1].z)
-        s0, e0 = _get_ground_state(states=states, energies=energies,
-                                   j_list=j_list, j0=j0)
+        e0 = _get_int_lpt_ground_state_energy(*int_lpt)
         if e0 is not None:
-            presc_a_to_ground_state_energy[presc_a] = (
-                e0 + int_lpt[0].zero_body_term)
+            presc_a_to_ground_state_energy[presc_a] = e0
     return presc_a_to_ground_state_energy
 
 
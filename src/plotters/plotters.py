@@ -2,25 +2,35 @@
 Various functions for plotting A-dependence data
 """
 from __future__ import division, print_function, unicode_literals
+from time import sleep
+import numpy as np
+from matplotlib import pyplot as plt
 from data_maps import *
+from IncrementalDataMaps import IncrementalDataMaps
 from plotting import map_to_arrays
 from plotting import save_plot_figure, save_plot_data_file
+from plotting import save_plot_data_npz
 from LegendSize import LegendSize
+from PlotBatch import PlotBatch
 from constants import LEGEND_SIZE
 from parsers.parse_files import *
 
 
-def _get_plots_aeff_exact_to_energy(parsed_ncsd_out_files):
+def _get_plots_aeff_exact_to_energy(
+        parsed_ncsd_out_files=None, a_aeff_to_state_to_energy=None):
     """Returns a list of plots in the form
             (xdata, ydata, const_list, const_dict),
     where A=Aeff is xdata, energy is ydata, and the const_dict constains
     the state list is generated from the data from the given NcsdOut objects
     :param parsed_ncsd_out_files: list of parsed NcsdOut objects from which
     to generate the map
+    :param a_aeff_to_state_to_energy: (Optional) map to use instead of
+    generating it from parsed_ncsd_out_files
     :return: [(a_array, energy_array, state)]
     """
     state_to_a_aeff_to_energy = get_state_to_a_aeff_to_energy_map(
-        parsed_ncsd_out_files=parsed_ncsd_out_files)
+        parsed_ncsd_out_files=parsed_ncsd_out_files,
+        a_aeff_to_state_to_energy=a_aeff_to_state_to_energy)
     state_to_a_exact_to_energy = dict()
     for state, a_aeff_to_energy in state_to_a_aeff_to_energy.items():
         for a_aeff, energy in a_aeff_to_energy.items():
@@ -37,13 +47,17 @@ def _get_plots_aeff_exact_to_energy(parsed_ncsd_out_files):
     return list_of_plots
 
 
-def _get_plot_aeff_exact_to_ground_energy(parsed_ncsd_out_files):
+def _get_plot_aeff_exact_to_ground_energy(
+        parsed_ncsd_out_files=None, a_aeff_to_ground_state_energy=None):
     """Returns a list of plots in the form
             (xdata, ydata, const_list, const_dict),
-    where A=Aeff is xdata, and ground energy is ydata
+    where A=Aeff is xdata, and ground energy is ydata. The (A, Aeff) ->
+    ground energy map is generated from parsed_ncsd_out_files, unless it is
+    given as a_aeff_to_ground_state_energy.
     """
-    a_aeff_to_ground_state_energy = get_a_aeff_to_ground_state_energy_map(
-        parsed_ncsd_out_files=parsed_ncsd_out_files)
+    if a_aeff_to_ground_state_energy is None:
+        a_aeff_to_ground_state_energy = get_a_aeff_to_ground_state_energy_map(
+            parsed_ncsd_out_files=parsed_ncsd_out_files)
     a_to_ground_state_energy = dict()
     for a_aeff, e in a_aeff_to_ground_state_energy.items():
         if a_aeff[0] == a_aeff[1]:
@@ -51,15 +65,21 @@ def _get_plot_aeff_exact_to_ground_energy(parsed_ncsd_out_files):
     return map_to_arrays(a_to_ground_state_energy) + (list(), dict())
 
 
-def _get_plots_presc_a_to_ground_energy(parsed_int_files, parsed_lpt_files):
+def _get_plots_presc_a_to_ground_energy(
+        parsed_int_files=None, parsed_lpt_files=None,
+        presc_a_to_ground_state_energy=None):
     """Returns a list of plots in the form
             (xdata, ydata, const_list, const_dict),
     where A (mass) is xdata, ground energy is ydata, and const_dict contains
     an item 'presc' whose value is a 3-tuple representation of the 
-    A-prescriptions
+    A-prescriptions. The (presc, A) -> ground energy map is generated from
+    the parsed files, unless it is given as presc_a_to_ground_state_energy.
     """
-    presc_a_to_ground_energy = get_presc_a_to_ground_state_energy_map(
-        parsed_int_files=parsed_int_files, parsed_lpt_files=parsed_lpt_files)
+    presc_a_to_ground_energy = presc_a_to_ground_state_energy
+    if presc_a_to_ground_energy is None:
+        presc_a_to_ground_energy = get_presc_a_to_ground_state_energy_map(
+            parsed_int_files=parsed_int_files,
+            parsed_lpt_files=parsed_lpt_files)
     presc_to_a_to_ground_energy = dict()
     for presc_a, energy in presc_a_to_ground_energy.items():
         presc, a = presc_a
@@ -73,9 +93,18 @@ def _get_plots_presc_a_to_ground_energy(parsed_int_files, parsed_lpt_files):
     return list_of_plots
 
 
-def make_plot_ncsd_exact(dpath_ncsd_files, dpath_plots, savename, subtitle=''):
+def make_plot_ncsd_exact(dpath_ncsd_files, dpath_plots, savename, subtitle='',
+                         parse_cache=None):
     plots = _get_plots_aeff_exact_to_energy(
-        parsed_ncsd_out_files=parse_ncsd_out_files(dirpath=dpath_ncsd_files))
+        parsed_ncsd_out_files=parse_ncsd_out_files(
+            dirpath=dpath_ncsd_files, cache=parse_cache))
+    return _save_plot_ncsd_exact(
+        plots=plots, dpath_plots=dpath_plots, savename=savename,
+        subtitle=subtitle)
+
+
+def _save_plot_ncsd_exact(plots, dpath_plots, savename, subtitle='',
+                          headless=False, save_npz=False):
     title = 'NCSD exact energies: ' + subtitle
     labels = [str(p[3]['state']) for p in plots]
     xlabel, ylabel = 'A', 'E_ncsm (MeV)'
@@ -84,9 +113,15 @@ def make_plot_ncsd_exact(dpath_ncsd_files, dpath_plots, savename, subtitle=''):
         plots=plots, title=title, xlabel=xlabel, ylabel=ylabel,
         labels=labels, savepath=savepath
     )
+    if save_npz:
+        save_plot_data_npz(
+            plots=plots, title=title, xlabel=xlabel, ylabel=ylabel,
+            labels=labels, savepath=path.join(dpath_plots, savename + '.npz')
+        )
     return save_plot_figure(
         data_plots=plots, title=title, xlabel=xlabel, ylabel=ylabel,
         savepath=savepath, data_labels=labels, cmap_name='jet',
+        headless=headless,
         legendsize=LegendSize(
             max_cols=LEGEND_SIZE.max_cols,
             max_h_space=LEGEND_SIZE.max_h_space,
@@ -103,49 +138,98 @@ def _make_plot_prescription_error_vs_exact_abstract(
         dpath_ncsd_files, dpath_nushell_files, dpath_plots, savename,
         title, subtitle='', a_prescriptions=None,
         get_ncsd_plots_fn=_get_plot_aeff_exact_to_ground_energy,
-        get_vce_plots_fn=_get_plots_presc_a_to_ground_energy
+        get_vce_plots_fn=_get_plots_presc_a_to_ground_energy,
+        parse_cache=None
 ):
     ncsd_plot = get_ncsd_plots_fn(
-        parsed_ncsd_out_files=parse_ncsd_out_files(dirpath=dpath_ncsd_files))
+        parsed_ncsd_out_files=parse_ncsd_out_files(
+            dirpath=dpath_ncsd_files, cache=parse_cache))
     vce_plots = get_vce_plots_fn(
-        parsed_int_files=parse_nushellx_int_files(dirpath=dpath_nushell_files),
-        parsed_lpt_files=parse_nushellx_lpt_files(dirpath=dpath_nushell_files)
+        parsed_int_files=parse_nushellx_int_files(
+            dirpath=dpath_nushell_files, cache=parse_cache),
+        parsed_lpt_files=parse_nushellx_lpt_files(
+            dirpath=dpath_nushell_files, cache=parse_cache)
+    )
+    return _save_plot_prescription_error_vs_exact(
+        ncsd_plot=ncsd_plot, vce_plots=vce_plots, dpath_plots=dpath_plots,
+        savename=savename, title=title, subtitle=subtitle,
+        a_prescriptions=a_prescriptions
     )
 
-    # Ncsd exact arrays
-    x_ex, y_ex = [list(i) for i in ncsd_plot[:2]]
+
+def _get_plots_prescription_error_vs_exact(
+        ncsd_plot, vce_plots, a_prescriptions=None):
+    """Returns the list of plots of the error of the prescription energies
+    with respect to the exact NCSD energies, in the form
+            (xdata, ydata, const_list, const_dict),
+    where A is xdata, E_presc - E_ncsd is ydata, and const_dict has an item
+    'name'. The first plot is for Aeff = A, taken from the exact
+    prescriptions (A, A, A), and it is followed by a plot for each
+    prescription in a_prescriptions (or all, if None), in the order of
+    vce_plots. Only the A values shared by the NCSD plot and a prescription
+    plot are included.
+    All of the prescription plots are put on the A axis of the NCSD plot at
+    once, so that the errors are a single broadcast subtraction.
+    :param ncsd_plot: plot of exact NCSD energy against A
+    :param vce_plots: plots of prescription energy against A, with the
+    prescription as const_dict['presc']
+    :param a_prescriptions: (Optional) prescriptions for which to make plots
+    """
+    # Common A axis, with the first energy for each A, as list.index gave
+    x_ex, i_ex = np.unique(np.asarray(ncsd_plot[0], dtype=float),
+                           return_index=True)
+    y_ex = np.asarray(ncsd_plot[1], dtype=float)[i_ex]
+
+    # Dense (prescription, A) grid of energies, and which are present
+    batch = PlotBatch.from_plots(vce_plots)
+    cols = np.searchsorted(x_ex, batch.x)
+    on_axis = cols < len(x_ex)
+    on_axis[on_axis] = x_ex[cols[on_axis]] == batch.x[on_axis]
+    # For any A repeated in a plot, keep the first, as list.index gave
+    cells, first = np.unique(
+        batch.plot_index()[on_axis] * len(x_ex) + cols[on_axis],
+        return_index=True)
+    present = np.zeros((len(batch), len(x_ex)), dtype=bool)
+    present.flat[cells] = True
+    y_grid = np.zeros((len(batch), len(x_ex)))
+    y_grid.flat[cells] = batch.y[on_axis][first]
+    errors = y_grid - y_ex[np.newaxis, :]
 
     # Aeff = A prescription
-    def is_exact_presc(plot0):
-        p0 = plot0[3]['presc']
-        return p0[0] == p0[1] and p0[1] == p0[2]
-
-    x_aaf, y_aaf = list(), list()
-    for vce_plot in sorted(filter(is_exact_presc, vce_plots),
-                           key=lambda p0: p0[3]['presc']):
-        x_arr, y_arr, const_list, const_dict = vce_plot
-        a = const_dict['presc'][0]
-        if a not in x_arr:
-            continue
-        x_aaf.append(a)
-        y_aaf.append(y_arr[list(x_arr).index(a)])
-    x_del = sorted(list(set(x_ex) & set(x_aaf)))
-    y_del = list()
-    for x in x_del:
-        y_del.append(y_aaf[x_aaf.index(x)] - y_ex[x_ex.index(x)])
-    plots = [(x_del, y_del, list(), {'name': 'Aeff = A'})]
+    prescs = [cd['presc'] for cd in batch.const_dicts]
+    exact = sorted([k for k, p0 in enumerate(prescs)
+                    if p0[0] == p0[1] and p0[1] == p0[2]],
+                   key=lambda k: prescs[k])
+    exact_rows = np.array(exact, dtype=int)
+    exact_a = np.array([prescs[k][0] for k in exact], dtype=float)
+    exact_cols = np.searchsorted(x_ex, exact_a)
+    in_grid = exact_cols < len(x_ex)
+    in_grid[in_grid] = x_ex[exact_cols[in_grid]] == exact_a[in_grid]
+    exact_rows, exact_cols = exact_rows[in_grid], exact_cols[in_grid]
+    found = present[exact_rows, exact_cols]
+    exact_rows, exact_cols = exact_rows[found], exact_cols[found]
+    # For any A with more than one exact prescription, keep the first
+    exact_cols, first = np.unique(exact_cols, return_index=True)
+    exact_rows = exact_rows[first]
+    plots = [(x_ex[exact_cols], errors[exact_rows, exact_cols], list(),
+              {'name': 'Aeff = A'})]
 
     # other prescriptions
-    for vce_plot in vce_plots:
-        if a_prescriptions is None or vce_plot[3]['presc'] in a_prescriptions:
-            x_p, y_p = [list(i) for i in vce_plot[:2]]
-            presc = vce_plot[3]['presc']
-            x_del = sorted(list(set(x_ex) & set(x_p)))
-            y_del = list()
-            for x in x_del:
-                y_del.append(y_p[x_p.index(x)] - y_ex[x_ex.index(x)])
-            plot = (x_del, y_del, list(), {'name': 'Aeff = {}'.format(presc)})
-            plots.append(plot)
+    for k, presc in enumerate(prescs):
+        if a_prescriptions is None or presc in a_prescriptions:
+            mask = present[k]
+            plots.append((x_ex[mask], errors[k, mask], list(),
+                          {'name': 'Aeff = {}'.format(presc)}))
+    return plots
+
+
+def _save_plot_prescription_error_vs_exact(
+        ncsd_plot, vce_plots, dpath_plots, savename, title, subtitle='',
+        a_prescriptions=None, headless=False, save_npz=False
+):
+    plots = _get_plots_prescription_error_vs_exact(
+        ncsd_plot=ncsd_plot, vce_plots=vce_plots,
+        a_prescriptions=a_prescriptions)
 
     # make plot
     fulltitle = title + ': ' + subtitle
@@ -156,15 +240,21 @@ def _make_plot_prescription_error_vs_exact_abstract(
         plots=plots, title=fulltitle, xlabel=xlabel, ylabel=ylabel,
         labels=labels, savepath=savepath + '.dat'
     )
+    if save_npz:
+        save_plot_data_npz(
+            plots=plots, title=fulltitle, xlabel=xlabel, ylabel=ylabel,
+            labels=labels, savepath=savepath + '.npz'
+        )
     return save_plot_figure(
         data_plots=plots, title=fulltitle, xlabel=xlabel, ylabel=ylabel,
         savepath=savepath + '.pdf', data_labels=labels, cmap_name='jet',
+        headless=headless,
     )
 
 
 def make_plot_ground_state_prescription_error_vs_exact(
         dpath_ncsd_files, dpath_nushell_files, dpath_plots, savename,
-        subtitle='', a_prescriptions=None
+        subtitle='', a_prescriptions=None, parse_cache=None
 ):
     return _make_plot_prescription_error_vs_exact_abstract(
         dpath_ncsd_files=dpath_ncsd_files,
@@ -173,9 +263,73 @@ def make_plot_ground_state_prescription_error_vs_exact(
         a_prescriptions=a_prescriptions,
         title='Ground state energy error for A-prescriptions',
         get_ncsd_plots_fn=_get_plot_aeff_exact_to_ground_energy,
-        get_vce_plots_fn=_get_plots_presc_a_to_ground_energy
+        get_vce_plots_fn=_get_plots_presc_a_to_ground_energy,
+        parse_cache=parse_cache
     )
 
+
+def watch_plots(
+        dpath_ncsd_files, dpath_nushell_files, dpath_plots,
+        savename_ncsd_exact=None, savename_ground_state_error=None,
+        subtitle='', a_prescriptions=None, parse_cache=None,
+        interval=10, max_updates=None
+):
+    """Keep the NCSD exact plot and the ground state prescription error plot
+    up to date while new files are written to the results directories.
+    Every interval seconds, only the new and changed files are parsed, the
+    data maps are updated in place (see IncrementalDataMaps), and the plots
+    that depend on the changed entries are saved again.
+    :param dpath_ncsd_files: directory of NCSD *.out files
+    :param dpath_nushell_files: directory of NuShellX *.int and *.lpt files
+    :param dpath_plots: directory in which to save plots
+    :param savename_ncsd_exact: save name for the NCSD exact plot. If None,
+    this plot is not made.
+    :param savename_ground_state_error: save name for the ground state
+    prescription error plot. If None, this plot is not made.
+    :param subtitle: subtitle for the plots
+    :param a_prescriptions: prescriptions to include in the error plot. If
+    None, all are included.
+    :param parse_cache: (Optional) ParseCache to use when parsing files
+    :param interval: time in seconds to wait between scans
+    :param max_updates: maximum number of scans, after which the function
+    returns. If None, scans are done until interrupted.
+    :return: the IncrementalDataMaps
+    """
+    data_maps = IncrementalDataMaps(
+        dpath_ncsd_files=dpath_ncsd_files,
+        dpath_nushell_files=dpath_nushell_files, parse_cache=parse_cache)
+    num_updates = 0
+    while max_updates is None or num_updates < max_updates:
+        if num_updates > 0:
+            sleep(interval)
+        a_aeff_changed, presc_a_changed = data_maps.update()
+        num_updates += 1
+        if savename_ncsd_exact is not None and len(a_aeff_changed) > 0:
+            _save_plot_ncsd_exact(
+                plots=_get_plots_aeff_exact_to_energy(
+                    a_aeff_to_state_to_energy=(
+                        data_maps.a_aeff_to_state_to_energy)),
+                dpath_plots=dpath_plots, savename=savename_ncsd_exact,
+                subtitle=subtitle
+            )
+            plt.close('all')
+        if (savename_ground_state_error is not None and
+                len(a_aeff_changed | presc_a_changed) > 0 and
+                len(data_maps.a_aeff_to_ground_state_energy) > 0):
+            _save_plot_prescription_error_vs_exact(
+                ncsd_plot=_get_plot_aeff_exact_to_ground_energy(
+                    a_aeff_to_ground_state_energy=(
+                        data_maps.a_aeff_to_ground_state_energy)),
+                vce_plots=_get_plots_presc_a_to_ground_energy(
+                    presc_a_to_ground_state_energy=(
+                        data_maps.presc_a_to_ground_state_energy)),
+                dpath_plots=dpath_plots, savename=savename_ground_state_error,
+                title='Ground state energy error for A-prescriptions',
+                subtitle=subtitle, a_prescriptions=a_prescriptions
+            )
+            plt.close('all')
+    return data_maps
+
 # test
 # dpath = '~/workspace/triumf/tr-c-ncsm/old/results20170224/ncsd'
 # all_ncsd_files = sorted(parse_ncsd_out_files(dirpath=dpath))
@@ -5,10 +5,15 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import json
 from os import path
+from struct import unpack
+from zipfile import ZipFile, ZIP_STORED
 import numpy as np
-from matplotlib import pyplot as plt, colors, cm
+from numpy.lib import format as npy_format
+from matplotlib import pyplot as plt, colors, cm, style
 from FitFunction import FitFunction
+from PlotBatch import PlotBatch
 from constants import PLOT_CMAP, LEGEND_SIZE, PLOT_FIGSIZE
 
 
@@ -26,8 +31,21 @@ def _set_legend(num_plots, legend_size, ax):
         [box.x0, box.y0,
          box.width * legend_size.width_scale(l, ncol, fontsize),
          box.height])
-    plt.legend(ncol=ncol, loc='upper left', bbox_to_anchor=(1.0, 1.0),
-               fontsize=fontsize)
+    ax.legend(ncol=ncol, loc='upper left', bbox_to_anchor=(1.0, 1.0),
+              fontsize=fontsize)
+
+
+def _new_agg_figure(figsize):
+    """Returns a Figure drawn on its own Agg canvas. Unlike figures made by
+    pyplot, it is not registered with pyplot's figure manager, so it is freed
+    as soon as it is no longer referenced.
+    :param figsize: 2-tuple specifying the dimensions of the figure
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
 
 
 def _save_plot_figure(
@@ -64,15 +82,15 @@ def _save_plot_figure(
         for plot, label, line_style in zip(lop, lol, lols):
             x, y = plot[:2]
             ax.plot(x, y, line_style, label=label, color=scalar_map.to_rgba(i))
-    plt.title(title)
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
     if include_legend:
         if legendsize is not None:
             _set_legend(num_plots=num_plots, legend_size=legendsize, ax=ax)
         else:
-            plt.legend()
-    plt.savefig(path.expanduser(savepath))
+            ax.legend()
+    ax.figure.savefig(path.expanduser(savepath))
     return plot_list_list
 
 
@@ -80,7 +98,7 @@ def save_plot_figure_categorical(
         category_to_plots_map, title, xlabel, ylabel, savepath,
         category_to_labels_map=None, category_to_line_style_map=None,
         ax=None, fig=None, cmap=None, cmap_name=PLOT_CMAP, dark=False,
-        legendsize=LEGEND_SIZE, figsize=PLOT_FIGSIZE,
+        legendsize=LEGEND_SIZE, figsize=PLOT_FIGSIZE, headless=False,
         _default_line_style='-',
 ):
     """Saves a plot figure with multiple categories of plots, each having
@@ -110,6 +128,9 @@ def save_plot_figure_categorical(
     :param legendsize: LegendSize object to use in sizing the legend.
     See LegendSize.py
     :param figsize: 2-tuple specifying the dimensions of the figure.
+    :param headless: if true and neither fig nor ax is given, the figure is
+    made on its own Agg canvas rather than through pyplot, and it is cleared
+    once it is saved, so that nothing is left open in pyplot
     :param _default_line_style: Line style to use of
     category_to_line_style_map is None
     """
@@ -131,22 +152,30 @@ def save_plot_figure_categorical(
             line_style_list_list.append(category_to_line_style_map[category])
         else:
             line_style_list_list.append([_default_line_style]*len(plot_list))
-    if fig is None and ax is None:
-        fig = plt.figure(figsize=figsize)
-    if ax is None:
-        ax = fig.add_subplot(111)
     if cmap is None:
         cmap = plt.get_cmap(name=cmap_name)
-    if dark:
-        plt.style.use(b'dark_background')
-    return _save_plot_figure(
-        plot_list_list=plot_list_list,
-        label_list_list=label_list_list,
-        line_style_list_list=line_style_list_list,
-        title=title, xlabel=xlabel, ylabel=ylabel,
-        savepath=savepath, ax=ax, cmap=cmap, legendsize=legendsize,
-        include_legend=include_legend
-    )
+    own_agg_fig = headless and fig is None and ax is None
+    # The dark style only applies to this figure, rather than to all later
+    # figures as plt.style.use would
+    with style.context(b'dark_background' if dark else []):
+        if own_agg_fig:
+            fig = _new_agg_figure(figsize=figsize)
+        elif fig is None and ax is None:
+            fig = plt.figure(figsize=figsize)
+        if ax is None:
+            ax = fig.add_subplot(111)
+        try:
+            return _save_plot_figure(
+                plot_list_list=plot_list_list,
+                label_list_list=label_list_list,
+                line_style_list_list=line_style_list_list,
+                title=title, xlabel=xlabel, ylabel=ylabel,
+                savepath=savepath, ax=ax, cmap=cmap, legendsize=legendsize,
+                include_legend=include_legend
+            )
+        finally:
+            if own_agg_fig:
+                fig.clf()
 
 
 def save_plot_figure(
@@ -156,7 +185,7 @@ def save_plot_figure(
         data_line_style='-', fit_line_style='--',
         ax=None, fig=None,
         cmap=None, cmap_name=PLOT_CMAP, dark=False,
-        legendsize=LEGEND_SIZE, figsize=PLOT_FIGSIZE,
+        legendsize=LEGEND_SIZE, figsize=PLOT_FIGSIZE, headless=False,
 ):
     """Save the plot figure generated by the given parameters
     :param data_plots: list of primary plots to include in the figure.
@@ -187,6 +216,8 @@ def save_plot_figure(
     :param legendsize: LegendSize object, specifying how to size the legend.
     See LegendSize.py
     :param figsize: 2-tuple representing the size of the figure
+    :param headless: if true, draw on a figure of its own, without pyplot.
+    See save_plot_figure_categorical.
     """
     category_to_plots_map = {'data': data_plots}
     if fit_plots is not None:
@@ -209,10 +240,55 @@ def save_plot_figure(
         category_to_line_style_map=category_to_line_styles_map,
         title=title, xlabel=xlabel, ylabel=ylabel, savepath=savepath,
         ax=ax, fig=fig, cmap=cmap, cmap_name=cmap_name, dark=dark,
-        legendsize=legendsize, figsize=figsize,
+        legendsize=legendsize, figsize=figsize, headless=headless,
     )
 
 
+def render_plot_figure(spec):
+    """Save a figure from a figure spec, headlessly (see
+    save_plot_figure_categorical). A figure spec is a dict of keyword
+    arguments to save_plot_figure_categorical, if it has the item
+    category_to_plots_map, or else to save_plot_figure. It must not hold
+    ax, fig, or headless.
+    :param spec: figure spec
+    :return: the save path of the figure
+    """
+    if 'category_to_plots_map' in spec:
+        save_plot_figure_categorical(headless=True, **spec)
+    else:
+        save_plot_figure(headless=True, **spec)
+    return spec['savepath']
+
+
+def save_plot_figures(specs, parallel=False, max_workers=None):
+    """Save a figure for each of the given figure specs (see
+    render_plot_figure). Every figure is drawn on its own Agg canvas, so the
+    figures may be drawn in separate processes.
+    :param specs: list of figure specs
+    :param parallel: if true, the figures are drawn in a process pool. Then
+    everything in the specs (including cmap, if given) must be picklable.
+    :param max_workers: maximum number of processes to use if parallel. If
+    None, the number of processors is used.
+    :return: list of the save paths of the figures, in the order of specs
+    """
+    if not parallel:
+        return [render_plot_figure(spec) for spec in specs]
+    # concurrent.futures requires the futures backport in python 2, so
+    # it is only imported when it is needed
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(render_plot_figure, specs))
+
+
+def _format_xy_lines(x, y):
+    """Returns the data file lines for the points of a plot, all formatted
+    at once
+    """
+    xy = np.column_stack((np.asarray(x, dtype=float),
+                          np.asarray(y, dtype=float)))
+    return (b'  %16.8f  %16.8f\n' * len(xy)) % tuple(xy.ravel().tolist())
+
+
 def save_plot_data_file(
         plots, title, xlabel, ylabel, savepath, labels=None, comment_str=b''):
     """Save a data file based on the given plots.
@@ -227,20 +303,149 @@ def save_plot_data_file(
     file that are not either x or y values. Default is b'', in which case
     no character will precede label lines.
     """
-    writelines = list()
-    writelines.append(comment_str + title)
-    writelines.append(b'    x: {}'.format(xlabel))
-    writelines.append(b'    y: {}'.format(ylabel))
-    writelines.append(b'')
+    chunks = list()
+    chunks.append(comment_str + title + b'\n')
+    chunks.append(b'    x: {}\n'.format(xlabel))
+    chunks.append(b'    y: {}\n'.format(ylabel))
+    chunks.append(b'\n')
     for p, i in zip(plots, range(len(plots))):
         if labels is not None:
-            writelines.append(comment_str + b' plot: ' + labels[i])
-        x, y, = p[:2]
-        for xi, yi in zip(x, y):
-            writelines.append(b'  {x:>16.8f}  {y:>16.8f}'.format(x=xi, y=yi))
-        writelines.append(b'')
+            chunks.append(comment_str + b' plot: ' + labels[i] + b'\n')
+        chunks.append(_format_xy_lines(*p[:2]))
+        chunks.append(b'\n')
     with open(path.expanduser(savepath), b'w') as fw:
-        fw.write(b'{0}\n'.format(b'\n'.join(writelines)))
+        fw.write(b''.join(chunks))
+
+
+def save_plot_data_npz(
+        plots, savepath, title=b'', xlabel=b'', ylabel=b'', labels=None):
+    """Save the given plots to a binary .npz file, which can be read back
+    with load_plot_data_npz. The file holds the arrays
+        x, y: the x and y arrays of all of the plots, concatenated
+        offsets: the index in x and y at which each plot starts, followed
+            by the total length (see PlotBatch)
+        meta: the title, axis labels, plot labels, and the const_list and
+            const_dict of each plot, as UTF-8 encoded JSON (see
+            _to_json_value)
+    The arrays are stored uncompressed, so that x and y can be
+    memory-mapped.
+    :param plots: list of plots (or PlotBatch). See definition of "plot" in
+    the docstring for save_plot_figure()
+    :param savepath: save location (including filename and extension)
+    :param title: title of the plots
+    :param xlabel: x axis label
+    :param ylabel: y axis label
+    :param labels: ordered list of labels corresponding to plots
+    """
+    batch = PlotBatch.from_plots(plots)
+    meta = {
+        'title': title, 'xlabel': xlabel, 'ylabel': ylabel,
+        'labels': list(labels) if labels is not None else None,
+        'const_lists': _to_json_value(list(batch.const_lists)),
+        'const_dicts': _to_json_value(list(batch.const_dicts)),
+    }
+    meta_bytes = np.frombuffer(
+        json.dumps(meta, sort_keys=True).encode('utf-8'), dtype=np.uint8)
+    with open(path.expanduser(savepath), b'wb') as fw:
+        np.savez(fw, x=batch.x, y=batch.y, offsets=batch.offsets,
+                 meta=meta_bytes)
+
+
+def _to_json_value(v):
+    """Returns the constant v (of a const_list or const_dict) in a form that
+    can be written as JSON and read back with _from_json_value. Each tuple,
+    dict, and ndarray is written as a JSON object with a single item
+    {'tuple': items}, {'dict': [[key, value], ...]}, or {'array': list},
+    so that tuples and non-string keys are kept. Namedtuples are read back
+    as plain tuples.
+    Raises TypeError if v holds a value that JSON cannot represent.
+    """
+    if isinstance(v, tuple):
+        return {'tuple': [_to_json_value(vi) for vi in v]}
+    elif isinstance(v, list):
+        return [_to_json_value(vi) for vi in v]
+    elif isinstance(v, dict):
+        return {'dict': [[_to_json_value(k), _to_json_value(vi)]
+                         for k, vi in v.items()]}
+    elif isinstance(v, np.ndarray):
+        return {'array': v.tolist()}
+    elif isinstance(v, np.generic):
+        return v.item()
+    else:
+        return v
+
+
+def _from_json_value(v):
+    """Inverse of _to_json_value"""
+    if isinstance(v, list):
+        return [_from_json_value(vi) for vi in v]
+    elif isinstance(v, dict):
+        (tag, items), = v.items()
+        if tag == 'tuple':
+            return tuple(_from_json_value(vi) for vi in items)
+        elif tag == 'dict':
+            return {_from_json_value(k): _from_json_value(vi)
+                    for k, vi in items}
+        else:
+            return np.array(items)
+    else:
+        return v
+
+
+def _npz_memmap(filepath, name):
+    """Returns a read-only memmap of the array name in the .npz file at
+    filepath, or None if it cannot be memory-mapped (because it is
+    compressed or holds objects)
+    """
+    with ZipFile(filepath) as zf:
+        info = zf.getinfo(name + '.npy')
+    if info.compress_type != ZIP_STORED:
+        return None
+    with open(filepath, b'rb') as f:
+        # The data follows the 30 byte local file header, the file name and
+        # the extra field, whose lengths are at the end of the header
+        f.seek(info.header_offset)
+        name_len, extra_len = unpack(b'<2H', f.read(30)[26:30])
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        version = npy_format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = npy_format.read_array_header_1_0(f)
+        elif version == (2, 0):
+            shape, fortran_order, dtype = npy_format.read_array_header_2_0(f)
+        else:
+            return None
+        offset = f.tell()
+    if dtype.hasobject:
+        return None
+    if int(np.prod(shape)) == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(filepath, dtype=dtype, mode=b'r', offset=offset,
+                     shape=shape, order=b'F' if fortran_order else b'C')
+
+
+def load_plot_data_npz(loadpath, mmap=True):
+    """Load plots saved by save_plot_data_npz
+    :param loadpath: location of the .npz file
+    :param mmap: if true, the x and y arrays are memory-mapped from the file
+    rather than read into memory
+    :return: (plot_batch, meta), where plot_batch is a PlotBatch of the
+    plots, whose x and y arrays are read-only if mmap, and meta is a dict
+    with items 'title', 'xlabel', 'ylabel', and 'labels'
+    """
+    loadpath = path.expanduser(loadpath)
+    with np.load(loadpath) as npz:
+        offsets = npz['offsets']
+        meta = json.loads(npz['meta'].tobytes().decode('utf-8'))
+        x = _npz_memmap(loadpath, 'x') if mmap else None
+        y = _npz_memmap(loadpath, 'y') if mmap else None
+        if x is None:
+            x = npz['x']
+        if y is None:
+            y = npz['y']
+    batch = PlotBatch(x=x, y=y, offsets=offsets,
+                      const_lists=_from_json_value(meta.pop('const_lists')),
+                      const_dicts=_from_json_value(meta.pop('const_dicts')))
+    return batch, meta
 
 
 def map_to_arrays(m):
@@ -0,0 +1,270 @@
+"""run_jobs.py
+Run a batch of plot jobs described by a JSON job file. Each distinct results
+directory is parsed once, the data maps made from it are shared by all of
+the jobs that use it, and the figures are saved headlessly (see
+plotting.save_plot_figure_categorical), optionally in a pool of processes.
+
+Usage (from src/):
+    python run_jobs.py jobs.json --parallel --max-workers 4
+
+Job file:
+    {
+        "defaults": {
+            "dpath_ncsd_files": "~/results/helium_nmax4/ncsd",
+            "dpath_nushell_files": "~/results/helium_nmax4/vce",
+            "dpath_plots": "~/results/helium_nmax4"
+        },
+        "jobs": [
+            {"job": "make_plot_ncsd_exact",
+             "savename": "ncsd_states_he_nmax4",
+             "subtitle": "Helium; Nmax=4"},
+            {"job": "make_plot_ground_state_prescription_error_vs_exact",
+             "savename": "error_he_nmax4_ground_state",
+             "subtitle": "Helium exact, (4, 5, 6); Nmax=4 - Ground state",
+             "a_prescriptions": [[4, 5, 6]]}
+        ]
+    }
+The items of "defaults" are used for every job that does not give them
+itself. The file may also be just the list of jobs. A job with
+"save_npz": true also saves its plot data as a binary .npz file (see
+plotting.save_plot_data_npz).
+"""
+from __future__ import division, print_function, unicode_literals
+import json
+import sys
+from argparse import ArgumentParser
+from os import path
+import matplotlib
+matplotlib.use('Agg')
+from parsers.ParseCache import ParseCache
+from parsers.parse_files import parse_ncsd_out_files
+from parsers.parse_files import parse_nushellx_int_files
+from parsers.parse_files import parse_nushellx_lpt_files
+from plotters.data_maps import get_a_aeff_to_state_to_energy_map
+from plotters.data_maps import get_a_aeff_to_ground_state_energy_map
+from plotters.data_maps import get_presc_a_to_ground_state_energy_map
+from plotters.plotters import _get_plots_aeff_exact_to_energy
+from plotters.plotters import _get_plot_aeff_exact_to_ground_energy
+from plotters.plotters import _get_plots_presc_a_to_ground_energy
+from plotters.plotters import _save_plot_ncsd_exact
+from plotters.plotters import _save_plot_prescription_error_vs_exact
+
+
+class JobFileError(Exception):
+    pass
+
+
+class SharedResults(object):
+    """Parsed files and data maps of results directories, each of which is
+    made the first time it is asked for and then kept, so that jobs using
+    the same directory share them
+    """
+    def __init__(self, parse_cache=None, parallel_parse=False,
+                 max_workers=None):
+        """
+        :param parse_cache: (Optional) ParseCache to use when parsing files
+        :param parallel_parse: if true, the files of each directory are
+        parsed in a process pool (see parsers.parse_files)
+        :param max_workers: maximum number of processes for parallel parsing
+        """
+        self.parse_cache = parse_cache
+        self.parallel_parse = parallel_parse
+        self.max_workers = max_workers
+        self._memo = dict()
+
+    def _get(self, name, dirpath, make_fn):
+        key = (name, path.abspath(path.expanduser(dirpath)))
+        if key not in self._memo:
+            self._memo[key] = make_fn(key[1])
+        return self._memo[key]
+
+    def _parse(self, parse_fn, dirpath):
+        return parse_fn(dirpath=dirpath, cache=self.parse_cache,
+                        parallel=self.parallel_parse,
+                        max_workers=self.max_workers)
+
+    def ncsd_out_files(self, dirpath):
+        return self._get('ncsd_out_files', dirpath,
+                         lambda d: self._parse(parse_ncsd_out_files, d))
+
+    def int_files(self, dirpath):
+        return self._get('int_files', dirpath,
+                         lambda d: self._parse(parse_nushellx_int_files, d))
+
+    def lpt_files(self, dirpath):
+        return self._get('lpt_files', dirpath,
+                         lambda d: self._parse(parse_nushellx_lpt_files, d))
+
+    def a_aeff_to_state_to_energy(self, dirpath):
+        return self._get(
+            'a_aeff_to_state_to_energy', dirpath,
+            lambda d: get_a_aeff_to_state_to_energy_map(
+                parsed_ncsd_out_files=self.ncsd_out_files(d)))
+
+    def a_aeff_to_ground_state_energy(self, dirpath):
+        return self._get(
+            'a_aeff_to_ground_state_energy', dirpath,
+            lambda d: get_a_aeff_to_ground_state_energy_map(
+                parsed_ncsd_out_files=self.ncsd_out_files(d)))
+
+    def presc_a_to_ground_state_energy(self, dirpath):
+        return self._get(
+            'presc_a_to_ground_state_energy', dirpath,
+            lambda d: get_presc_a_to_ground_state_energy_map(
+                parsed_int_files=self.int_files(d),
+                parsed_lpt_files=self.lpt_files(d)))
+
+    def num_parsed_dirs(self):
+        return len(set(k[1] for k in self._memo if k[0].endswith('_files')))
+
+
+# Each job is done in two steps:
+#     prepare(job, shared_results) -> plot data
+#     save(job, plot data) -> save path
+# Only prepare uses the shared results. The plot data is picklable, so that
+# save may be done in a worker process.
+
+def _prepare_ncsd_exact(job, results):
+    return _get_plots_aeff_exact_to_energy(
+        a_aeff_to_state_to_energy=results.a_aeff_to_state_to_energy(
+            job['dpath_ncsd_files']))
+
+
+def _save_ncsd_exact(job, plots):
+    _save_plot_ncsd_exact(
+        plots=plots, dpath_plots=path.expanduser(job['dpath_plots']),
+        savename=job['savename'], subtitle=job.get('subtitle', ''),
+        headless=True, save_npz=job.get('save_npz', False))
+    return path.join(job['dpath_plots'], job['savename'] + '.pdf')
+
+
+def _prepare_ground_state_error(job, results):
+    ncsd_plot = _get_plot_aeff_exact_to_ground_energy(
+        a_aeff_to_ground_state_energy=results.a_aeff_to_ground_state_energy(
+            job['dpath_ncsd_files']))
+    vce_plots = _get_plots_presc_a_to_ground_energy(
+        presc_a_to_ground_state_energy=(
+            results.presc_a_to_ground_state_energy(
+                job['dpath_nushell_files'])))
+    return ncsd_plot, vce_plots
+
+
+def _save_ground_state_error(job, plots):
+    ncsd_plot, vce_plots = plots
+    a_prescriptions = job.get('a_prescriptions')
+    if a_prescriptions is not None:
+        a_prescriptions = [tuple(p) for p in a_prescriptions]
+    _save_plot_prescription_error_vs_exact(
+        ncsd_plot=ncsd_plot, vce_plots=vce_plots,
+        dpath_plots=path.expanduser(job['dpath_plots']),
+        savename=job['savename'],
+        title='Ground state energy error for A-prescriptions',
+        subtitle=job.get('subtitle', ''), a_prescriptions=a_prescriptions,
+        headless=True, save_npz=job.get('save_npz', False))
+    return path.join(job['dpath_plots'], job['savename'] + '.pdf')
+
+
+# job name -> (prepare, save, required keys)
+JOB_TYPES = {
+    'make_plot_ncsd_exact': (
+        _prepare_ncsd_exact, _save_ncsd_exact,
+        ['dpath_ncsd_files', 'dpath_plots', 'savename']),
+    'make_plot_ground_state_prescription_error_vs_exact': (
+        _prepare_ground_state_error, _save_ground_state_error,
+        ['dpath_ncsd_files', 'dpath_nushell_files', 'dpath_plots',
+         'savename']),
+}
+
+
+def read_job_file(fpath):
+    """Read the list of jobs from a JSON job file, with the defaults filled
+    in, and check that each job is of a known type and has the items it
+    requires
+    :param fpath: path of the job file
+    :return: list of job dicts
+    """
+    with open(path.expanduser(fpath)) as f:
+        contents = json.load(f)
+    if isinstance(contents, list):
+        contents = {'jobs': contents}
+    defaults = contents.get('defaults', dict())
+    jobs = list()
+    for i, job_items in enumerate(contents.get('jobs', list())):
+        job = dict(defaults)
+        job.update(job_items)
+        if job.get('job') not in JOB_TYPES:
+            raise JobFileError(
+                'Job {} has unknown type {!r}. Known types: {}'.format(
+                    i, job.get('job'), ', '.join(sorted(JOB_TYPES))))
+        missing = [k for k in JOB_TYPES[job['job']][2] if k not in job]
+        if len(missing) > 0:
+            raise JobFileError('Job {} ({}) is missing: {}'.format(
+                i, job['job'], ', '.join(missing)))
+        jobs.append(job)
+    return jobs
+
+
+def _save_job(job, plots):
+    """Do the save step of the job. This is the unit of work given to each
+    worker process in parallel mode.
+    """
+    return JOB_TYPES[job['job']][1](job, plots)
+
+
+def run_jobs(jobs, parse_cache=None, parallel=False, max_workers=None,
+             printer=print):
+    """Run the given jobs. The data for all of the jobs are made first, in
+    this process, parsing each results directory only once. The figures and
+    data files are then saved, either in order or, if parallel, in a process
+    pool.
+    :param jobs: list of job dicts (see read_job_file)
+    :param parse_cache: (Optional) ParseCache to use when parsing files
+    :param parallel: if true, the files are parsed and the figures saved in
+    process pools
+    :param max_workers: maximum number of processes to use if parallel. If
+    None, the number of processors is used.
+    :param printer: (Optional) function with which to print progress. If
+    None, nothing is printed.
+    :return: list of the save paths of the figures, in the order of jobs
+    """
+    results = SharedResults(parse_cache=parse_cache, parallel_parse=parallel,
+                            max_workers=max_workers)
+    job_plots = [JOB_TYPES[job['job']][0](job, results) for job in jobs]
+    if printer is not None:
+        printer('Parsed {} directories for {} jobs'.format(
+            results.num_parsed_dirs(), len(jobs)))
+    if not parallel:
+        savepaths = [_save_job(job, plots)
+                     for job, plots in zip(jobs, job_plots)]
+    else:
+        # concurrent.futures requires the futures backport in python 2, so
+        # it is only imported when it is needed
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            savepaths = list(executor.map(_save_job, jobs, job_plots))
+    if printer is not None:
+        for savepath in savepaths:
+            printer('Saved {}'.format(savepath))
+    return savepaths
+
+
+def _main():
+    parser = ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('job_file', help='path of the JSON job file')
+    parser.add_argument('--parallel', action='store_true',
+                        help='parse files and save figures in process pools')
+    parser.add_argument('--max-workers', type=int, default=None)
+    parser.add_argument('--no-parse-cache', action='store_true',
+                        help='do not use the on-disk ParseCache')
+    args = parser.parse_args()
+    try:
+        jobs = read_job_file(args.job_file)
+    except JobFileError as e:
+        print('{}: {}'.format(args.job_file, e), file=sys.stderr)
+        sys.exit(2)
+    run_jobs(jobs, parse_cache=None if args.no_parse_cache else ParseCache(),
+             parallel=args.parallel, max_workers=args.max_workers)
+
+
+if __name__ == '__main__':
+    _main()
@@ -9,6 +9,14 @@ Each transformation returns a tuple of the same length as the input containing:
     + transformed x array
     + transformed y array
     + *args unchanged, and in same order
+Transformations do not modify the given arrays in place.
+
+Batches:
+    A transformation may also have a "batch" attribute, which is a function
+    that applies the same transformation to each plot in a PlotBatch and
+    returns the transformed PlotBatch, using operations on the concatenated
+    arrays. Use transform_batch() to apply any transformation to a PlotBatch;
+    those without a batch attribute are applied plot by plot.
 """
 
 from __future__ import division
@@ -16,11 +24,112 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import numpy as np
+from scipy.linalg import solve_banded
+from PlotBatch import PlotBatch
+from TransformCache import chain_key
+
+
+# BATCH KERNELS
+def _elementwise(transform):
+    """Marks a transform whose x and y values depend only on the x and y
+    values of the same point, so that it can be applied to the concatenated
+    arrays of a PlotBatch all at once
+    """
+    def batch(plot_batch):
+        x, y = transform(plot_batch.x, plot_batch.y)[:2]
+        return plot_batch.with_xy(x, y)
+    transform.batch = batch
+    transform.elementwise = True
+    return transform
+
+
+def _fuse_elementwise(steps):
+    """Returns the list of steps (transforms in the order in which they are
+    applied) with each run of adjacent elementwise transforms replaced by a
+    single elementwise transform, which transforms a PlotBatch by applying
+    the run to its arrays directly
+    """
+    fused_steps = list()
+    run = list()
+    for tr in list(steps) + [None]:
+        if tr is not None and getattr(tr, 'elementwise', False):
+            run.append(tr)
+            continue
+        if len(run) == 1:
+            fused_steps.append(run[0])
+        elif len(run) > 1:
+            fused_steps.append(_fused_elementwise(list(run)))
+        run = list()
+        if tr is not None:
+            fused_steps.append(tr)
+    return fused_steps
+
+
+def _fused_elementwise(run):
+    def fused(xarr, yarr, *args):
+        a = (xarr, yarr) + args
+        for tr in run:
+            a = tr(*a)
+        return a
+
+    def batch(plot_batch):
+        x, y = plot_batch.x, plot_batch.y
+        for tr in run:
+            x, y = tr(x, y)[:2]
+        return plot_batch.with_xy(x, y)
+    fused.__name__ = b' '.join(reversed([tr.__name__ for tr in run]))
+    fused.cache_key = chain_key(run)
+    fused.batch = batch
+    fused.elementwise = True
+    return fused
+
+
+def _batch_first(arr, plot_batch):
+    """Returns an array, of the same length as arr, of the first value of arr
+    in the plot to which each point belongs
+    """
+    lengths = plot_batch.lengths()
+    nonempty = lengths > 0
+    return np.repeat(arr[plot_batch.offsets[:-1][nonempty]], lengths[nonempty])
+
+
+def _batch_positions(plot_batch):
+    """Returns the array of the position of each point within its plot"""
+    return (np.arange(len(plot_batch.x)) -
+            plot_batch.offsets[:-1][plot_batch.plot_index()])
+
+
+def _batch_mask(plot_batch, mask, x=None, y=None):
+    """Returns the PlotBatch of the points for which mask is true
+    :param x: (Optional) x array to mask in place of plot_batch.x
+    :param y: (Optional) y array to mask in place of plot_batch.y
+    """
+    x = plot_batch.x if x is None else x
+    y = plot_batch.y if y is None else y
+    counts = np.bincount(plot_batch.plot_index()[mask],
+                         minlength=len(plot_batch))
+    return plot_batch.with_xy(
+        x[mask], y[mask], offsets=np.concatenate(([0], np.cumsum(counts))))
+
+
+def transform_batch(transform, plot_batch):
+    """Apply the transform to each plot in the batch
+    :param transform: transform function. If it has a batch attribute, this
+    is used to transform the whole batch at once.
+    :param plot_batch: PlotBatch or list of plots
+    :return: the transformed PlotBatch
+    """
+    plot_batch = PlotBatch.from_plots(plot_batch)
+    if hasattr(transform, 'batch'):
+        return transform.batch(plot_batch)
+    return PlotBatch.from_plots([transform(*p) for p in plot_batch])
 
 
 def identity(xarr, yarr, *args):
     return (xarr, yarr) + args
 
+identity.batch = lambda b: b
+
 
 def derivative(xarr, yarr, *args):
     """Right-sided finite difference derivative.
@@ -29,28 +138,41 @@ def derivative(xarr, yarr, *args):
     a consequence of the derivative.
     """
     x = np.array(xarr)[:-1]
-    y = np.array(yarr)[:-1]
-    for i in range(len(y)):
-        y[i] = (yarr[i+1] - yarr[i])/(xarr[i+1] - xarr[i])
+    y = np.diff(yarr) / np.diff(xarr)
     return (x, y) + args
 
 
+def _derivative_batch(plot_batch):
+    x, y = plot_batch.x, plot_batch.y
+    # Every point but the last of each plot
+    mask = np.ones(len(x), dtype=bool)
+    lengths = plot_batch.lengths()
+    mask[plot_batch.offsets[1:][lengths > 0] - 1] = False
+    i = np.flatnonzero(mask)
+    return plot_batch.with_xy(
+        x[i], (y[i+1] - y[i]) / (x[i+1] - x[i]),
+        offsets=np.concatenate(([0], np.cumsum(np.maximum(lengths - 1, 0)))))
+
+derivative.batch = _derivative_batch
+
+
+@_elementwise
 def log_log(xarr, yarr, *args):
     """Given x and y, returns log(x) and log(y) arrays.
     """
-    x = np.array(list(map(lambda xi: np.log(abs(xi)), xarr)))
-    y = np.array(list(map(lambda yi: np.log(abs(yi)), yarr)))
+    x = np.log(np.abs(np.asarray(xarr)))
+    y = np.log(np.abs(np.asarray(yarr)))
     return (x, y) + args
 
 
+@_elementwise
 def div_x(xarr, yarr, *args):
     """y values are divided by their associated x values
     """
-    for i in range(len(yarr)):
-        yarr[i] = yarr[i] / xarr[i]
-    return (xarr, yarr) + args
+    return (xarr, np.asarray(yarr) / np.asarray(xarr)) + args
 
 
+@_elementwise
 def abs_y(xarr, yarr, *args):
     """Absolute value of y
     """
@@ -62,13 +184,18 @@ def relative_y(xarr, yarr, *args):
     """
     return (xarr, yarr - yarr[0]) + args
 
+relative_y.batch = lambda b: b.with_xy(b.x, b.y - _batch_first(b.y, b))
+
 
 def relative_x(xarr, yarr, *args):
     """First value in xarr is subtracted from each x
     """
     return (xarr - xarr[0], yarr) + args
 
+relative_x.batch = lambda b: b.with_xy(b.x - _batch_first(b.x, b), b.y)
+
 
+@_elementwise
 def flip(xarr, yarr, *args):
     """Flip the x and y axes
     """
@@ -139,7 +266,11 @@ def relative_xy_pzbt(xarr, yarr, *args):
 def power(xpow, ypow):
     """Returns a transform that raises x to xpow and y to ypow
     """
-    return lambda xarr, yarr, *args: (xarr ** xpow, yarr ** ypow) + args
+    def p(xarr, yarr, *args):
+        return (xarr ** xpow, yarr ** ypow) + args
+    p.__name__ = b'power({}, {})'.format(xpow, ypow)
+    p.cache_key = (b'power', xpow, ypow)
+    return _elementwise(p)
 
 
 def relative_to_y(x0):
@@ -149,6 +280,7 @@ def relative_to_y(x0):
     def r(xarr, yarr, *args):
         return (xarr, yarr - yarr[np.where(xarr == x0)[0][0]]) + args
     r.__name__ = b'relative_to_y({})'.format(x0)
+    r.cache_key = (b'relative_to_y', x0)
     return r
 
 
@@ -158,8 +290,9 @@ def relative_to_x(x0):
     """
     def r(xarr, yarr, *args):
         return (xarr - x0, yarr) + args
-    r.__name___ = b'relative_to_x={}'.format(x0)
-    return r
+    r.__name__ = b'relative_to_x={}'.format(x0)
+    r.cache_key = (b'relative_to_x', x0)
+    return _elementwise(r)
 
 
 def ltrim(n):
@@ -168,6 +301,8 @@ def ltrim(n):
     def t(xarr, yarr, *args):
         return (xarr[n:], yarr[n:]) + args
     t.__name__ = b'ltrim({})'.format(n)
+    t.cache_key = (b'ltrim', n)
+    t.batch = lambda b: _batch_mask(b, _batch_positions(b) >= n)
     return t
 
 
@@ -177,6 +312,10 @@ def rtrim(n):
     def t(xarr, yarr, *args):
         return (xarr[:-n], yarr[:-n]) + args
     t.__name__ = b'rtrim({})'.format(n)
+    t.cache_key = (b'rtrim', n)
+    t.batch = lambda b: _batch_mask(
+        b, _batch_positions(b) < b.lengths()[b.plot_index()] - n
+        if n > 0 else np.zeros(len(b.x), dtype=bool))
     return t
 
 
@@ -186,79 +325,116 @@ def first_np(n):
     def t(xarr, yarr, *args):
         return (xarr[:n], yarr[:n]) + args
     t.__name__ = b'first_{}p'.format(n)
+    t.cache_key = (b'first_np', n)
+    t.batch = lambda b: _batch_mask(b, _batch_positions(b) < n)
     return t
 
 firstp = first_np(1)
 first2p = first_np(2)
 
 
-def cubic_spline(num_pts):
-    """Returns a transform that performs a cubic spline through the given
-    (x, y) points.
+def _natural_cubic_spline_second_derivatives(xarr, yarr):
+    """Returns the second derivatives at each of the knots xarr of the
+    natural cubic spline through (xarr, yarr), by solving the tridiagonal
+    system for the interior knots
+    """
+    n = len(xarr)
+    m = np.zeros(n)
+    if n < 3:
+        return m
+    h = np.diff(xarr)
+    dydx = np.diff(yarr) / h
+    ab = np.zeros(shape=(3, n-2))
+    ab[0, 1:] = h[1:-1]
+    ab[1, :] = 2 * (h[:-1] + h[1:])
+    ab[2, :-1] = h[1:-1]
+    m[1:-1] = solve_banded((1, 1), ab, 6 * np.diff(dydx))
+    return m
+
+
+def _eval_cubic_spline(xarr, yarr, m, xnew):
+    """Evaluates the cubic spline through (xarr, yarr) with the second
+    derivatives m at the knots, at each of the points in xnew
+    """
+    j = np.clip(np.searchsorted(xarr, xnew) - 1, 0, len(xarr) - 2)
+    x0, x1 = xarr[j], xarr[j+1]
+    y0, y1 = yarr[j], yarr[j+1]
+    m0, m1 = m[j], m[j+1]
+    h = x1 - x0
+    dx0, dx1 = xnew - x0, x1 - xnew
+    return ((m0 * dx1**3 + m1 * dx0**3) / (6 * h) +
+            (y0 / h - m0 * h / 6) * dx1 + (y1 / h - m1 * h / 6) * dx0)
+
+
+def cubic_spline(num_pts, cache_coeffs=False, _max_cache_size=1024):
+    """Returns a transform that performs a natural cubic spline through the
+    given (x, y) points.
     :param num_pts: number of points (resolution) of the spline
+    :param cache_coeffs: if true, the spline coefficients are stored for
+    each (xarr, yarr) pair of array objects given to the transform, so that
+    transforming the same arrays again only evaluates the spline. The
+    arrays must then not be modified in place.
+    :param _max_cache_size: the cache is cleared once it holds this many
+    entries
     """
+    cache = dict()
+
     def cs(xarr, yarr, *args):
-        n = len(xarr)
-        a = np.zeros(shape=(4*n-4, 4*n-4))
-        y = np.zeros(shape=4*n-4)
-        for relrow in range(n - 1):
-            for p in reversed(range(4)):
-                a[relrow][relrow*4+3-p] = (xarr[relrow])**p
-                a[relrow+n-1][relrow*4+3-p] = (xarr[relrow+1])**p
-            y[relrow] = yarr[relrow]
-            y[relrow+n-1] = yarr[relrow+1]
-        for relrow in range(n - 2):
-            for p in reversed(range(3)):
-                xp = (p+1)*(xarr[relrow+1])**p
-                a[relrow+2*n-2][relrow*4+2-p] = xp
-                a[relrow+2*n-2][(relrow+1)*4+2-p] = -xp
-            for p in reversed(range(2)):
-                xp = (p+2)*(p+1)*(xarr[relrow+1])**p
-                a[relrow+3*n-4][relrow*4+1-p] = xp
-                a[relrow+3*n-4][(relrow+1)*4+1-p] = -xp
-        for relrow in range(2):
-            for p in reversed(range(2)):
-                xp = (p+2)*(p+1)*(xarr[p*(n-1)])**p
-                a[relrow+4*n-6][relrow*4*(n-2)+1-p] = xp
-        coeffs = np.linalg.solve(a, y)
-        xnew = np.linspace(xarr[0], xarr[n-1], num=num_pts)
-        ynew = np.empty(shape=num_pts)
-        j = 0  # 1/4 index of coeffs to use
-        cj = coeffs[4*j:4*j+4]
-        for i in range(num_pts):
-            xi = xnew[i]
-            while xi > xarr[j+1]:
-                j += 1
-                cj = coeffs[4*j:4*j+4]
-            ynew[i] = np.polyval(cj, xi)
+        key = (id(xarr), id(yarr))
+        if cache_coeffs and key in cache:
+            # The cache holds references to the arrays, so their ids are
+            # not reused while they are in it
+            x, y, m = cache[key][2:]
+        else:
+            x = np.asarray(xarr, dtype=float)
+            y = np.asarray(yarr, dtype=float)
+            m = _natural_cubic_spline_second_derivatives(x, y)
+            if cache_coeffs:
+                if len(cache) >= _max_cache_size:
+                    cache.clear()
+                cache[key] = (xarr, yarr, x, y, m)
+        xnew = np.linspace(x[0], x[-1], num=num_pts)
+        ynew = _eval_cubic_spline(x, y, m, xnew)
         return (xnew, ynew) + args
     cs.__name__ = b'cubic_spline'
+    # cache_coeffs does not change the output
+    cs.cache_key = (b'cubic_spline', num_pts)
     return cs
 
 
-def filter_x(func, name=None):
+def filter_x(func, name=None, vectorized=False):
     """Returns a transform that keeps only (x, y) points for which func(x)
     returns true
     :param func: filter function f: float -> bool
     :param name: name to give the function
+    :param vectorized: if true, func accepts an ndarray of x values and
+    returns the ndarray of associated bools, so that it is called once per
+    array rather than once per point
     """
+    def x_mask(xarr):
+        if vectorized:
+            return np.asarray(func(xarr), dtype=bool)
+        return np.fromiter((bool(func(xi)) for xi in xarr), dtype=bool,
+                           count=len(xarr))
+
     def t(xarr, yarr, *args):
-        x_next = list()
-        y_next = list()
-        for xi, yi in zip(xarr, yarr):
-            if func(xi):
-                x_next.append(xi)
-                y_next.append(yi)
-        return (np.array(x_next), np.array(y_next)) + args
+        mask = x_mask(xarr)
+        return (np.array(xarr)[mask], np.array(yarr)[mask]) + args
     t.__name__ = name if name else b'filter_x'
+    # The key holds func itself, rather than its id, so that the id cannot
+    # be reused by another function while the key is in a cache
+    t.cache_key = (b'filter_x', func, vectorized)
+    t.batch = lambda b: _batch_mask(b, x_mask(b.x))
     return t
 
-filter_evens = filter_x(func=lambda x: x % 2 == 0.0, name=b'filter_evens')
-filter_odds = filter_x(func=lambda x: x % 2 == 1.0, name=b'filter_odds')
+filter_evens = filter_x(func=lambda x: x % 2 == 0.0, name=b'filter_evens',
+                        vectorized=True)
+filter_odds = filter_x(func=lambda x: x % 2 == 1.0, name=b'filter_odds',
+                       vectorized=True)
 
 
 # TRANSFORM CHAIN GENERATION
-def compose_transforms(list_of_transform, t_name_sep=b' '):
+def compose_transforms(list_of_transform, t_name_sep=b' ', cache=None):
     """Returns a transform that applies all of the transforms in the
     given list_of_transform. These are applied in the reverse order that
     they are given, so as to be analogous with the standard way of expressing
@@ -269,14 +445,29 @@ def compose_transforms(list_of_transform, t_name_sep=b' '):
     :param list_of_transform: list of transform functions, in the order they
     are to be chained
     :param t_name_sep: string separator for the name of the composed transform
+    :param cache: (Optional) TransformCache in which to store the outputs
+    of the chain for each plot, so that transforming equal data again is
+    only a lookup
     :return: transform function whose behavior is equivalent to applying
-    all of the transforms in the list_of_transform in the reversed order
+    all of the transforms in the list_of_transform in the reversed order.
+    Adjacent elementwise transforms are fused into single steps.
     """
+    steps = _fuse_elementwise(reversed(list_of_transform))
+
     def m(xarr, yarr, *args):
         a = (xarr, yarr) + args
-        for tr in reversed(list_of_transform):
+        if cache is not None:
+            return cache.apply_chain(steps, a, lambda tr, a0: tr(*a0))
+        for tr in steps:
             a = tr(*a)
         return a
     names = [t.__name__ for t in list_of_transform]
     m.__name__ = t_name_sep.join(names)
+    m.cache_key = chain_key(steps)
+    if all(hasattr(tr, 'batch') for tr in steps):
+        def batch(plot_batch):
+            for tr in steps:
+                plot_batch = tr.batch(plot_batch)
+            return plot_batch
+        m.batch = batch
     return m
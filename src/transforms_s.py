@@ -32,20 +32,32 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import numpy as np
+from transforms import compose_transforms, transform_batch
+from TransformCache import get_default_cache, step_key, chain_key
 
 
 def s_identity(plots):
     return plots
 
 
-def s_transform_to_super(transform):
+def s_transform_to_super(transform, batched=False):
     """Returns a super-transform that transforms each plot according to
     transform. This essentially establishes a method of using a transform as
     a super-transform.
+    :param batched: if true, the plots are put into a PlotBatch and
+    transformed all at once (see transforms.transform_batch). The x and y
+    arrays of the resulting plots are then float arrays that are views of
+    the batch arrays.
     """
     def st(plots):
+        if batched:
+            return transform_batch(transform, plots).to_plots()
         return [transform(*plot) for plot in plots]
     st.__name__ = b'super-{}'.format(transform.__name__)
+    key = step_key(transform)
+    st.cache_key = (b'super', key, batched) if key is not None else None
+    st.transform = transform
+    st.batched = batched
     return st
 
 
@@ -57,6 +69,7 @@ def s_n_values(n_values_list):
     def snv(plots):
         return list(filter(lambda p: p[3]['N'] in n_values_list, plots))
     snv.__name__ = b's_n_values {}'.format(n_values_list)
+    snv.cache_key = (b's_n_values', tuple(n_values_list))
     return snv
 
 
@@ -106,9 +119,113 @@ def _const_equals(c1, c2):
         return c1 == c2
 
 
+def _x_of_pair(x_y):
+    return x_y[0]
+
+
+def _combine_xy(plots):
+    """Concatenate the x and y arrays of the given plots, dropping each point
+    whose x value appeared in an earlier plot. (Repeated x values within the
+    first plot that has them are kept.)
+    :return: x, y arrays
+    """
+    xs = [np.asarray(p[0]) for p in plots]
+    ys = [np.asarray(p[1]) for p in plots]
+    x = np.concatenate(xs)
+    y = np.concatenate(ys)
+    if len(x) == 0:
+        return x, y
+    plot_idx = np.repeat(np.arange(len(plots)), [len(xi) for xi in xs])
+    # For each distinct x, the index of the first plot in which it occurs
+    unique_x, first, inverse = np.unique(
+        x, return_index=True, return_inverse=True)
+    keep = plot_idx == plot_idx[first][inverse.reshape(-1)]
+    return x[keep], y[keep]
+
+
+def _combine_const_lists(const_lists):
+    """A constant is retained if it is equal (and not None) in all of the
+    lists; otherwise it is replaced by None
+    """
+    const_list = list()
+    for consts in zip(*const_lists):
+        c0 = consts[0]
+        if all(c is not None and _const_equals(c0, c) for c in consts):
+            const_list.append(c0)
+        else:
+            const_list.append(None)
+    return const_list
+
+
+def _combine_const_dicts(const_dicts):
+    """A constant is retained if it is in all of the dicts and is equal (and
+    not None) in each; otherwise its value is None
+    """
+    const_dict = dict()
+    d0 = const_dicts[0]
+    for d in const_dicts:
+        for k in d:
+            if k in const_dict:
+                continue
+            if k not in d0 or d0[k] is None:
+                const_dict[k] = None
+                continue
+            v0 = d0[k]
+            if all(k in di and di[k] is not None and _const_equals(v0, di[k])
+                   for di in const_dicts):
+                const_dict[k] = v0
+            else:
+                const_dict[k] = None
+    return const_dict
+
+
+def _combine_plots_group(
+        plots, combine_rules=None, sort_plot=False, sort_key=_x_of_pair
+):
+    """Combine a list of plots into one, in a single pass. The result is the
+    same as folding _combine_plots over the list from left to right, but
+    duplicate x values are found with one np.unique, the plot is sorted once,
+    and the constants are merged once.
+    :param plots: list of plots to combine
+    :param combine_rules: list of combine rules, which define how constants
+    in const_list and const_dict are merged. See definition above. These are
+    applied for each plot after the first, as in a left fold.
+    :param sort_plot: if true, sort the resulting plot according to the
+    sort_key. Default is to sort by x value.
+    :param sort_key: function that, when given an (x, y) pair, returns a
+    comparable item, by which the plot is sorted.
+    :return: combined plot
+    """
+    if len(plots) == 1:
+        return plots[0]
+    # Combine x arrays with each other and y arrays with each other
+    x, y = _combine_xy(plots)
+    # Sort plot (stably, so that ties are ordered as in a repeated sort)
+    if sort_plot and sort_key is _x_of_pair:
+        order = np.argsort(x, kind='mergesort')
+        x, y = x[order], y[order]
+    elif sort_plot:
+        pairs = sorted(zip(x, y), key=sort_key)
+        x = np.array([xi for xi, yi in pairs])
+        y = np.array([yi for xi, yi in pairs])
+    # Combine constants
+    const_list = _combine_const_lists([p[2] for p in plots])
+    const_dict = _combine_const_dicts([p[3] for p in plots])
+    p = x, y, const_list, const_dict
+    if combine_rules:
+        # Other combine rules, accumulated over the plots as in a left fold
+        p_acc = plots[0]
+        for p2 in plots[1:]:
+            p = x, y, const_list, dict(const_dict)
+            for rule in combine_rules:
+                p = rule(p, p_acc, p2)
+            p_acc = p
+    return p
+
+
 def _combine_plots(
         p1, p2, combine_rules=None,
-        sort_plot=False, sort_key=lambda x_y: x_y[0]
+        sort_plot=False, sort_key=_x_of_pair
 ):
     """Combine two plots into one, following the given combine_rules to
     determine how to merge the constants
@@ -122,54 +239,16 @@ def _combine_plots(
     item, by which the plot is sorted.
     :return: combined plot
     """
-    # Combine x arrays with each other and y arrays with each other
-    x1, y1 = p1[0:2]
-    x2, y2 = list(), list()
-    for x2i, y2i in zip(*p2[0:2]):
-        if x2i not in x1:
-            x2.append(x2i)
-            y2.append(y2i)
-    x = np.concatenate((x1, np.array(x2)))
-    y = np.concatenate((y1, np.array(y2)))
-    # Sort plot
-    if sort_plot:
-        next_x, next_y = list(), list()
-        for xi, yi in sorted(zip(x, y), key=sort_key):
-            next_x.append(xi)
-            next_y.append(yi)
-        x = np.array(next_x)
-        y = np.array(next_y)
-    # Combine constant lists
-    const_list = list()
-    for c1, c2 in zip(p1[2], p2[2]):
-        if c1 is not None and c2 is not None and _const_equals(c1, c2):
-            const_list.append(c1)
-        else:
-            const_list.append(None)
-    const_dict = dict()
-    # Combine constant dicts
-    d1, d2 = p1[3], p2[3]
-    for k in set(d1.keys() + d2.keys()):
-        if k in d1 and k in d2:
-            v1, v2 = d1[k], d2[k]
-            if v1 is not None and v2 is not None and _const_equals(v1, v2):
-                const_dict[k] = d1[k]
-            else:
-                const_dict[k] = None
-        else:
-            const_dict[k] = None
-    # Other combine rules
-    p = x, y, const_list, const_dict
-    if combine_rules is not None:
-        for rule in combine_rules:
-            p = rule(p, p1, p2)
-    return p
+    return _combine_plots_group(
+        plots=[p1, p2], combine_rules=combine_rules,
+        sort_plot=sort_plot, sort_key=sort_key
+    )
 
 
 def s_combine_like(
         keys=None, f=None,
         combine_rules=list([keep_lesser_x0_y0_zbt0_pair_in_dict]),
-        sort_plot=False, sort_key=lambda x_y: x_y[0]
+        sort_plot=False, sort_key=_x_of_pair
 ):
     """Returns a super-fit-transform that combines all plots that share the
     same value returned by the given f, which acts on a single plot
@@ -185,40 +264,87 @@ def s_combine_like(
     """
     if keys is not None:
         f = _keys(keys)
-    elif f is None:
+        f_key = (b'keys', tuple(keys))
+    else:
+        f_key = f
+    if f is None:
         return lambda p: p
 
     def scl(plots):
+        # Gather the plots of each group, then combine each group once
         m = dict()
+        groups = list()
         for plot in plots:
             const = f(plot)
             if const in m:
-                m[const] = _combine_plots(
-                    p1=m[const], p2=plot, combine_rules=combine_rules,
-                    sort_plot=sort_plot, sort_key=sort_key
-                )
+                m[const].append(plot)
             else:
-                m[const] = plot
-        return m.values()
+                m[const] = [plot]
+                groups.append(m[const])
+        return [_combine_plots_group(
+                    plots=g, combine_rules=combine_rules,
+                    sort_plot=sort_plot, sort_key=sort_key)
+                for g in groups]
     scl.__name__ = b's_combine_like {}'.format(f.__name__)
+    # The key holds the functions themselves, rather than their names, so
+    # that different lambdas do not share a key
+    scl.cache_key = (
+        b's_combine_like', f_key, tuple(combine_rules or list()),
+        sort_plot, sort_key
+    )
     return scl
 
 
-def compose_super_transforms(list_of_st, st_name_sep=b' '):
+def _fuse_super_transforms(steps):
+    """Returns the list of steps (super-transforms in the order in which they
+    are applied) with each run of adjacent super-transforms made by
+    s_transform_to_super replaced by a single one, so that each plot is put
+    through the run's transforms at once, without building the intermediate
+    lists of plots
+    """
+    fused_steps = list()
+    for st in steps:
+        prev = fused_steps[-1] if len(fused_steps) > 0 else None
+        if (prev is not None and hasattr(st, 'transform') and
+                hasattr(prev, 'transform') and st.batched == prev.batched):
+            fused_steps[-1] = s_transform_to_super(
+                transform=compose_transforms(
+                    [st.transform, prev.transform]),
+                batched=st.batched
+            )
+        else:
+            fused_steps.append(st)
+    return fused_steps
+
+
+def compose_super_transforms(list_of_st, st_name_sep=b' ', cache=None):
     """Return a super transform that is the equivalent to applying all of the
     super-transforms in list_of_st in reversed order.
     Example:
         Suppose that list_of_st is [U, T].
         Then, the composed super-transform is defined by (UT)(x) = U(T(x))
+    Adjacent super-transforms made by s_transform_to_super are fused.
     :param list_of_st: list of super-transform
     :param st_name_sep: string used to separate names of super-transforms in
     the name of the combined super-transform
+    :param cache: (Optional) TransformCache in which to store the outputs of
+    the chain (see TransformCache.py), so that applying it, or a chain that
+    starts with the same steps, to equal plots again reuses them. If None,
+    the default cache is used, if one has been set with
+    TransformCache.set_default_cache.
     :return: composed super-transform function
     """
+    steps = _fuse_super_transforms(list(reversed(list_of_st)))
+
     def composed_st(plots):
-        for super_t in reversed(list_of_st):
+        c = cache if cache is not None else get_default_cache()
+        if c is not None:
+            return list(c.apply_chain(
+                steps, list(plots), lambda st, p: st(list(p))))
+        for super_t in steps:
             plots = super_t(plots)
         return plots
     names = [st.__name__ for st in list_of_st]
     composed_st.__name__ = st_name_sep.join(names)
+    composed_st.cache_key = chain_key(steps)
     return composed_st